@@ -2,24 +2,37 @@
 # License: GNU General Public License version 3, or any later version
 # See top-level LICENSE file for more information
 
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
 import logging
-from typing import Any, Dict, Iterator, List, Optional
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 from urllib.parse import urljoin, urlparse
 
 from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
 from requests.exceptions import HTTPError
 
-from swh.lister.pattern import CredentialsType, StatelessLister
+from swh.lister.pattern import CredentialsType, Lister
 from swh.scheduler.interface import SchedulerInterface
 from swh.scheduler.model import ListedOrigin
 
+from ..utils import ordered_concurrent_map
+
 logger = logging.getLogger(__name__)
 
 Repositories = List[Dict[str, Any]]
 
 
-class CGitLister(StatelessLister[Repositories]):
+@dataclass
+class CGitListerState:
+    """State of the cgit lister"""
+
+    resolved_repositories: Dict[str, Tuple[str, str]] = field(default_factory=dict)
+    """Dictionary mapping the URL of a repository page to the last updated date
+    of the repository and to the origin URL found on that page during last listing"""
+
+
+class CGitLister(Lister[CGitListerState, Repositories]):
     """Lister class for CGit repositories.
 
     This lister will retrieve the list of published git repositories by
@@ -36,7 +49,9 @@ class CGitLister(StatelessLister[Repositories]):
       extra HTTP query is made at the given url found in the main listing page to gather
       published "Clone" URLs to be used as origin URL for that git repo. If several
       "Clone" urls are provided, prefer the http/https one, if any, otherwise fallback
-      to the first one.
+      to the first one. The origin URLs found are recorded in the lister state and
+      reused by the next listings for the repositories whose last updated date did
+      not change, so only new or updated repositories are queried.
 
     """
 
@@ -52,6 +67,7 @@ class CGitLister(StatelessLister[Repositories]):
         max_origins_per_page: Optional[int] = None,
         max_pages: Optional[int] = None,
         enable_origins: bool = True,
+        resolve_workers: int = 1,
     ):
         """Lister class for CGit repositories.
 
@@ -63,6 +79,9 @@ class CGitLister(StatelessLister[Repositories]):
                 if unset.
             base_git_url: Optional base git url which allows the origin url
                 computations.
+            resolve_workers: defaults to 1. Number of threads fetching the
+                repository pages of a listed page concurrently to find their origin
+                url, origins are still listed in the order of the page.
 
         """
         super().__init__(
@@ -77,6 +96,32 @@ class CGitLister(StatelessLister[Repositories]):
 
         self.session.headers.update({"Accept": "application/html"})
         self.base_git_url = base_git_url
+        self.resolve_workers = resolve_workers
+        self.resolved_repositories: Dict[str, Tuple[str, str]] = {}
+
+        if self.resolve_workers > 1:
+            # keep a pooled connection per worker
+            adapter = HTTPAdapter(pool_maxsize=self.resolve_workers)
+            self.session.mount("http://", adapter)
+            self.session.mount("https://", adapter)
+
+    def state_from_dict(self, d: Dict[str, Any]) -> CGitListerState:
+        return CGitListerState(
+            resolved_repositories={
+                repository_url: (last_updated_date, origin_url)
+                for repository_url, (last_updated_date, origin_url) in d.get(
+                    "resolved_repositories", {}
+                ).items()
+            }
+        )
+
+    def state_to_dict(self, state: CGitListerState) -> Dict[str, Any]:
+        return {
+            "resolved_repositories": {
+                repository_url: list(resolved)
+                for repository_url, resolved in state.resolved_repositories.items()
+            }
+        }
 
     def _get_and_parse(self, url: str) -> BeautifulSoup:
         """Get the given url and parse the retrieved HTML using BeautifulSoup"""
@@ -146,19 +191,41 @@ class CGitLister(StatelessLister[Repositories]):
                 # no pager, or no next page
                 next_page = None
 
+        # all repositories listed, forget the ones removed from the instance
+        self.state.resolved_repositories = {}
+
     def get_origins_from_page(
         self, repositories: Repositories
     ) -> Iterator[ListedOrigin]:
-        """Convert a page of cgit repositories into a list of ListedOrigins."""
+        """Convert a page of cgit repositories into a list of ListedOrigins.
+
+        The repository pages are fetched concurrently by ``resolve_workers``
+        threads, except for the repositories not updated since the last listing."""
         assert self.lister_obj.id is not None
 
-        for repo in repositories:
-            origin_url = repo["git_url"] or self._get_origin_from_repository_url(
-                repo["url"]
-            )
+        # origin urls which can be found without fetching the repository pages
+        known_origin_urls = [
+            repo["git_url"] or self._get_previous_origin_url(repo)
+            for repo in repositories
+        ]
+        origin_urls = ordered_concurrent_map(
+            lambda repo_origin_url: repo_origin_url[1]
+            or self._get_origin_from_repository_url(repo_origin_url[0]["url"]),
+            zip(repositories, known_origin_urls),
+            workers=self.resolve_workers,
+        )
+
+        for repo, origin_url in zip(repositories, origin_urls):
             if origin_url is None:
                 continue
 
+            if repo["git_url"] is None and repo["url"] and repo["last_updated_date"]:
+                # origin url resolved from the repository page
+                self.resolved_repositories[repo["url"]] = (
+                    repo["last_updated_date"],
+                    origin_url,
+                )
+
             yield ListedOrigin(
                 lister_id=self.lister_obj.id,
                 url=origin_url,
@@ -166,6 +233,24 @@ class CGitLister(StatelessLister[Repositories]):
                 last_update=_parse_last_updated_date(repo),
             )
 
+    def finalize(self) -> None:
+        self.state.resolved_repositories.update(self.resolved_repositories)
+        self.updated = bool(self.resolved_repositories)
+
+    def _get_previous_origin_url(self, repository: Dict[str, Any]) -> Optional[str]:
+        """Return the origin url found during the previous listing for a repository
+        whose last updated date did not change since then, if any."""
+        resolved = self.state.resolved_repositories.get(repository["url"])
+        if (
+            resolved is None
+            or not repository["last_updated_date"]
+            or resolved[0] != repository["last_updated_date"]
+        ):
+            return None
+        # at least the repository page request
+        self.fetches_avoided += 1
+        return resolved[1]
+
     def _get_origin_from_repository_url(self, repository_url: str) -> Optional[str]:
         """Extract the git url from the repository page"""
         try:
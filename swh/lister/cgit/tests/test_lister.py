@@ -42,11 +42,14 @@ def test_lister_cgit_get_pages_with_pages(requests_mock_datadir, swh_scheduler):
     assert len(flattened_repos) == 16
 
 
-def test_lister_cgit_run_with_page(requests_mock_datadir, swh_scheduler):
+@pytest.mark.parametrize("resolve_workers", [1, 4])
+def test_lister_cgit_run_with_page(
+    requests_mock_datadir, swh_scheduler, resolve_workers
+):
     """cgit lister supports pagination"""
 
     url = "https://git.tizen/cgit/"
-    lister_cgit = CGitLister(swh_scheduler, url=url)
+    lister_cgit = CGitLister(swh_scheduler, url=url, resolve_workers=resolve_workers)
 
     stats = lister_cgit.run()
 
@@ -73,6 +76,41 @@ def test_lister_cgit_run_with_page(requests_mock_datadir, swh_scheduler):
         assert __version__ in user_agent
 
 
+def test_lister_cgit_reuse_previous_origin_urls(requests_mock_datadir, swh_scheduler):
+    """cgit lister only fetches the pages of repositories updated since the
+    previous listing"""
+
+    url = "https://git.tizen/cgit/"
+    lister_cgit = CGitLister(swh_scheduler, url=url, resolve_workers=4)
+    lister_cgit.run()
+
+    origin_urls = {
+        origin.url
+        for origin in swh_scheduler.get_listed_origins(
+            lister_cgit.lister_obj.id
+        ).results
+    }
+    # repositories without last updated date are not recorded
+    assert len(lister_cgit.state.resolved_repositories) == 13
+    assert {
+        origin_url for _, origin_url in lister_cgit.state.resolved_repositories.values()
+    } <= origin_urls
+
+    lister_cgit = CGitLister(swh_scheduler, url=url, resolve_workers=4)
+    requests_mock_datadir.reset_mock()
+    stats = lister_cgit.run()
+
+    assert stats == ListerStats(pages=3, origins=16, fetches_avoided=13)
+    assert {
+        origin.url
+        for origin in swh_scheduler.get_listed_origins(
+            lister_cgit.lister_obj.id
+        ).results
+    } == origin_urls
+    # index pages and pages of the repositories without last updated date
+    assert len(requests_mock_datadir.request_history) == 3 + 3
+
+
 def test_lister_cgit_run_populates_last_update(requests_mock_datadir, swh_scheduler):
     """cgit lister returns last updated date"""
 
@@ -244,6 +282,11 @@ def test_lister_cgit_with_base_git_url(
 
     assert stats == ListerStats(pages=1, origins=expected_nb_origins)
 
+    # no repository page was fetched, so there is no origin url to remember
+    assert lister_cgit.resolved_repositories == {}
+    assert not lister_cgit.updated
+    assert lister_cgit.get_state_from_scheduler().resolved_repositories == {}
+
     # test page parsing
     scheduler_origins = swh_scheduler.get_listed_origins(
         lister_cgit.lister_obj.id
@@ -47,7 +47,15 @@ Page listing
 ------------
 
 The lister returns one page per channel / architecture that list all available package
-versions.
+versions in the ``.tar.bz2`` format (``packages``).
+
+When the ``stream_repodata`` argument is set, repodata files are decompressed and
+parsed while they are downloaded, their entries being grouped by package in an on-disk
+store. The lister then returns one page per architecture / package instead.
+
+The artifacts of each package are aggregated across architectures in an on-disk
+SQLite store, so the memory used by the lister does not grow with the size of the
+channel nor with the number of architectures.
 
 Origins from page
 -----------------
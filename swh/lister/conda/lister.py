@@ -4,11 +4,16 @@
 # See top-level LICENSE file for more information
 
 import bz2
-from collections import defaultdict
+import codecs
 import datetime
+from functools import partial
+from itertools import groupby
 import json
 import logging
-from typing import Any, Dict, Iterator, List, Optional, Tuple
+from operator import itemgetter
+import os
+import tempfile
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
 import iso8601
 
@@ -16,12 +21,137 @@ from swh.scheduler.interface import SchedulerInterface
 from swh.scheduler.model import ListedOrigin
 
 from ..pattern import CredentialsType, StatelessLister
+from ..utils import CachedDownload, iter_json_members, open_sqlite_store
 
 logger = logging.getLogger(__name__)
 
 # Aliasing the page results returned by `get_pages` method from the lister.
 CondaListerPage = Tuple[str, Dict[str, Dict[str, Any]]]
 
+# Members of a repodata file listing packages. Only packages in the .tar.bz2 format
+# are listed: builds published in both formats share the same artifact version, so
+# listing packages.conda would replace the artifacts of already listed origins.
+REPODATA_PACKAGES_KEYS = ("packages",)
+# Package metadata used by the lister, other ones are not kept when streaming.
+PACKAGE_METADATA_KEYS = (
+    "name",
+    "version",
+    "build",
+    "md5",
+    "sha256",
+    "timestamp",
+    "date",
+)
+
+
+def iter_bz2_decompress(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Incrementally decompress bzip2 data given as chunks, which may be made of
+    several concatenated streams.
+
+    >>> data = bz2.compress(b"foo") + bz2.compress(b"bar")
+    >>> b"".join(iter_bz2_decompress([data[:10], data[10:]]))
+    b'foobar'
+    """
+    decompressor = bz2.BZ2Decompressor()
+    for chunk in chunks:
+        while chunk:
+            if decompressor.eof:
+                decompressor = bz2.BZ2Decompressor()
+            data = decompressor.decompress(chunk)
+            if data:
+                yield data
+            chunk = decompressor.unused_data if decompressor.eof else b""
+
+
+class CondaPackageStore:
+    """On-disk store of the conda packages found during a listing.
+
+    It aggregates the artifacts of each package across architectures, and groups
+    the entries of a streamed repodata file by package name. Both are stored in a
+    SQLite database whose page cache is bounded by ``cache_size`` bytes, so the
+    memory used does not grow with the size of the channel.
+    """
+
+    def __init__(self, path: str, cache_size: int):
+        self.path = path
+        self.db = open_sqlite_store(self.path, cache_size)
+        self.db.execute(
+            "CREATE TABLE artifacts (name TEXT NOT NULL, version TEXT NOT NULL, "
+            "artifact TEXT NOT NULL, date REAL, PRIMARY KEY (name, version))"
+        )
+        self.db.execute(
+            "CREATE TABLE entries "
+            "(name TEXT NOT NULL, filename TEXT NOT NULL, metadata TEXT NOT NULL)"
+        )
+
+    def add_artifact(
+        self,
+        name: str,
+        artifact: Dict[str, Any],
+        date: Optional[datetime.datetime],
+    ) -> None:
+        """Add or replace an artifact of a package, identified by its version."""
+        self.db.execute(
+            "INSERT INTO artifacts VALUES (?, ?, ?, ?) ON CONFLICT (name, version) "
+            "DO UPDATE SET artifact = excluded.artifact, date = excluded.date",
+            (
+                name,
+                artifact["version"],
+                json.dumps(artifact),
+                date.timestamp() if date else None,
+            ),
+        )
+
+    def artifacts(self, name: str) -> List[Dict[str, Any]]:
+        """Return the artifacts of a package, in the order they were first added."""
+        return [
+            json.loads(artifact)
+            for (artifact,) in self.db.execute(
+                "SELECT artifact FROM artifacts WHERE name = ? ORDER BY rowid", (name,)
+            )
+        ]
+
+    def last_update(self, name: str) -> Optional[datetime.datetime]:
+        """Return the most recent date of the artifacts of a package, if any."""
+        (timestamp,) = self.db.execute(
+            "SELECT max(date) FROM artifacts WHERE name = ?", (name,)
+        ).fetchone()
+        if timestamp is None:
+            return None
+        return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc)
+
+    def add_entry(self, filename: str, metadata: Dict[str, Any]) -> None:
+        """Add an entry of a repodata file, only keeping the metadata used by the
+        lister."""
+        self.db.execute(
+            "INSERT INTO entries VALUES (?, ?, ?)",
+            (
+                metadata["name"],
+                filename,
+                json.dumps(
+                    {k: metadata[k] for k in PACKAGE_METADATA_KEYS if k in metadata}
+                ),
+            ),
+        )
+
+    def pop_entries(self) -> Iterator[Dict[str, Dict[str, Any]]]:
+        """Iterate over the added repodata entries grouped by package name, as
+        mappings of filenames to package metadata, then remove them from the store.
+        """
+        self.db.commit()
+        rows = self.db.execute(
+            "SELECT name, filename, metadata FROM entries ORDER BY name, rowid"
+        )
+        for _, package_rows in groupby(rows, key=itemgetter(0)):
+            yield {
+                filename: json.loads(metadata) for _, filename, metadata in package_rows
+            }
+        self.db.execute("DELETE FROM entries")
+
+    def close(self) -> None:
+        self.db.close()
+        os.remove(self.path)
+
 
 class CondaLister(StatelessLister[CondaListerPage]):
     """List Conda (anaconda.com) origins."""
@@ -34,6 +164,8 @@ class CondaLister(StatelessLister[CondaListerPage]):
     ORIGIN_URL_PATTERN = "https://anaconda.org/{channel}/{pkgname}"
     ARCHIVE_URL_PATTERN = "{url}/{channel}/{arch}/{filename}"
 
+    REPODATA_CHUNK_SIZE = 64 * 1024
+
     def __init__(
         self,
         scheduler: SchedulerInterface,
@@ -45,7 +177,28 @@ class CondaLister(StatelessLister[CondaListerPage]):
         max_origins_per_page: Optional[int] = None,
         max_pages: Optional[int] = None,
         enable_origins: bool = True,
+        stream_repodata: bool = False,
+        package_store_cache_size: int = 16 * 1024 * 1024,
+        download_cache_dir: Optional[str] = None,
+        download_cache_max_size: int = 4 * 1024 * 1024 * 1024,
     ):
+        """Lister for a conda channel.
+
+        Args:
+            stream_repodata: decompress and parse repodata files while they are
+                downloaded, instead of loading them in memory. A page is then
+                yielded for each package of an architecture rather than for the
+                whole architecture.
+            package_store_cache_size: defaults to 16MiB. Maximum size in bytes of
+                the memory cache of the on-disk store aggregating the artifacts
+                of packages across architectures.
+            download_cache_dir: directory where repodata files are kept between
+                runs, to only download them again when they changed upstream.
+                Nothing is listed if none of them changed since they were last
+                listed.
+            download_cache_max_size: defaults to 4GiB. Maximum size in bytes of the
+                files kept in ``download_cache_dir``.
+        """
         super().__init__(
             scheduler=scheduler,
             credentials=credentials,
@@ -54,33 +207,98 @@ class CondaLister(StatelessLister[CondaListerPage]):
             max_origins_per_page=max_origins_per_page,
             max_pages=max_pages,
             enable_origins=enable_origins,
+            download_cache_dir=download_cache_dir,
+            download_cache_max_size=download_cache_max_size,
         )
         self.channel: str = channel
         self.archs: List[str] = archs
-        self.packages: Dict[str, Any] = defaultdict(dict)
-        self.package_dates: Dict[str, Any] = defaultdict(list)
+        self.stream_repodata = stream_repodata
+        self.package_store_cache_size = package_store_cache_size
+        self.package_store: Optional[CondaPackageStore] = None
 
     def get_pages(self) -> Iterator[CondaListerPage]:
         """Yield an iterator which returns 'page'"""
 
-        for arch in self.archs:
-            repodata_url = self.REPO_URL_PATTERN.format(
+        repodata_urls = {
+            arch: self.REPO_URL_PATTERN.format(
                 url=self.url, channel=self.channel, arch=arch
             )
-            response = self.http_request(url=repodata_url)
-            packages: Dict[str, Any] = json.loads(bz2.decompress(response.content))[
-                "packages"
-            ]
+            for arch in self.archs
+        }
+
+        downloads: Dict[str, CachedDownload] = {}
+        if self.download_cache is not None:
+            for arch, repodata_url in repodata_urls.items():
+                downloads[arch] = self.download_cache.fetch(
+                    self.http_request, repodata_url
+                )
+                if not downloads[arch].downloaded:
+                    self.fetches_avoided += 1
+            # artifacts are aggregated across architectures, so all of them are
+            # listed again as soon as one of them changed
+            if not any(download.modified for download in downloads.values()):
+                logger.info("Repodata files did not change since they were last listed")
+                return
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            # artifacts are aggregated on disk, as a channel can list hundreds of
+            # thousands of them for each architecture
+            self.package_store = CondaPackageStore(
+                os.path.join(tmpdir, "packages.sqlite"), self.package_store_cache_size
+            )
+            try:
+                for arch, repodata_url in repodata_urls.items():
+                    chunks = self.iter_repodata(repodata_url, downloads.get(arch))
+                    if self.stream_repodata:
+                        yield from self.get_streamed_arch_pages(arch, chunks)
+                    else:
+                        repodata = json.loads(bz2.decompress(b"".join(chunks)))
+                        packages: Dict[str, Any] = {}
+                        for key in REPODATA_PACKAGES_KEYS:
+                            packages.update(repodata.get(key, {}))
+                        yield (arch, packages)
+            finally:
+                self.package_store.close()
+                self.package_store = None
+
+        for download in downloads.values():
+            self.mark_download_listed(download.url)
+
+    def iter_repodata(
+        self, repodata_url: str, download: Optional[CachedDownload]
+    ) -> Iterator[bytes]:
+        """Iterate over the chunks of a compressed repodata file, read from the
+        download cache or while it is downloaded."""
+        if download is not None:
+            with open(download.path, "rb") as repodata:
+                yield from iter(partial(repodata.read, self.REPODATA_CHUNK_SIZE), b"")
+        else:
+            response = self.http_request(url=repodata_url, stream=True)
+            yield from response.iter_content(self.REPODATA_CHUNK_SIZE)
+
+    def get_streamed_arch_pages(
+        self, arch: str, chunks: Iterable[bytes]
+    ) -> Iterator[CondaListerPage]:
+        """Stream a compressed repodata file to the package store, then yield a page
+        for each package it lists."""
+        assert self.package_store is not None
+        for _, (filename, package_metadata) in iter_json_members(
+            codecs.iterdecode(iter_bz2_decompress(chunks), "utf-8"),
+            REPODATA_PACKAGES_KEYS,
+        ):
+            self.package_store.add_entry(filename, package_metadata)
+        for packages in self.package_store.pop_entries():
             yield (arch, packages)
 
     def get_origins_from_page(self, page: CondaListerPage) -> Iterator[ListedOrigin]:
         """Iterate on all pages and yield ListedOrigin instances."""
         assert self.lister_obj.id is not None
+        assert self.package_store is not None
         arch, packages = page
 
-        package_names = set()
+        package_names: Dict[str, None] = {}
         for filename, package_metadata in packages.items():
-            package_names.add(package_metadata["name"])
+            package_names[package_metadata["name"]] = None
             version_key = (
                 f"{arch}/{package_metadata['version']}-{package_metadata['build']}"
             )
@@ -101,8 +319,6 @@ class CondaLister(StatelessLister[CondaListerPage]):
                 if checksum in package_metadata:
                     artifact["checksums"][checksum] = package_metadata[checksum]
 
-            self.packages[package_metadata["name"]][version_key] = artifact
-
             package_date = None
             if "timestamp" in package_metadata:
                 package_date = datetime.datetime.fromtimestamp(
@@ -113,18 +329,20 @@ class CondaLister(StatelessLister[CondaListerPage]):
 
             if package_date:
                 artifact["date"] = package_date.isoformat()
-                self.package_dates[package_metadata["name"]].append(package_date)
+
+            self.package_store.add_artifact(
+                package_metadata["name"], artifact, package_date
+            )
 
         for package_name in package_names:
-            package_dates = self.package_dates[package_name]
             yield ListedOrigin(
                 lister_id=self.lister_obj.id,
                 visit_type=self.VISIT_TYPE,
                 url=self.ORIGIN_URL_PATTERN.format(
                     channel=self.channel, pkgname=package_name
                 ),
-                last_update=max(package_dates, default=None),
+                last_update=self.package_store.last_update(package_name),
                 extra_loader_arguments={
-                    "artifacts": list(self.packages[package_name].values())
+                    "artifacts": self.package_store.artifacts(package_name)
                 },
             )
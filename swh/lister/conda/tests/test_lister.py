@@ -3,9 +3,14 @@
 # License: GNU General Public License version 3, or any later version
 # See top-level LICENSE file for more information
 
+import bz2
+import datetime
+import json
+
 import pytest
 
 from swh.lister.conda.lister import CondaLister
+from swh.lister.utils import DownloadCache
 
 
 @pytest.fixture
@@ -54,28 +59,36 @@ def expected_origins():
     ]
 
 
-def test_conda_lister_free_channel(datadir, requests_mock_datadir, swh_scheduler):
+@pytest.mark.parametrize("stream_repodata,pages", [(False, 3), (True, 14)])
+def test_conda_lister_free_channel(
+    datadir, requests_mock_datadir, swh_scheduler, stream_repodata, pages
+):
     lister = CondaLister(
-        scheduler=swh_scheduler, channel="free", archs=["linux-64", "osx-64", "win-64"]
+        scheduler=swh_scheduler,
+        channel="free",
+        archs=["linux-64", "osx-64", "win-64"],
+        stream_repodata=stream_repodata,
     )
     res = lister.run()
 
-    assert res.pages == 3
+    assert res.pages == pages
     assert res.origins == 11
 
 
+@pytest.mark.parametrize("stream_repodata,pages", [(False, 1), (True, 2)])
 def test_conda_lister_conda_forge_channel(
-    requests_mock_datadir, swh_scheduler, expected_origins
+    requests_mock_datadir, swh_scheduler, expected_origins, stream_repodata, pages
 ):
     lister = CondaLister(
         scheduler=swh_scheduler,
         url="https://conda.anaconda.org",
         channel="conda-forge",
         archs=["linux-64"],
+        stream_repodata=stream_repodata,
     )
     res = lister.run()
 
-    assert res.pages == 1
+    assert res.pages == pages
     assert res.origins == 2
 
     scheduler_origins = swh_scheduler.get_listed_origins(lister.lister_obj.id).results
@@ -99,8 +112,9 @@ def test_conda_lister_conda_forge_channel(
     ]
 
 
+@pytest.mark.parametrize("stream_repodata", [False, True])
 def test_conda_lister_number_of_yielded_origins(
-    requests_mock_datadir, swh_scheduler, expected_origins
+    requests_mock_datadir, swh_scheduler, expected_origins, stream_repodata
 ):
     """Check that a single ListedOrigin instance is sent by expected origins."""
     lister = CondaLister(
@@ -108,6 +122,7 @@ def test_conda_lister_number_of_yielded_origins(
         url="https://conda.anaconda.org",
         channel="conda-forge",
         archs=["linux-64"],
+        stream_repodata=stream_repodata,
     )
 
     listed_origins = []
@@ -117,3 +132,187 @@ def test_conda_lister_number_of_yielded_origins(
     assert sorted([listed_origin.url for listed_origin in listed_origins]) == sorted(
         [origin["url"] for origin in expected_origins]
     )
+
+
+def test_conda_lister_stream_repodata_same_origins(
+    requests_mock, swh_scheduler, mocker
+):
+    """Streamed repodata files are aggregated across architectures like loaded ones,
+    packages in the .conda format are not listed."""
+    repodata = {
+        "linux-64": {
+            "packages": {
+                "foo-1.0-0.tar.bz2": {
+                    "name": "foo",
+                    "version": "1.0",
+                    "build": "0",
+                    "md5": "0" * 32,
+                    "timestamp": 1600000000000,
+                    "depends": ["python"],
+                },
+                "foo-1.1-0.tar.bz2": {
+                    "name": "foo",
+                    "version": "1.1",
+                    "build": "0",
+                    "sha256": "1" * 64,
+                    "timestamp": 1700000000000,
+                },
+            },
+            "packages.conda": {
+                "foo-1.1-0.conda": {
+                    "name": "foo",
+                    "version": "1.1",
+                    "build": "0",
+                    "sha256": "2" * 64,
+                    "timestamp": 1700000000000,
+                },
+                "bar-2.0-0.conda": {"name": "bar", "version": "2.0", "build": "0"},
+            },
+        },
+        "osx-64": {
+            "packages": {
+                "foo-1.1-0.tar.bz2": {
+                    "name": "foo",
+                    "version": "1.1",
+                    "build": "0",
+                    "date": "2023-01-01",
+                },
+            },
+            "packages.conda": {
+                "foo-1.1-0.conda": {
+                    "name": "foo",
+                    "version": "1.1",
+                    "build": "0",
+                    "date": "2023-01-01",
+                },
+            },
+        },
+    }
+    for arch, data in repodata.items():
+        requests_mock.get(
+            f"https://repo.anaconda.com/pkgs/main/{arch}/repodata.json.bz2",
+            content=bz2.compress(json.dumps(data, indent=2).encode()),
+        )
+
+    listed_origins = {}
+    for stream_repodata in (False, True):
+        lister = CondaLister(
+            scheduler=swh_scheduler,
+            channel="main",
+            archs=list(repodata),
+            stream_repodata=stream_repodata,
+        )
+        # use a small chunk size to split the compressed stream
+        mocker.patch.object(lister, "REPODATA_CHUNK_SIZE", 10)
+        listed_origins[stream_repodata] = [
+            origin
+            for page in lister.get_pages()
+            for origin in lister.get_origins_from_page(page)
+        ]
+
+    foo_origins = [
+        origin
+        for origin in listed_origins[True]
+        if origin.url == "https://anaconda.org/main/foo"
+    ]
+    assert [
+        [
+            artifact["filename"]
+            for artifact in origin.extra_loader_arguments["artifacts"]
+        ]
+        for origin in foo_origins
+    ] == [
+        ["foo-1.0-0.tar.bz2", "foo-1.1-0.tar.bz2"],
+        ["foo-1.0-0.tar.bz2", "foo-1.1-0.tar.bz2", "foo-1.1-0.tar.bz2"],
+    ]
+    assert foo_origins[-1].extra_loader_arguments["artifacts"][1]["checksums"] == {
+        "sha256": "1" * 64
+    }
+    assert "https://anaconda.org/main/bar" not in {
+        origin.url for origin in listed_origins[True]
+    }
+    assert foo_origins[-1].last_update == datetime.datetime(
+        2023, 11, 14, 22, 13, 20, tzinfo=datetime.timezone.utc
+    )
+
+    assert sorted(listed_origins[True], key=lambda origin: origin.url) == sorted(
+        listed_origins[False], key=lambda origin: origin.url
+    )
+
+
+def test_conda_lister_download_cache(datadir, tmp_path, swh_scheduler, requests_mock):
+    """Repodata files are listed again as soon as one of them changed upstream."""
+    archs = ["linux-64", "osx-64"]
+    for arch in archs:
+        with open(
+            f"{datadir}/https_repo.anaconda.com/pkgs_free_{arch}_repodata.json.bz2",
+            "rb",
+        ) as repodata:
+            requests_mock.get(
+                f"https://repo.anaconda.com/pkgs/free/{arch}/repodata.json.bz2",
+                [
+                    {"content": repodata.read(), "headers": {"ETag": arch}},
+                    {"status_code": 304},
+                    {"status_code": 304},
+                    {"status_code": 304},
+                ],
+            )
+
+    def run():
+        return CondaLister(
+            scheduler=swh_scheduler,
+            channel="free",
+            archs=archs,
+            download_cache_dir=str(tmp_path),
+        ).run()
+
+    stats = run()
+    assert (stats.pages, stats.fetches_avoided) == (2, 0)
+
+    def listed_origins():
+        return sorted(
+            (origin.url, origin.last_update, origin.extra_loader_arguments)
+            for origin in swh_scheduler.get_listed_origins().results
+        )
+
+    first_listed_origins = listed_origins()
+
+    stats = run()
+    assert (stats.pages, stats.origins, stats.fetches_avoided) == (0, 0, 2)
+
+    # an architecture changed, listed origins are the same
+    cache = DownloadCache(str(tmp_path), 0)
+    cache.index["https://repo.anaconda.com/pkgs/free/osx-64/repodata.json.bz2"][
+        "listed"
+    ] = False
+    cache._write_index()
+    stats = run()
+    assert (stats.pages, stats.fetches_avoided) == (2, 2)
+    assert listed_origins() == first_listed_origins
+
+
+def test_conda_lister_download_cache_full(
+    datadir, tmp_path, swh_scheduler, requests_mock
+):
+    """Repodata files fetched during a listing are not evicted before being read,
+    even when they do not fit in the download cache."""
+    archs = ["linux-64", "osx-64"]
+    for arch in archs:
+        with open(
+            f"{datadir}/https_repo.anaconda.com/pkgs_free_{arch}_repodata.json.bz2",
+            "rb",
+        ) as repodata:
+            requests_mock.get(
+                f"https://repo.anaconda.com/pkgs/free/{arch}/repodata.json.bz2",
+                content=repodata.read(),
+            )
+
+    stats = CondaLister(
+        scheduler=swh_scheduler,
+        channel="free",
+        archs=archs,
+        download_cache_dir=str(tmp_path),
+        download_cache_max_size=1,
+    ).run()
+    assert stats.pages == 2
+    assert stats.origins > 0
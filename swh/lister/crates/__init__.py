@@ -29,6 +29,11 @@ related to package names.
 It takes a few seconds to download the archive and parse csv files to build a
 full index of existing package and related versions.
 
+The archive is read while it is downloaded, without extracting it. Only the columns
+used by the lister are kept from the csv files, and rows are stored in a throwaway
+SQLite database where they are joined by crate id, so the memory used by the lister
+does not grow with the number of versions.
+
 The archive also contains a metadata.json file with a timestamp corresponding to
 the date the database dump started. The database dump is automatically generated
 every 24 hours, around 02:00:00 UTC.
@@ -6,22 +6,24 @@
 import csv
 from dataclasses import dataclass
 from datetime import datetime
+from itertools import groupby
 import json
 import logging
-from pathlib import Path
+from operator import itemgetter
+import os
 import tarfile
 import tempfile
-from typing import Any, Dict, Iterator, List, Optional
+from typing import IO, Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
 from urllib.parse import urlparse
 
 import iso8601
 from looseversion import LooseVersion2
 
-from swh.model.hashutil import HASH_BLOCK_SIZE
 from swh.scheduler.interface import SchedulerInterface
 from swh.scheduler.model import ListedOrigin
 
 from ..pattern import CredentialsType, Lister
+from ..utils import open_sqlite_store
 
 logger = logging.getLogger(__name__)
 
@@ -39,6 +41,91 @@ class CratesListerState:
     index_last_update: Optional[datetime] = None
 
 
+class CrateVersion(NamedTuple):
+    """Columns of a row of the versions table of the database dump used by the
+    lister."""
+
+    num: str
+    checksum: str
+    yanked: bool
+    updated_at: str
+
+
+def iter_csv_columns(
+    csv_file: IO[bytes], columns: Tuple[str, ...]
+) -> Iterator[Tuple[str, ...]]:
+    """Iterate over the rows of a CSV file with a header, only keeping the values of
+    the given ``columns``, in that order.
+
+    >>> from io import BytesIO
+    >>> list(iter_csv_columns(BytesIO(b"a,b,c\\n1,2,3\\n"), ("c", "a")))
+    [('3', '1')]
+    """
+    # binary lines only end with \n, so that quoted values with other line
+    # breaks are left untouched
+    reader = csv.reader(line.decode() for line in csv_file)
+    header = next(reader, [])
+    indices = [header.index(column) for column in columns]
+    for row in reader:
+        # empty lines are skipped, as done by csv.DictReader
+        if row:
+            yield tuple(row[index] for index in indices)
+
+
+class CratesDumpStore:
+    """On-disk store of the rows of the crates and versions tables of a crates.io
+    database dump used by the lister.
+
+    Rows are stored in a throwaway SQLite database whose page cache is bounded by
+    ``cache_size`` bytes, so the memory used does not grow with the number of
+    versions, and can be joined in any order the tables appear in the dump.
+    """
+
+    def __init__(self, cache_size: int):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db = open_sqlite_store(
+            os.path.join(self.tmpdir.name, "db-dump.sqlite"), cache_size
+        )
+        self.db.execute("CREATE TABLE crates (id INTEGER PRIMARY KEY, name TEXT)")
+        self.db.execute(
+            "CREATE TABLE versions (crate_id INTEGER NOT NULL, num TEXT NOT NULL, "
+            "checksum TEXT, yanked INTEGER NOT NULL, updated_at TEXT NOT NULL)"
+        )
+
+    def add_crate(self, crate_id: int, name: str) -> None:
+        self.db.execute("INSERT INTO crates VALUES (?, ?)", (crate_id, name))
+
+    def add_version(self, crate_id: int, version: CrateVersion) -> None:
+        self.db.execute(
+            "INSERT INTO versions VALUES (?, ?, ?, ?, ?)", (crate_id, *version)
+        )
+
+    def __len__(self) -> int:
+        return self.db.execute("SELECT count(*) FROM crates").fetchone()[0]
+
+    def __iter__(self) -> Iterator[Tuple[str, List[CrateVersion]]]:
+        """Iterate over the stored crates having versions, as (crate name, crate
+        versions) tuples sorted by crate id."""
+        self.db.commit()
+        self.db.execute(
+            "CREATE INDEX IF NOT EXISTS versions_crate_id ON versions (crate_id)"
+        )
+        rows = self.db.execute(
+            "SELECT crates.id, crates.name, num, checksum, yanked, updated_at "
+            "FROM crates JOIN versions ON versions.crate_id = crates.id "
+            "ORDER BY crates.id, versions.rowid"
+        )
+        for (_, name), crate_rows in groupby(rows, key=itemgetter(0, 1)):
+            yield name, [
+                CrateVersion(num, checksum, bool(yanked), updated_at)
+                for _, _, num, checksum, yanked, updated_at in crate_rows
+            ]
+
+    def close(self) -> None:
+        self.db.close()
+        self.tmpdir.cleanup()
+
+
 class CratesLister(Lister[CratesListerState, CratesListerPage]):
     """List origins from the "crates.io" forge.
 
@@ -72,7 +159,22 @@ class CratesLister(Lister[CratesListerState, CratesListerPage]):
         max_origins_per_page: Optional[int] = None,
         max_pages: Optional[int] = None,
         enable_origins: bool = True,
+        max_inflight_batches: int = 0,
+        db_dump_store_cache_size: int = 64 * 1024 * 1024,
+        download_cache_dir: Optional[str] = None,
+        download_cache_max_size: int = 4 * 1024 * 1024 * 1024,
     ):
+        """Lister for the crates.io forge.
+
+        Args:
+            db_dump_store_cache_size: defaults to 64MiB. Maximum size in bytes of
+                the memory cache of the on-disk store of the database dump rows.
+            download_cache_dir: directory where the database dump is kept between
+                runs, to only download it again when it changed upstream. Nothing
+                is listed if it did not change since it was last listed.
+            download_cache_max_size: defaults to 4GiB. Maximum size in bytes of the
+                files kept in ``download_cache_dir``.
+        """
         super().__init__(
             scheduler=scheduler,
             credentials=credentials,
@@ -81,9 +183,13 @@ class CratesLister(Lister[CratesListerState, CratesListerPage]):
             max_origins_per_page=max_origins_per_page,
             max_pages=max_pages,
             enable_origins=enable_origins,
+            max_inflight_batches=max_inflight_batches,
+            download_cache_dir=download_cache_dir,
+            download_cache_max_size=download_cache_max_size,
         )
         self.index_metadata: Dict[str, str] = {}
         self.all_crates_processed = False
+        self.db_dump_store_cache_size = db_dump_store_cache_size
 
     def state_from_dict(self, d: Dict[str, Any]) -> CratesListerState:
         index_last_update = d.get("index_last_update")
@@ -106,64 +212,70 @@ class CratesLister(Lister[CratesListerState, CratesListerPage]):
         last = self.state.index_last_update
         return not last or (last is not None and last < dt)
 
-    def get_and_parse_db_dump(self) -> Dict[str, Any]:
+    def get_and_parse_db_dump(self) -> Optional[CratesDumpStore]:
         """Download and parse csv files from db_dump_path.
 
-        Returns a dict where each entry corresponds to a package name with its related versions.
-        """
-
-        with tempfile.TemporaryDirectory() as tmpdir:
-            file_name = self.DB_DUMP_URL.split("/")[-1]
-            archive_path = Path(tmpdir) / file_name
+        Without download cache, the archive is read while it is downloaded.
 
-            # Download the Db dump
+        Returns a store of the new crates and their related versions, to be closed
+        by the caller, or None if the cached archive did not change since it was
+        last listed.
+        """
+        if self.download_cache is None:
             with self.http_request(self.DB_DUMP_URL, stream=True) as res:
-                with open(archive_path, "wb") as out_file:
-                    for chunk in res.iter_content(chunk_size=HASH_BLOCK_SIZE):
-                        out_file.write(chunk)
-
-            # Extract the Db dump
-            db_dump_path = Path(str(archive_path).split(".tar.gz")[0])
-            members_to_extract = []
-            with tarfile.open(archive_path) as tf:
-                for member in tf.getmembers():
-                    if member.name.endswith(
-                        ("/data/crates.csv", "/data/versions.csv", "/metadata.json")
-                    ):
-                        members_to_extract.append(member)
-                tf.extractall(members=members_to_extract, path=db_dump_path)
-
-            csv.field_size_limit(10000000)
-
-            (crates_csv_path,) = list(db_dump_path.glob("*/data/crates.csv"))
-            (versions_csv_path,) = list(db_dump_path.glob("*/data/versions.csv"))
-            (index_metadata_json_path,) = list(db_dump_path.rglob("*/metadata.json"))
-
-            with index_metadata_json_path.open("rb") as index_metadata_json:
-                self.index_metadata = json.load(index_metadata_json)
-
-            crates: Dict[str, Any] = {}
-            with crates_csv_path.open() as crates_fd:
-                crates_csv = csv.DictReader(crates_fd)
-                for item in crates_csv:
-                    if self.is_new(item["updated_at"]):
-                        # crate 'id' as key
-                        crates[item["id"]] = {
-                            "name": item["name"],
-                            "updated_at": item["updated_at"],
-                            "versions": {},
-                        }
-
-            data: Dict[str, Any] = {}
-            with versions_csv_path.open() as versions_fd:
-                versions_csv = csv.DictReader(versions_fd)
-                for version in versions_csv:
-                    if version["crate_id"] in crates.keys():
-                        crate: Dict[str, Any] = crates[version["crate_id"]]
-                        crate["versions"][version["num"]] = version
-                        # crate 'name' as key
-                        data[crate["name"]] = crate
-            return data
+                res.raw.decode_content = True
+                return self.parse_db_dump(res.raw)
+
+        download = self.download_cache.fetch(self.http_request, self.DB_DUMP_URL)
+        if not download.downloaded:
+            self.fetches_avoided += 1
+        if not download.modified:
+            return None
+        with open(download.path, "rb") as db_dump:
+            return self.parse_db_dump(db_dump)
+
+    def parse_db_dump(self, db_dump: IO[bytes]) -> CratesDumpStore:
+        """Parse the csv files of a database dump archive read as a stream, only
+        storing the columns used by the lister of the new crates and of all
+        versions."""
+        store = CratesDumpStore(self.db_dump_store_cache_size)
+        csv.field_size_limit(10000000)
+        try:
+            with tarfile.open(fileobj=db_dump, mode="r|gz") as tf:
+                for member in tf:
+                    if member.name.endswith("/metadata.json"):
+                        metadata_file = tf.extractfile(member)
+                        assert metadata_file is not None
+                        self.index_metadata = json.load(metadata_file)
+                    elif member.name.endswith("/data/crates.csv"):
+                        crates_file = tf.extractfile(member)
+                        assert crates_file is not None
+                        for crate_id, name, updated_at in iter_csv_columns(
+                            crates_file, ("id", "name", "updated_at")
+                        ):
+                            if self.is_new(updated_at):
+                                store.add_crate(int(crate_id), name)
+                    elif member.name.endswith("/data/versions.csv"):
+                        versions_file = tf.extractfile(member)
+                        assert versions_file is not None
+                        for (
+                            crate_id,
+                            num,
+                            checksum,
+                            yanked,
+                            updated_at,
+                        ) in iter_csv_columns(
+                            versions_file,
+                            ("crate_id", "num", "checksum", "yanked", "updated_at"),
+                        ):
+                            store.add_version(
+                                int(crate_id),
+                                CrateVersion(num, checksum, yanked == "t", updated_at),
+                            )
+        except BaseException:
+            store.close()
+            raise
+        return store
 
     def page_entry_dict(self, entry: Dict[str, Any]) -> Dict[str, Any]:
         """Transform package version definition dict to a suitable
@@ -177,7 +289,7 @@ class CratesLister(Lister[CratesListerState, CratesListerPage]):
             name=entry["name"],
             version=entry["version"],
             checksum=entry["checksum"],
-            yanked=True if entry["yanked"] == "t" else False,
+            yanked=entry["yanked"],
             crate_file=crate_file,
             filename=filename,
             last_update=entry["updated_at"],
@@ -195,24 +307,35 @@ class CratesLister(Lister[CratesListerState, CratesListerPage]):
         """
 
         # Fetch crates.io Db dump, then Parse the data.
-        dataset = self.get_and_parse_db_dump()
-
-        logger.debug("Found %s crates in crates_index", len(dataset))
-
-        for name, item in dataset.items():
-            crate_versions = []
-            # sort crate versions
-            versions = sorted(item["versions"].keys(), key=LooseVersion2)
-
-            for version in versions:
-                v = item["versions"][version]
-                v["name"] = name
-                v["version"] = version
-                crate_versions.append(self.page_entry_dict(v))
-
-            yield crate_versions
+        store = self.get_and_parse_db_dump()
+        if store is None:
+            logger.info("Database dump did not change since it was last listed")
+            return
+
+        try:
+            logger.debug("Found %s crates in crates_index", len(store))
+
+            for name, versions in store:
+                # sort crate versions
+                versions.sort(key=lambda version: LooseVersion2(version.num))
+
+                yield [
+                    self.page_entry_dict(
+                        {
+                            "name": name,
+                            "version": version.num,
+                            "checksum": version.checksum,
+                            "yanked": version.yanked,
+                            "updated_at": version.updated_at,
+                        }
+                    )
+                    for version in versions
+                ]
+        finally:
+            store.close()
 
         self.all_crates_processed = True
+        self.mark_download_listed(self.DB_DUMP_URL)
 
     def get_origins_from_page(self, page: CratesListerPage) -> Iterator[ListedOrigin]:
         """Iterate on all crate pages and yield ListedOrigin instances."""
@@ -3,6 +3,9 @@
 # License: GNU General Public License version 3, or any later version
 # See top-level LICENSE file for more information
 
+import io
+import tarfile
+
 import iso8601
 import pytest
 
@@ -211,3 +214,79 @@ def test_crates_lister_error_when_processing_crate(
         lister.run()
 
     assert lister.get_state_from_scheduler().index_last_update is None
+
+
+def test_crates_lister_db_dump_members_order(swh_scheduler, requests_mock):
+    """Crates and versions tables are joined whatever their order in the dump."""
+    members = {
+        "2022-08-08-020027/metadata.json": b'{"timestamp": "2022-08-08T02:00:27Z"}',
+        "2022-08-08-020027/data/crates.csv": (
+            b'id,description,name,updated_at\n1,"multi\nline",foo,2022-01-01\n'
+            b"2,,bar,2022-01-02\n"
+        ),
+        "2022-08-08-020027/data/versions.csv": (
+            b"num,crate_id,checksum,yanked,updated_at\n"
+            b"0.10.0,1,aa,f,2022-01-01\n0.9.0,1,bb,t,2021-01-01\n"
+        ),
+    }
+    archive = io.BytesIO()
+    with tarfile.open(fileobj=archive, mode="w:gz") as tf:
+        for name, content in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            tf.addfile(info, io.BytesIO(content))
+    requests_mock.get(CratesLister.DB_DUMP_URL, content=archive.getvalue())
+
+    lister = CratesLister(scheduler=swh_scheduler)
+    pages = list(lister.get_pages())
+
+    # bar has no version
+    assert pages == [
+        [
+            {
+                "name": "foo",
+                "version": "0.9.0",
+                "checksum": "bb",
+                "yanked": True,
+                "crate_file": "https://static.crates.io/crates/foo/foo-0.9.0.crate",
+                "filename": "foo-0.9.0.crate",
+                "last_update": "2021-01-01",
+            },
+            {
+                "name": "foo",
+                "version": "0.10.0",
+                "checksum": "aa",
+                "yanked": False,
+                "crate_file": "https://static.crates.io/crates/foo/foo-0.10.0.crate",
+                "filename": "foo-0.10.0.crate",
+                "last_update": "2022-01-01",
+            },
+        ]
+    ]
+    assert lister.index_metadata == {"timestamp": "2022-08-08T02:00:27Z"}
+
+
+def test_crates_lister_download_cache(datadir, tmp_path, swh_scheduler, requests_mock):
+    """The database dump is not listed again when it did not change upstream."""
+    requests_mock.get(
+        CratesLister.DB_DUMP_URL,
+        [
+            {
+                "content": open(
+                    f"{datadir}/https_static.crates.io/db-dump.tar.gz", "rb"
+                ).read(),
+                "headers": {"ETag": '"dump"'},
+            },
+            {"status_code": 304},
+        ],
+    )
+    lister = CratesLister(scheduler=swh_scheduler, download_cache_dir=str(tmp_path))
+    stats = lister.run()
+    assert (stats.pages, stats.fetches_avoided) == (3, 0)
+
+    # drop the lister state to make sure the dump is not listed again
+    lister = CratesLister(scheduler=swh_scheduler, download_cache_dir=str(tmp_path))
+    lister.state = CratesListerState()
+    stats = lister.run()
+    assert (stats.pages, stats.origins, stats.fetches_avoided) == (0, 0, 1)
+    assert requests_mock.last_request.headers["If-None-Match"] == '"dump"'
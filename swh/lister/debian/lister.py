@@ -6,22 +6,28 @@
 import bz2
 from collections import defaultdict
 from dataclasses import dataclass, field
+from datetime import datetime
 from email.utils import parsedate_to_datetime
 import gzip
 from itertools import product
 import logging
 import lzma
 import os
-from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+import shutil
+import tempfile
+from typing import IO, Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
 from urllib.parse import urljoin
 
-from debian.deb822 import Sources
+from debian.deb822 import Release, Sources
+from requests import Response
+from requests.adapters import HTTPAdapter
 from requests.exceptions import HTTPError
 
 from swh.scheduler.interface import SchedulerInterface
 from swh.scheduler.model import ListedOrigin
 
 from ..pattern import CredentialsType, Lister
+from ..utils import ordered_concurrent_map, versions_digest
 
 logger = logging.getLogger(__name__)
 
@@ -43,9 +49,15 @@ DebianPageType = Iterator[Sources]
 class DebianListerState:
     """State of debian lister"""
 
-    package_versions: Dict[PkgName, Set[PkgVersion]] = field(default_factory=dict)
-    """Dictionary mapping a package name to all the versions found during
-    last listing"""
+    package_versions_digests: Dict[PkgName, str] = field(default_factory=dict)
+    """Dictionary mapping a package name to a digest of all the versions found during
+    last listing, computed with :func:`swh.lister.utils.versions_digest`"""
+    index_urls: Dict[str, str] = field(default_factory=dict)
+    """Dictionary mapping a ``suite/component`` key to the URL of the Sources file
+    served by the mirror during last listing, tried first by the next listing"""
+    release_checksums: Dict[str, str] = field(default_factory=dict)
+    """Dictionary mapping a ``suite/component`` key to a digest of the Sources files
+    checksums found in the release file of the suite during last listing"""
 
 
 class DebianLister(Lister[DebianListerState, DebianPageType]):
@@ -65,6 +77,9 @@ class DebianLister(Lister[DebianListerState, DebianPageType]):
         mirror_url: debian package archives mirror URL
         suites: list of distribution suites to process
         components: list of package components to process
+        index_workers: number of threads downloading and decompressing the Sources
+            files concurrently, they are still processed in the order of suites
+            and components
     """
 
     LISTER_NAME = "debian"
@@ -82,6 +97,8 @@ class DebianLister(Lister[DebianListerState, DebianPageType]):
         max_origins_per_page: Optional[int] = None,
         max_pages: Optional[int] = None,
         enable_origins: bool = True,
+        max_inflight_batches: int = 0,
+        index_workers: int = 1,
     ):
         super().__init__(
             scheduler=scheduler,
@@ -91,6 +108,7 @@ class DebianLister(Lister[DebianListerState, DebianPageType]):
             max_origins_per_page=max_origins_per_page,
             max_pages=max_pages,
             enable_origins=enable_origins,
+            max_inflight_batches=max_inflight_batches,
         )
 
         # to ensure urljoin will produce valid Sources URL
@@ -100,18 +118,44 @@ class DebianLister(Lister[DebianListerState, DebianPageType]):
         self.distribution = instance
         self.suites = suites
         self.components = components
+        self.index_workers = index_workers
+        # suites and components whose Sources file could not be retrieved
+        self.missing_indexes: Set[str] = set()
+
+        if self.index_workers > 1:
+            # keep a pooled connection per worker
+            adapter = HTTPAdapter(pool_maxsize=self.index_workers)
+            self.session.mount("http://", adapter)
+            self.session.mount("https://", adapter)
 
         # will hold all listed origins info
         self.listed_origins: Dict[DebianOrigin, ListedOrigin] = {}
 
         # will contain the lister state after a call to run
         self.package_versions: Dict[PkgName, Set[PkgVersion]] = {}
+        # whether the previously listed packages whose versions changed were sent
+        self.changed_packages_sent = False
 
     def state_from_dict(self, d: Dict[str, Any]) -> DebianListerState:
-        return DebianListerState(package_versions={k: set(v) for k, v in d.items()})
+        if not isinstance(d.get("package_versions_digests"), dict):
+            # states recorded by previous versions of the lister only map package
+            # names to digests or lists of versions
+            d = {"package_versions_digests": d}
+        return DebianListerState(
+            package_versions_digests={
+                k: v if isinstance(v, str) else versions_digest(v)
+                for k, v in d["package_versions_digests"].items()
+            },
+            index_urls=d.get("index_urls", {}),
+            release_checksums=d.get("release_checksums", {}),
+        )
 
     def state_to_dict(self, state: DebianListerState) -> Dict[str, Any]:
-        return {k: list(v) for k, v in state.package_versions.items()}
+        return {
+            "package_versions_digests": state.package_versions_digests,
+            "index_urls": state.index_urls,
+            "release_checksums": state.release_checksums,
+        }
 
     def debian_index_urls(
         self, suite: Suite, component: Component
@@ -127,34 +171,141 @@ class DebianLister(Lister[DebianListerState, DebianPageType]):
             yield (f"{base_url}.{ext}", ext)
         yield (base_url, "")
 
-    def page_request(self, suite: Suite, component: Component) -> DebianPageType:
-        """Return parsed package Sources file for a given debian suite and component."""
-        for url, compression in self.debian_index_urls(suite, component):
+    def release_checksums(self) -> Optional[Dict[str, str]]:
+        """Return a digest of the checksums of the Sources files of each suite and
+        component, as found in the ``InRelease`` or ``Release`` file of the suites,
+        or :const:`None` if the release file of a suite could not be retrieved."""
+        release_checksums = {}
+        for suite in self.suites:
+            for release_filename in ("InRelease", "Release"):
+                try:
+                    response = self.http_request(
+                        urljoin(self.url, f"dists/{suite}/{release_filename}")
+                    )
+                except HTTPError:
+                    pass
+                else:
+                    release = Release(response.content)
+                    break
+            else:
+                logger.debug("Could not retrieve release file for %s", suite)
+                return None
+
+            for component in self.components:
+                sources_names = (
+                    f"{component}/source/Sources",
+                    f"updates/{component}/source/Sources",
+                )
+                release_checksums[f"{suite}/{component}"] = versions_digest(
+                    f"{entry['name']} {entry['sha256']}"
+                    for entry in release.get("SHA256", [])
+                    if os.path.splitext(entry["name"])[0] in sources_names
+                )
+        return release_checksums
+
+    def sources_index_request(
+        self, suite: Suite, component: Component
+    ) -> Optional[Tuple[Response, str]]:
+        """Return the streamed response of the first available Sources file URL for
+        a given debian suite and component along with its compression format, or
+        :const:`None` if no Sources file could be retrieved.
+
+        The URL served by the mirror is recorded in the lister state and tried
+        first during the next listings, to avoid probing the other ones again."""
+        index_key = f"{suite}/{component}"
+        served_url = self.state.index_urls.get(index_key)
+        index_urls = sorted(
+            self.debian_index_urls(suite, component),
+            key=lambda index_url: index_url[0] != served_url,
+        )
+        for url, compression in index_urls:
             try:
                 response = self.http_request(url, stream=True)
             except HTTPError:
                 pass
             else:
-                last_modified = response.headers.get("Last-Modified")
-                self.last_sources_update = (
-                    parsedate_to_datetime(last_modified) if last_modified else None
-                )
-                decompressor = decompressors.get(compression)
-                if decompressor:
-                    data = decompressor(response.raw).readlines()
-                else:
-                    data = response.raw.readlines()
-                break
-        else:
-            data = ""
-            logger.debug("Could not retrieve sources index for %s/%s", suite, component)
+                self.state.index_urls[index_key] = url
+                return response, compression
+        logger.debug("Could not retrieve sources index for %s/%s", suite, component)
+        self.missing_indexes.add(index_key)
+        return None
 
-        return Sources.iter_paragraphs(data)
+    def sources_last_update(self, response: Response) -> Optional[datetime]:
+        """Return the modification date of a Sources file from its response headers."""
+        last_modified = response.headers.get("Last-Modified")
+        return parsedate_to_datetime(last_modified) if last_modified else None
+
+    def page_request(self, suite: Suite, component: Component) -> DebianPageType:
+        """Return parsed package Sources file for a given debian suite and component.
+
+        Paragraphs are parsed while the Sources file is streamed and decompressed."""
+        index = self.sources_index_request(suite, component)
+        if index is None:
+            return Sources.iter_paragraphs("")
+
+        response, compression = index
+        self.last_sources_update = self.sources_last_update(response)
+        # undo any Content-Encoding applied by the server to the Sources file
+        response.raw.decode_content = True
+        decompressor = decompressors.get(compression)
+        return Sources.iter_paragraphs(
+            decompressor(response.raw) if decompressor else response.raw
+        )
+
+    def download_sources_index(
+        self, suite_component: Tuple[Suite, Component]
+    ) -> Tuple[Optional[datetime], Optional[IO[bytes]]]:
+        """Download and decompress the Sources file for a given debian suite and
+        component to a temporary file.
+
+        Returns:
+            the modification date of the Sources file and the temporary file
+            positioned at its start, or :const:`None` values if no Sources file
+            could be retrieved
+        """
+        index = self.sources_index_request(*suite_component)
+        if index is None:
+            return None, None
+
+        response, compression = index
+        response.raw.decode_content = True
+        decompressor = decompressors.get(compression)
+        sources_file = tempfile.TemporaryFile()
+        with response:
+            shutil.copyfileobj(
+                decompressor(response.raw) if decompressor else response.raw,
+                sources_file,
+            )
+        sources_file.seek(0)
+        return self.sources_last_update(response), sources_file
 
     def get_pages(self) -> Iterator[DebianPageType]:
         """Return an iterator on parsed debian package Sources files, one per combination
-        of debian suite and component."""
-        for suite, component in product(self.suites, self.components):
+        of debian suite and component.
+
+        When ``index_workers`` is greater than 1, the next Sources files are
+        downloaded and decompressed concurrently while a page is processed.
+
+        No page is returned if the checksums of all the Sources files, found in the
+        release files of the suites, did not change since the last listing."""
+        self.missing_indexes = set()
+        release_checksums = self.release_checksums()
+        if release_checksums is not None and (
+            release_checksums == self.state.release_checksums
+        ):
+            logger.info(
+                "Sources files of %s did not change since last listing", self.instance
+            )
+            return
+
+        suites_components = list(product(self.suites, self.components))
+        if self.index_workers > 1:
+            sources_indexes = ordered_concurrent_map(
+                self.download_sources_index,
+                suites_components,
+                workers=self.index_workers,
+            )
+        for suite, component in suites_components:
             logger.debug(
                 "Processing %s %s source packages info for %s component.",
                 self.instance,
@@ -163,7 +314,27 @@ class DebianLister(Lister[DebianListerState, DebianPageType]):
             )
             self.current_suite = suite
             self.current_component = component
-            yield self.page_request(suite, component)
+            if self.index_workers <= 1:
+                yield self.page_request(suite, component)
+                continue
+
+            last_sources_update, sources_file = next(sources_indexes)
+            if sources_file is None:
+                yield Sources.iter_paragraphs("")
+                continue
+
+            self.last_sources_update = last_sources_update
+            with sources_file:
+                yield Sources.iter_paragraphs(sources_file)
+
+        # all pages processed, the next listing can be skipped if none of the
+        # Sources files changed, unless one listed in a release file could not be
+        # retrieved
+        if release_checksums is not None and all(
+            release_checksums[index_key] == versions_digest([])
+            for index_key in self.missing_indexes
+        ):
+            self.state.release_checksums = release_checksums
 
     def origin_url_for_package(self, package_name: PkgName) -> DebianOrigin:
         """Return the origin url for the given package"""
@@ -184,6 +355,10 @@ class DebianLister(Lister[DebianListerState, DebianPageType]):
         package names can be listed for two different package source pages,
         only their version will differ, resulting in origins counted multiple
         times in lister statistics.
+
+        Packages listed during a previous listing process are only sent when
+        processing the last page, if the digest of their versions differs from
+        the one recorded in the lister state.
         """
         assert self.lister_obj.id is not None
 
@@ -263,17 +438,24 @@ class DebianLister(Lister[DebianListerState, DebianPageType]):
             # add package version key to the set of found versions
             self.package_versions[package_name].add(package_version_key)
 
-            # package has already been listed during a previous listing process
-            if package_name in self.state.package_versions:
-                new_versions = (
-                    self.package_versions[package_name]
-                    - self.state.package_versions[package_name]
-                )
-                # no new versions so far, no need to send the origin to the scheduler
-                if not new_versions:
-                    origins_to_send.pop(origin_url, None)
+            # package has already been listed during a previous listing process,
+            # whether its versions changed is only known once all pages are processed
+            if package_name in self.state.package_versions_digests:
+                origins_to_send.pop(origin_url, None)
 
-        logger.debug("Found %s new packages.", len(origins_to_send))
+        last_page = (self.current_suite, self.current_component) == (
+            self.suites[-1],
+            self.components[-1],
+        )
+        if last_page:
+            # last page, send the previously listed packages whose versions changed
+            for package_name, package_versions in self.package_versions.items():
+                digest = self.state.package_versions_digests.get(package_name)
+                if digest is not None and digest != versions_digest(package_versions):
+                    origin_url = self.origin_url_for_package(package_name)
+                    origins_to_send[origin_url] = self.listed_origins[origin_url]
+
+        logger.debug("Found %s new or updated packages.", len(origins_to_send))
         logger.debug(
             "Current total number of listed packages is equal to %s.",
             len(self.listed_origins),
@@ -281,7 +463,22 @@ class DebianLister(Lister[DebianListerState, DebianPageType]):
 
         yield from origins_to_send.values()
 
+        if last_page:
+            self.changed_packages_sent = True
+
     def finalize(self):
-        # set mapping between listed package names and versions as lister state
-        self.state.package_versions = self.package_versions
+        if self.package_versions:
+            # set mapping between listed package names and digests of their versions
+            # as lister state
+            package_versions_digests = {
+                package_name: versions_digest(package_versions)
+                for package_name, package_versions in self.package_versions.items()
+            }
+            if not self.changed_packages_sent:
+                # the listing stopped before the last page, keep the previous digests
+                # so that the changed packages are sent by the next listing
+                for package_name, digest in self.state.package_versions_digests.items():
+                    if package_name in package_versions_digests:
+                        package_versions_digests[package_name] = digest
+            self.state.package_versions_digests = package_versions_digests
         self.updated = len(self.listed_origins) > 0
@@ -6,6 +6,9 @@
 from collections import defaultdict
 from datetime import datetime
 from email.utils import formatdate, parsedate_to_datetime
+import gzip
+import hashlib
+import lzma
 import os
 from pathlib import Path
 from typing import Dict, List, Set, Tuple
@@ -20,6 +23,7 @@ from swh.lister.debian.lister import (
     PkgVersion,
     Suite,
 )
+from swh.lister.utils import versions_digest
 from swh.scheduler.interface import SchedulerInterface
 
 # Those tests use sample debian Sources files whose content has been extracted
@@ -60,12 +64,15 @@ def _init_test(
     swh_scheduler: SchedulerInterface,
     debian_sources: Dict[Suite, SourcesText],
     requests_mock,
+    index_workers: int = 1,
+    release_files: bool = True,
 ) -> Tuple[DebianLister, DebianSuitePkgSrcInfo, Dict[str, str]]:
     lister = DebianLister(
         scheduler=swh_scheduler,
         url=_mirror_url,
         suites=list(debian_sources.keys()),
         components=_components,
+        index_workers=index_workers,
     )
 
     suite_pkg_info: DebianSuitePkgSrcInfo = {}
@@ -93,6 +100,22 @@ def _init_test(
         for idx_url, _ in lister.debian_index_urls(suite, _components[1]):
             requests_mock.get(idx_url, status_code=404)
 
+        release_url = f"{_mirror_url}/dists/{suite}/InRelease"
+        if release_files:
+            sources_sha256 = hashlib.sha256(sources.encode()).hexdigest()
+            requests_mock.get(
+                release_url,
+                text=(
+                    f"Suite: {suite}\nSHA256:\n"
+                    f" {sources_sha256} {len(sources)} {_components[0]}/source/Sources\n"
+                ),
+            )
+        else:
+            requests_mock.get(release_url, status_code=404)
+            requests_mock.get(
+                release_url[: -len("InRelease")] + "Release", status_code=404
+            )
+
     return lister, suite_pkg_info, last_modified
 
 
@@ -150,25 +173,26 @@ def _check_listed_origins(
                         assert filename in package_files
                         assert package_files[filename]["uri"] == file_uri
 
-                    # check listed package version is in lister state
-                    assert package_name in lister.state.package_versions
-                    assert (
-                        package_version_key
-                        in lister.state.package_versions[package_name]
-                    )
+                    # check listed package versions digest is in lister state
+                    assert package_version_key in lister.package_versions[package_name]
+                    assert lister.state.package_versions_digests[
+                        package_name
+                    ] == versions_digest(lister.package_versions[package_name])
     return origin_urls
 
 
+@pytest.mark.parametrize("index_workers", [1, 4])
 def test_lister_debian_all_suites(
     swh_scheduler: SchedulerInterface,
     debian_sources: Dict[Suite, SourcesText],
     requests_mock,
+    index_workers: int,
 ):
     """
     Simulate a full listing of main component packages for all debian suites.
     """
     lister, suite_pkg_info, last_modified = _init_test(
-        swh_scheduler, debian_sources, requests_mock
+        swh_scheduler, debian_sources, requests_mock, index_workers
     )
 
     stats = lister.run()
@@ -184,12 +208,93 @@ def test_lister_debian_all_suites(
     assert stats.pages == len(_suites) * len(_components)
     assert stats.origins == len(origin_urls)
 
+    # Sources files did not change according to release files
+    stats = lister.run()
+
+    assert stats.pages == 0
+    assert stats.origins == 0
+
+    # Sources file of a suite changed, all Sources files are listed again
+    debian_sources = dict(debian_sources)
+    debian_sources[_suites[0]] += "\n"
+    lister, _, _ = _init_test(
+        swh_scheduler, debian_sources, requests_mock, index_workers
+    )
+
     stats = lister.run()
 
     assert stats.pages == len(_suites) * len(_components)
     assert stats.origins == 0
 
 
+@pytest.mark.parametrize("index_workers", [1, 4])
+def test_lister_debian_missing_sources_index(
+    swh_scheduler: SchedulerInterface,
+    debian_sources: Dict[Suite, SourcesText],
+    requests_mock,
+    index_workers: int,
+):
+    """
+    Check the listing is not skipped when a Sources file listed in a release file
+    could not be retrieved by the previous listing.
+    """
+    lister, _, _ = _init_test(
+        swh_scheduler, debian_sources, requests_mock, index_workers
+    )
+    for idx_url, _ in lister.debian_index_urls(_suites[0], _components[0]):
+        requests_mock.get(idx_url, status_code=404)
+
+    stats = lister.run()
+    assert stats.pages == len(_suites) * len(_components)
+    assert lister.origin_url_for_package("dh-elpa") not in lister.recorded_origins
+    assert lister.state.release_checksums == {}
+
+    # release files did not change but the stretch main Sources file is now served
+    lister, _, _ = _init_test(
+        swh_scheduler, debian_sources, requests_mock, index_workers
+    )
+    stats = lister.run()
+    assert stats.pages == len(_suites) * len(_components)
+    assert lister.origin_url_for_package("dh-elpa") in lister.recorded_origins
+
+    stats = lister.run()
+    assert stats.pages == 0
+
+
+@pytest.mark.parametrize("compression", ["", "xz"])
+@pytest.mark.parametrize("index_workers", [1, 4])
+def test_lister_debian_content_encoded_sources_index(
+    swh_scheduler: SchedulerInterface,
+    debian_sources: Dict[Suite, SourcesText],
+    requests_mock,
+    index_workers: int,
+    compression: str,
+):
+    """
+    Check Sources files served with a gzip Content-Encoding are decoded.
+    """
+    lister, suite_pkg_info, last_modified = _init_test(
+        swh_scheduler, debian_sources, requests_mock, index_workers
+    )
+    for suite, sources in debian_sources.items():
+        content = sources.encode()
+        if compression:
+            content = lzma.compress(content)
+        for idx_url, idx_compression in lister.debian_index_urls(suite, _components[0]):
+            if idx_compression == compression:
+                requests_mock.get(
+                    idx_url,
+                    content=gzip.compress(content),
+                    headers={"Content-Encoding": "gzip"},
+                )
+
+    stats = lister.run()
+
+    assert stats.origins == len(
+        {pkg for pkg_info in suite_pkg_info.values() for pkg in pkg_info}
+    )
+
+
 @pytest.mark.parametrize(
     "suites_params",
     [
@@ -198,11 +303,13 @@ def test_lister_debian_all_suites(
         [_suites[:1], _suites[:2], _suites],
     ],
 )
+@pytest.mark.parametrize("index_workers", [1, 4])
 def test_lister_debian_updated_packages(
     swh_scheduler: SchedulerInterface,
     debian_sources: Dict[Suite, SourcesText],
     requests_mock,
     suites_params: List[Suite],
+    index_workers: int,
 ):
     """
     Simulate incremental listing of main component packages by adding new suite
@@ -215,7 +322,7 @@ def test_lister_debian_updated_packages(
         sources = {suite: debian_sources[suite] for suite in suites}
 
         lister, suite_pkg_info, last_modified = _init_test(
-            swh_scheduler, sources, requests_mock
+            swh_scheduler, sources, requests_mock, index_workers
         )
 
         stats = lister.run()
@@ -231,7 +338,7 @@ def test_lister_debian_updated_packages(
         assert stats.pages == len(sources) * len(_components)
         assert stats.origins == len(origin_urls)
 
-        lister_previous_state = lister.state.package_versions
+        lister_previous_state = lister.package_versions
 
         # only new packages or packages with new versions should be listed
         if len(suites) > 1 and idx < len(suites) - 1:
@@ -240,6 +347,120 @@ def test_lister_debian_updated_packages(
             assert stats.origins != 0
 
 
+def test_lister_debian_state_versions_lists_migration(
+    swh_scheduler: SchedulerInterface,
+    debian_sources: Dict[Suite, SourcesText],
+    requests_mock,
+):
+    """
+    Check a lister state holding lists of package versions, as recorded by previous
+    versions of the lister, is converted to versions digests.
+    """
+    lister, _, _ = _init_test(swh_scheduler, debian_sources, requests_mock)
+    lister.run()
+
+    lister.state = lister.state_from_dict(
+        {
+            package_name: sorted(package_versions)
+            for package_name, package_versions in lister.package_versions.items()
+        }
+    )
+    assert lister.state.package_versions_digests == {
+        package_name: versions_digest(package_versions)
+        for package_name, package_versions in lister.package_versions.items()
+    }
+    lister.set_state_in_scheduler()
+
+    # no package versions changed since the previous listing
+    lister, _, _ = _init_test(swh_scheduler, debian_sources, requests_mock)
+    stats = lister.run()
+    assert stats.origins == 0
+
+    # removing the stretch suite changes the digest of git versions only
+    sources = {suite: debian_sources[suite] for suite in _suites[1:]}
+    lister, _, _ = _init_test(swh_scheduler, sources, requests_mock)
+    stats = lister.run()
+    assert stats.origins == 1
+
+
+def test_lister_debian_updated_packages_interrupted_listing(
+    swh_scheduler: SchedulerInterface,
+    debian_sources: Dict[Suite, SourcesText],
+    requests_mock,
+):
+    """
+    Check packages whose versions changed are still sent by the next listing when
+    a listing stops before processing the last page.
+    """
+    sources = {suite: debian_sources[suite] for suite in _suites[:1]}
+    lister, _, _ = _init_test(swh_scheduler, sources, requests_mock)
+    lister.run()
+    stretch_digests = lister.state.package_versions_digests
+
+    # git versions change on the buster main page but the listing stops after it
+    sources = {suite: debian_sources[suite] for suite in _suites[:2]}
+    lister, _, _ = _init_test(swh_scheduler, sources, requests_mock)
+    lister.max_pages = 3
+    stats = lister.run()
+    assert stats.pages == 3
+    assert stats.origins == 1  # new subversion package
+    assert lister.state.package_versions_digests["git"] == stretch_digests["git"]
+    assert lister.state.package_versions_digests["subversion"]
+
+    lister, _, _ = _init_test(swh_scheduler, sources, requests_mock)
+    stats = lister.run()
+    assert stats.origins == 1
+    assert lister.recorded_origins == {lister.origin_url_for_package("git")}
+    assert lister.state.package_versions_digests["git"] != stretch_digests["git"]
+
+
+@pytest.mark.parametrize("index_workers", [1, 4])
+def test_lister_debian_served_index_urls(
+    swh_scheduler: SchedulerInterface,
+    debian_sources: Dict[Suite, SourcesText],
+    requests_mock,
+    index_workers: int,
+):
+    """
+    Check the Sources file URLs served by the mirror are tried first during
+    the next listings.
+    """
+    lister, _, _ = _init_test(
+        swh_scheduler, debian_sources, requests_mock, index_workers
+    )
+    lister.run()
+
+    served_urls = {
+        f"{suite}/{_components[0]}": list(
+            lister.debian_index_urls(suite, _components[0])
+        )[-1][0]
+        for suite in _suites
+    }
+    assert lister.state.index_urls == served_urls
+
+    lister, _, _ = _init_test(
+        swh_scheduler,
+        debian_sources,
+        requests_mock,
+        index_workers,
+        release_files=False,
+    )
+    assert lister.state.index_urls == served_urls
+    requests_mock.reset_mock()
+    stats = lister.run()
+    assert stats.origins == 0
+
+    requested_urls = [request.url for request in requests_mock.request_history]
+    # Sources files of main component are found with a single request
+    for served_url in served_urls.values():
+        assert requested_urls.count(served_url) == 1
+    # all URLs of the missing foo component are still probed, after the release
+    # files of the first suite
+    assert len(requested_urls) == 2 + len(_suites) * (
+        1 + len(list(lister.debian_index_urls(_suites[0], _components[1])))
+    )
+
+
 @pytest.mark.parametrize(
     "credentials, expected_credentials",
     [
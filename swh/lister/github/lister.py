@@ -6,10 +6,13 @@
 from dataclasses import asdict, dataclass
 import datetime
 import logging
-from typing import Any, Dict, Iterator, List, Optional, Set
+import math
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
 from urllib.parse import parse_qs, urlparse
 
 import iso8601
+import requests
+from tenacity import RetryError
 
 from swh.core.github.utils import MissingRateLimitReset
 from swh.scheduler.interface import SchedulerInterface
@@ -28,6 +31,42 @@ class GitHubListerState:
     """Numeric id of the last repository listed on an incremental pass"""
 
 
+def split_id_ranges(
+    densities: List[Tuple[int, float]], last_id: int, range_size: int
+) -> List[Tuple[int, int]]:
+    """Split the ``[0, last_id]`` id space in ranges holding roughly
+    ``range_size`` repositories each.
+
+    Args:
+      densities: list of ``(first id, repositories per id)`` tuples sorted by id,
+        describing the estimated density of repositories from each first id up to
+        the next one (or up to ``last_id`` for the last one)
+      last_id: the last id of the id space
+      range_size: the expected number of repositories in each range
+
+    Returns:
+      the list of ``(first_id, last_id)`` bounds of the ranges, covering the whole
+      id space
+    """
+    ranges: List[Tuple[int, int]] = []
+    range_start = 0
+    work = 0.0
+    segment_ends = [start for start, _ in densities[1:]] + [last_id]
+    for (position, density), end in zip(densities, segment_ends):
+        while density > 0 and work + density * (end - position) >= range_size:
+            step = max(1, math.ceil((range_size - work) / density))
+            position = min(end, position + step)
+            ranges.append((range_start, position))
+            range_start = position
+            work = 0.0
+        work += density * (end - position)
+
+    if range_start < last_id:
+        ranges.append((range_start, last_id))
+
+    return ranges
+
+
 class GitHubLister(Lister[GitHubListerState, List[Dict[str, Any]]]):
     """List origins from GitHub.
 
@@ -78,6 +117,7 @@ class GitHubLister(Lister[GitHubListerState, List[Dict[str, Any]]]):
         enable_origins: bool = True,
         first_id: Optional[int] = None,
         last_id: Optional[int] = None,
+        prefetch_pages: int = 0,
     ):
         super().__init__(
             scheduler=scheduler,
@@ -88,12 +128,15 @@ class GitHubLister(Lister[GitHubListerState, List[Dict[str, Any]]]):
             max_origins_per_page=max_origins_per_page,
             max_pages=max_pages,
             enable_origins=enable_origins,
+            prefetch_pages=prefetch_pages,
         )
 
         self.first_id = first_id
         self.last_id = last_id
 
         self.relisting = self.first_id is not None or self.last_id is not None
+        self.last_listed_id: int = self.first_id or 0
+        """Id of the last repository listed during the current run"""
 
     def state_from_dict(self, d: Dict[str, Any]) -> GitHubListerState:
         return GitHubListerState(**d)
@@ -153,6 +196,53 @@ class GitHubLister(Lister[GitHubListerState, List[Dict[str, Any]]]):
             current_id = int(parsed_query["since"][0])
             current_url = next_url
 
+    def sample_id_density(self, last_id: int, samples: int) -> List[Tuple[int, float]]:
+        """Estimate the density of repositories over the ``[0, last_id]`` id space.
+
+        The id space is split in ``samples`` segments of equal size, and the first
+        page of repositories of each segment is fetched to estimate how many
+        repositories exist per id in that segment. Segments whose page could not be
+        fetched get the average density of the other ones.
+
+        Returns:
+          a list of ``(segment first id, repositories per id)`` tuples, suitable
+          for :func:`split_id_ranges`
+        """
+        assert self.github_session is not None
+        step = max(1, math.ceil(last_id / samples))
+        sampled: List[Tuple[int, Optional[float]]] = []
+
+        for start in range(0, last_id, step):
+            density: Optional[float] = None
+            try:
+                response = self.github_session.request(
+                    f"{self.API_URL}?since={start}&per_page={self.PAGE_SIZE}"
+                )
+            except (
+                MissingRateLimitReset,
+                RetryError,
+                requests.exceptions.RequestException,
+            ):
+                # leave the segment unsampled rather than aborting the whole run
+                response = None
+
+            if response is not None and response.status_code == 200:
+                repos = [repo for repo in response.json() if repo]
+                if repos and repos[-1]["id"] > start:
+                    density = len(repos) / (repos[-1]["id"] - start)
+                else:
+                    density = 0.0
+            else:
+                logger.warning("Could not sample repositories after id %s", start)
+            sampled.append((start, density))
+
+        known = [density for _, density in sampled if density is not None]
+        default = sum(known) / len(known) if known else 1.0
+        return [
+            (start, density if density is not None else default)
+            for start, density in sampled
+        ]
+
     def get_origins_from_page(
         self, page: List[Dict[str, Any]]
     ) -> Iterator[ListedOrigin]:
@@ -188,16 +278,17 @@ class GitHubLister(Lister[GitHubListerState, List[Dict[str, Any]]]):
 
     def commit_page(self, page: List[Dict[str, Any]]):
         """Update the currently stored state using the latest listed page"""
-        if self.relisting:
-            # Don't update internal state when relisting
-            return
-
         if not page:
             # Sometimes, when you reach the end of the world, GitHub returns an empty
             # page of repositories
             return
 
         last_id = page[-1]["id"]
+        self.last_listed_id = max(self.last_listed_id, last_id)
+
+        if self.relisting:
+            # Don't update internal state when relisting
+            return
 
         if last_id > self.state.last_seen_id:
             self.state.last_seen_id = last_id
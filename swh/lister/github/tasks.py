@@ -1,15 +1,30 @@
-# Copyright (C) 2017-2019  The Software Heritage developers
+# Copyright (C) 2017-2026  The Software Heritage developers
 # License: GNU General Public License version 3, or any later version
 # See top-level LICENSE file for more information
 
+import logging
 import random
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple
 
 from celery import group, shared_task
 
-from swh.lister.github.lister import GitHubLister
+from swh.lister.github.lister import GitHubLister, split_id_ranges
+
+logger = logging.getLogger(__name__)
 
 GROUP_SPLIT = 100000
+"""Number of ids per range, when splitting the id space in fixed size ranges"""
+
+DENSITY_SAMPLES = 200
+"""Number of pages fetched to estimate the density of repository ids"""
+
+RANGE_SIZE = 50000
+"""Estimated number of repositories per range"""
+
+RANGE_MAX_PAGES = 1000
+"""Number of pages listed by a range task before splitting the rest of its range in
+new tasks (GitHub returns 100 repositories per page, so this is about twice the
+expected size of a range)"""
 
 
 @shared_task(name=__name__ + ".IncrementalGitHubLister")
@@ -20,29 +35,77 @@ def list_github_incremental() -> Dict[str, int]:
 
 
 @shared_task(name=__name__ + ".RangeGitHubLister")
-def _range_github_lister(first_id: int, last_id: int) -> Dict[str, int]:
-    lister = GitHubLister.from_configfile(first_id=first_id, last_id=last_id)
-    return lister.run().dict()
+def _range_github_lister(
+    first_id: int, last_id: int, max_pages: Optional[int] = None
+) -> Dict[str, int]:
+    """List a range of GitHub repository ids.
+
+    When ``max_pages`` is reached before the end of the range, the rest of the range
+    is split in two halves listed by new tasks.
+    """
+    lister = GitHubLister.from_configfile(
+        first_id=first_id, last_id=last_id, max_pages=max_pages
+    )
+    stats = lister.run()
+
+    if max_pages and stats.pages >= max_pages and lister.last_listed_id < last_id:
+        resume_id = lister.last_listed_id
+        middle_id = (resume_id + last_id) // 2
+        ranges = [
+            (minv, maxv)
+            for minv, maxv in ((resume_id, middle_id), (middle_id, last_id))
+            if minv < maxv
+        ]
+        group(
+            _range_github_lister.s(first_id=minv, last_id=maxv, max_pages=max_pages)
+            for minv, maxv in ranges
+        )()
+        logger.info(
+            "Range (%s, %s] too slow, split remaining ids in %s",
+            first_id,
+            last_id,
+            ranges,
+        )
+
+    return stats.dict()
 
 
 @shared_task(name=__name__ + ".FullGitHubRelister", bind=True)
-def list_github_full(self, split: Optional[int] = None) -> str:
+def list_github_full(
+    self,
+    split: Optional[int] = None,
+    samples: Optional[int] = None,
+    range_size: Optional[int] = None,
+    max_pages: Optional[int] = RANGE_MAX_PAGES,
+) -> str:
     """Full update of GitHub
 
     It's not to be called for an initial listing.
 
+    By default, the density of repository ids is sampled with ``samples`` requests to
+    produce ranges of about ``range_size`` repositories each. When ``split`` is set,
+    the id space is rather split in ranges of ``split`` ids.
+
+    Range tasks listing more than ``max_pages`` pages split the rest of their range
+    in new tasks.
     """
     lister = GitHubLister.from_configfile()
     last_index = lister.state.last_seen_id
 
-    bounds = list(range(0, last_index + 1, split or GROUP_SPLIT))
-    if bounds[-1] != last_index:
-        bounds.append(last_index)
+    ranges: List[Tuple[int, int]]
+    if split:
+        bounds = list(range(0, last_index + 1, split))
+        if bounds[-1] != last_index:
+            bounds.append(last_index)
+        ranges = list(zip(bounds[:-1], bounds[1:]))
+    else:
+        densities = lister.sample_id_density(last_index, samples or DENSITY_SAMPLES)
+        ranges = split_id_ranges(densities, last_index, range_size or RANGE_SIZE)
 
-    ranges = list(zip(bounds[:-1], bounds[1:]))
     random.shuffle(ranges)
     promise = group(
-        _range_github_lister.s(first_id=minv, last_id=maxv) for minv, maxv in ranges
+        _range_github_lister.s(first_id=minv, last_id=maxv, max_pages=max_pages)
+        for minv, maxv in ranges
     )()
     self.log.debug("%s OK (spawned %s subtasks)" % (self.name, len(ranges)))
     try:
@@ -8,9 +8,10 @@ import logging
 from typing import Any, Dict, List
 
 import pytest
+import requests
 
 from swh.core.github.pytest_plugin import github_response_callback
-from swh.lister.github.lister import GitHubLister
+from swh.lister.github.lister import GitHubLister, split_id_ranges
 from swh.lister.pattern import CredentialsType, ListerStats
 from swh.scheduler.interface import SchedulerInterface
 from swh.scheduler.model import Lister
@@ -247,3 +248,63 @@ def test_ratelimit_reset_sleep(
                 break
 
     assert found_exhaustion_message
+
+
+def test_sample_id_density(swh_scheduler, requests_mocker) -> None:
+    lister = GitHubLister(scheduler=swh_scheduler)
+
+    densities = lister.sample_id_density(last_id=ORIGIN_COUNT, samples=4)
+
+    # the mocked API returns contiguous repository ids, up to ORIGIN_COUNT
+    assert densities == [(0, 1.0), (2500, 1.0), (5000, 1.0), (7500, 1.0)]
+
+    densities = lister.sample_id_density(last_id=2 * ORIGIN_COUNT, samples=4)
+
+    # pages past ORIGIN_COUNT are empty
+    assert densities == [(0, 1.0), (5000, 1.0), (10000, 0.0), (15000, 0.0)]
+
+
+@pytest.mark.parametrize(
+    "failure",
+    [{"status_code": 502}, {"exc": requests.exceptions.ConnectionError}],
+    ids=["bad-gateway", "connection-error"],
+)
+def test_sample_id_density_failing_sample(
+    swh_scheduler, requests_mock, monkeypatch_sleep_calls, failure
+) -> None:
+    requests_mock.get(GitHubLister.API_URL, json=response_callback)
+    requests_mock.get(
+        f"{GitHubLister.API_URL}?since=5000&per_page={GitHubLister.PAGE_SIZE}",
+        complete_qs=True,
+        **failure,
+    )
+    lister = GitHubLister(scheduler=swh_scheduler)
+
+    densities = lister.sample_id_density(last_id=2 * ORIGIN_COUNT, samples=4)
+
+    # the failing segment gets the average density of the sampled ones
+    assert densities == [(0, 1.0), (5000, 1 / 3), (10000, 0.0), (15000, 0.0)]
+
+
+@pytest.mark.parametrize(
+    "densities,last_id,range_size,expected_ranges",
+    [
+        ([(0, 1.0)], 100, 25, [(0, 25), (25, 50), (50, 75), (75, 100)]),
+        ([(0, 1.0)], 110, 25, [(0, 25), (25, 50), (50, 75), (75, 100), (100, 110)]),
+        ([(0, 0.1), (100, 1.0)], 150, 20, [(0, 110), (110, 130), (130, 150)]),
+        ([(0, 1.0), (50, 0.0)], 1000, 20, [(0, 20), (20, 40), (40, 1000)]),
+        ([(0, 0.0)], 1000, 20, [(0, 1000)]),
+    ],
+)
+def test_split_id_ranges(densities, last_id, range_size, expected_ranges) -> None:
+    assert split_id_ranges(densities, last_id, range_size) == expected_ranges
+
+
+def test_relister_last_listed_id(swh_scheduler, requests_mocker) -> None:
+    lister = GitHubLister(
+        scheduler=swh_scheduler, first_id=2000, last_id=8000, max_pages=2
+    )
+    res = lister.run()
+
+    assert res == ListerStats(pages=2, origins=2000)
+    assert lister.last_listed_id == 4000
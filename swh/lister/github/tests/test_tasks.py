@@ -8,7 +8,8 @@ from unittest.mock import call, patch
 
 from celery.result import GroupResult
 
-from swh.lister.github.lister import GitHubListerState
+from swh.lister.github.lister import GitHubListerState, split_id_ranges
+from swh.lister.github.tasks import RANGE_MAX_PAGES
 from swh.lister.pattern import ListerStats
 
 
@@ -52,10 +53,51 @@ def test_range(lister, swh_scheduler_celery_app, swh_scheduler_celery_worker):
     res.wait()
     assert res.successful()
 
-    lister.from_configfile.assert_called_once_with(first_id=12, last_id=42)
+    lister.from_configfile.assert_called_once_with(
+        first_id=12, last_id=42, max_pages=None
+    )
     lister.run.assert_called_once_with()
 
 
+@patch("swh.lister.github.tasks.GitHubLister")
+def test_range_split_slow(
+    lister, swh_scheduler_celery_app, swh_scheduler_celery_worker
+):
+    # setup the mocked GitHubLister, which only reaches id 20 in the first run
+    lister.from_configfile.return_value = lister
+    lister.last_listed_id = 20
+    lister.run.side_effect = [
+        ListerStats(pages=3, origins=300),
+        ListerStats(pages=1, origins=100),
+        ListerStats(pages=1, origins=100),
+    ]
+
+    res = swh_scheduler_celery_app.send_task(
+        "swh.lister.github.tasks.RangeGitHubLister",
+        kwargs=dict(first_id=12, last_id=42, max_pages=3),
+    )
+    assert res
+    res.wait()
+    assert res.successful()
+    assert res.result == ListerStats(pages=3, origins=300).dict()
+
+    # wait for the subtasks listing the rest of the range
+    for i in range(5):
+        if lister.run.call_count == 3:
+            break
+        sleep(1)
+
+    assert lister.from_configfile.call_args_list[0] == call(
+        first_id=12, last_id=42, max_pages=3
+    )
+    assert sorted(
+        lister.from_configfile.call_args_list[1:], key=lambda c: c[1]["first_id"]
+    ) == [
+        call(first_id=20, last_id=31, max_pages=3),
+        call(first_id=31, last_id=42, max_pages=3),
+    ]
+
+
 @patch("swh.lister.github.tasks.GitHubLister")
 def test_lister_full(lister, swh_scheduler_celery_app, swh_scheduler_celery_worker):
     last_index = 1000000
@@ -69,7 +111,7 @@ def test_lister_full(lister, swh_scheduler_celery_app, swh_scheduler_celery_work
     lister.run.return_value = ListerStats(pages=10, origins=10000)
 
     res = swh_scheduler_celery_app.send_task(
-        "swh.lister.github.tasks.FullGitHubRelister"
+        "swh.lister.github.tasks.FullGitHubRelister", kwargs=dict(split=100000)
     )
     assert res
 
@@ -93,6 +135,43 @@ def test_lister_full(lister, swh_scheduler_celery_app, swh_scheduler_celery_work
     range_calls = lister.from_configfile.call_args_list[1:]
     # Check exhaustivity of the range calls
     assert sorted(range_calls, key=lambda c: c[1]["first_id"]) == [
-        call(first_id=f, last_id=l)
+        call(first_id=f, last_id=l, max_pages=RANGE_MAX_PAGES)
         for f, l in zip(expected_bounds[:-1], expected_bounds[1:])
     ]
+
+
+@patch("swh.lister.github.tasks.GitHubLister")
+def test_lister_full_density(
+    lister, swh_scheduler_celery_app, swh_scheduler_celery_worker
+):
+    last_index = 1000000
+    densities = [(0, 0.01), (250000, 0.5), (500000, 0.05), (750000, 0.001)]
+    expected_ranges = split_id_ranges(densities, last_index, 20000)
+
+    # setup the mocked GitHubLister
+    lister.state = GitHubListerState(last_seen_id=last_index)
+    lister.from_configfile.return_value = lister
+    lister.sample_id_density.return_value = densities
+    lister.run.return_value = ListerStats(pages=10, origins=10000)
+
+    res = swh_scheduler_celery_app.send_task(
+        "swh.lister.github.tasks.FullGitHubRelister",
+        kwargs=dict(samples=4, range_size=20000, max_pages=None),
+    )
+    assert res
+
+    res.wait()
+    assert res.successful()
+
+    promise = GroupResult.restore(res.result, app=swh_scheduler_celery_app)
+    for i in range(5):
+        if promise.ready():
+            break
+        sleep(1)
+
+    lister.sample_id_density.assert_called_once_with(last_index, 4)
+
+    range_calls = lister.from_configfile.call_args_list[1:]
+    assert sorted(range_calls, key=lambda c: c[1]["first_id"]) == [
+        call(first_id=f, last_id=l, max_pages=None) for f, l in expected_ranges
+    ]
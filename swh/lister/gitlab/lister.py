@@ -82,6 +82,13 @@ class GitLabLister(Lister[GitLabListerState, PageResult]):
     By default, the lister runs in incremental mode: it lists all repositories,
     starting with the `last_seen_next_link` stored in the scheduler backend.
 
+    Providing the `first_id` and `last_id` arguments enables the "relisting" mode: in
+    that mode, the lister finds the projects whose id is **strictly greater** than
+    `first_id` and stops after reaching `last_id`, possibly overrunning it by up to a
+    page of projects. This allows to split the listing of large instances in ranges
+    processed concurrently. The lister state in the scheduler backend is not updated
+    when relisting.
+
     Args:
         scheduler: a scheduler instance
         url: the URL of the GitLab instance to visit (e.g. https://gitlab.com/)
@@ -89,6 +96,9 @@ class GitLabLister(Lister[GitLabListerState, PageResult]):
             URL network location will be used if not provided
         incremental: defines if incremental listing is activated or not
         ignored_project_prefixes: List of prefixes of project paths to ignore
+        first_id: the id of the project after which listing starts
+        last_id: stop listing after seeing a project with an id higher than this
+            value
 
     """
 
@@ -107,6 +117,9 @@ class GitLabLister(Lister[GitLabListerState, PageResult]):
         enable_origins: bool = True,
         incremental: bool = False,
         ignored_project_prefixes: Optional[List[str]] = None,
+        prefetch_pages: int = 0,
+        first_id: Optional[int] = None,
+        last_id: Optional[int] = None,
     ):
         # FIXME: remove once the scheduler database is updated
         if url is not None:
@@ -123,11 +136,15 @@ class GitLabLister(Lister[GitLabListerState, PageResult]):
             max_origins_per_page=max_origins_per_page,
             max_pages=max_pages,
             enable_origins=enable_origins,
+            prefetch_pages=prefetch_pages,
         )
 
         self.api_url = f"{self.url.removesuffix('/')}/{self.API_BASE}"
 
         self.incremental = incremental
+        self.first_id = first_id
+        self.last_id = last_id
+        self.relisting = self.first_id is not None or self.last_id is not None
         self.last_page: Optional[str] = None
         self.per_page = 100
         self.ignored_project_prefixes: Optional[Tuple[str, ...]] = None
@@ -205,7 +222,9 @@ class GitLabLister(Lister[GitLabListerState, PageResult]):
 
     def get_pages(self) -> Iterator[PageResult]:
         next_page: Optional[str]
-        if self.incremental and self.state and self.state.last_seen_next_link:
+        if self.relisting:
+            next_page = self.page_url(self.first_id)
+        elif self.incremental and self.state and self.state.last_seen_next_link:
             next_page = self.state.last_seen_next_link
         else:
             next_page = self.page_url()
@@ -216,6 +235,28 @@ class GitLabLister(Lister[GitLabListerState, PageResult]):
             yield page_result
             next_page = page_result.next_page
 
+            if self.last_id is not None:
+                id_after = _parse_id_after(next_page)
+                if id_after is not None and id_after >= self.last_id:
+                    logger.debug("Reached the end of range (%s)", self.last_id)
+                    break
+
+    def get_last_project_id(self) -> Optional[int]:
+        """Return the id of the most recent project of the instance, as seen in
+        the state of the last incremental listing or, if none, as returned by the
+        projects API."""
+        last_project_id = _parse_id_after(self.state.last_seen_next_link)
+        if last_project_id is not None:
+            return last_project_id
+
+        parameters = {"order_by": "id", "sort": "desc", "simple": "true", "per_page": 1}
+        page_result = self.get_page_result(
+            f"{self.api_url}/projects?{urlencode(parameters)}"
+        )
+        if not page_result.repositories:
+            return None
+        return page_result.repositories[0]["id"]
+
     def _get_visit_type(self, repo: Repository) -> str:
         return "git"
 
@@ -242,10 +283,10 @@ class GitLabLister(Lister[GitLabListerState, PageResult]):
         Relevancy is determined by the next_page link whose 'page' id must be strictly
         superior to the currently stored one.
 
-        Note: this is a noop for full listing mode
+        Note: this is a noop for full listing and relisting modes
 
         """
-        if self.incremental:
+        if self.incremental and not self.relisting:
             # link: https://${project-api}/?...&page=2x...
             next_page = page_result.next_page
             if not next_page and self.last_page:
@@ -264,11 +305,11 @@ class GitLabLister(Lister[GitLabListerState, PageResult]):
     def finalize(self) -> None:
         """finalize the lister state when relevant (see `fn:commit_page` for details)
 
-        Note: this is a noop for full listing mode
+        Note: this is a noop for full listing and relisting modes
 
         """
         next_page = self.state.last_seen_next_link
-        if self.incremental and next_page:
+        if self.incremental and not self.relisting and next_page:
             # link: https://${project-api}/?...&page=2x...
             next_id_after = _parse_id_after(next_page)
             scheduler_state = self.get_state_from_scheduler()
@@ -282,3 +323,10 @@ class GitLabLister(Lister[GitLabListerState, PageResult]):
                 and previous_next_id_after < next_id_after
             ):
                 self.updated = True
+
+    def set_state_in_scheduler(
+        self, with_listing_finished_date: bool = False, force_state: bool = False
+    ) -> None:
+        # gitlab range lister should not override shared incremental lister state
+        if not self.relisting:
+            super().set_state_in_scheduler(with_listing_finished_date, force_state)
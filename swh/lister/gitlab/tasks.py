@@ -1,11 +1,16 @@
-# Copyright (C) 2018-2021  The Software Heritage developers
+# Copyright (C) 2018-2026  The Software Heritage developers
 # License: GNU General Public License version 3, or any later version
 # See top-level LICENSE file for more information
 
-from celery import shared_task
+import random
+from typing import Optional
+
+from celery import group, shared_task
 
 from swh.lister.gitlab.lister import GitLabLister
 
+GROUP_SPLIT = 100000
+
 
 @shared_task(name=__name__ + ".IncrementalGitLabLister")
 def list_gitlab_incremental(**lister_args):
@@ -21,6 +26,42 @@ def list_gitlab_full(**lister_args):
     return lister.run().dict()
 
 
+@shared_task(name=__name__ + ".RangeGitLabLister")
+def _range_gitlab_lister(first_id: int, last_id: int, **lister_args):
+    lister = GitLabLister.from_configfile(
+        incremental=False, first_id=first_id, last_id=last_id, **lister_args
+    )
+    return lister.run().dict()
+
+
+@shared_task(name=__name__ + ".FullGitLabRangeRelister", bind=True)
+def list_gitlab_full_ranges(self, split: Optional[int] = None, **lister_args):
+    """Full update of a GitLab instance, split in ranges of project ids listed
+    concurrently"""
+    lister = GitLabLister.from_configfile(incremental=False, **lister_args)
+    last_index = lister.get_last_project_id()
+    if not last_index:
+        self.log.info("No project found for %s, nothing to list", lister.url)
+        return None
+
+    bounds = list(range(0, last_index + 1, split or GROUP_SPLIT))
+    if bounds[-1] != last_index:
+        bounds.append(last_index)
+
+    ranges = list(zip(bounds[:-1], bounds[1:]))
+    random.shuffle(ranges)
+    promise = group(
+        _range_gitlab_lister.s(first_id=minv, last_id=maxv, **lister_args)
+        for minv, maxv in ranges
+    )()
+    self.log.debug("%s OK (spawned %s subtasks)" % (self.name, len(ranges)))
+    try:
+        promise.save()  # so that we can restore the GroupResult in tests
+    except (NotImplementedError, AttributeError):
+        self.log.info("Unable to call save_group with current result backend.")
+    return promise.id
+
+
 @shared_task(name=__name__ + ".ping")
 def _ping():
     return "OK"
@@ -362,3 +362,66 @@ def test_lister_gitlab_ignored_project_prefixes(datadir, swh_scheduler, requests
         assert listed_origin.url.startswith(f"https://{instance}/")
         assert not listed_origin.url.startswith(f"https://{instance}/jonan/")
         assert listed_origin.last_update is not None
+
+
+def test_lister_gitlab_relisting(swh_scheduler, requests_mock, datadir):
+    """Gitlab lister supports listing a range of project ids without updating
+    its incremental state"""
+    instance = "gite.lirmm.fr"
+    url = f"https://{instance}/"
+    lister = GitLabLister(
+        swh_scheduler,
+        url=url,
+        instance=instance,
+        incremental=True,
+        first_id=1000,
+        last_id=2000,
+    )
+
+    url_page1 = lister.page_url(1000)
+    response1 = gitlab_page_response(datadir, instance, 1)
+    url_page2 = lister.page_url(1500)
+    response2 = gitlab_page_response(datadir, instance, 2)
+    url_page3 = lister.page_url(2000)
+
+    requests_mock.get(
+        url_page1,
+        [{"json": response1, "headers": {"Link": f"<{url_page2}>; rel=next"}}],
+        additional_matcher=_match_request,
+    )
+    requests_mock.get(
+        url_page2,
+        [{"json": response2, "headers": {"Link": f"<{url_page3}>; rel=next"}}],
+        additional_matcher=_match_request,
+    )
+    page3 = requests_mock.get(url_page3, [{"json": []}])
+
+    listed_result = lister.run()
+
+    expected_nb_origins = len(response1) + len(response2)
+    assert listed_result == ListerStats(pages=2, origins=expected_nb_origins)
+    # the end of range was reached, next page is not requested
+    assert not page3.called
+
+    # incremental state is left untouched
+    assert lister.state.last_seen_next_link is None
+    assert lister.get_state_from_scheduler().last_seen_next_link is None
+    assert lister.lister_obj.last_listing_finished_at is None
+
+
+def test_lister_gitlab_get_last_project_id(swh_scheduler, requests_mock):
+    instance = "gite.lirmm.fr"
+    lister = GitLabLister(swh_scheduler, instance=instance)
+
+    requests_mock.get(
+        f"{lister.api_url}/projects?order_by=id&sort=desc&simple=true&per_page=1",
+        [{"json": [{"id": 4242}]}, {"json": []}],
+        additional_matcher=_match_request,
+    )
+
+    assert lister.get_last_project_id() == 4242
+    assert lister.get_last_project_id() is None
+
+    # the incremental state is used when available
+    lister.state.last_seen_next_link = lister.page_url(5000)
+    assert lister.get_last_project_id() == 5000
@@ -3,6 +3,10 @@
 # License: GNU General Public License version 3, or any later version
 # See top-level LICENSE file for more information
 
+from time import sleep
+from unittest.mock import call
+
+from celery.result import GroupResult
 import pytest
 
 from swh.lister.pattern import ListerStats
@@ -46,3 +50,59 @@ def test_task_lister_gitlab(
     )
     mock_lister.run.assert_called_once_with()
     assert res.result == stats.dict()
+
+
+def test_task_lister_gitlab_range(
+    swh_scheduler_celery_app, swh_scheduler_celery_worker, mocker
+):
+    mock_lister = mocker.patch("swh.lister.gitlab.tasks.GitLabLister")
+    mock_lister.from_configfile.return_value = mock_lister
+    mock_lister.run.return_value = ListerStats(pages=10, origins=200)
+
+    kwargs = dict(url="https://gitlab.com/", first_id=12, last_id=42)
+    res = swh_scheduler_celery_app.send_task(
+        "swh.lister.gitlab.tasks.RangeGitLabLister",
+        kwargs=kwargs,
+    )
+    assert res
+    res.wait()
+    assert res.successful()
+
+    mock_lister.from_configfile.assert_called_once_with(incremental=False, **kwargs)
+    mock_lister.run.assert_called_once_with()
+
+
+def test_task_lister_gitlab_full_ranges(
+    swh_scheduler_celery_app, swh_scheduler_celery_worker, mocker
+):
+    last_index = 1000000
+    expected_bounds = list(range(0, last_index + 1, 300000)) + [last_index]
+
+    mock_lister = mocker.patch("swh.lister.gitlab.tasks.GitLabLister")
+    mock_lister.from_configfile.return_value = mock_lister
+    mock_lister.get_last_project_id.return_value = last_index
+    mock_lister.run.return_value = ListerStats(pages=10, origins=200)
+
+    url = "https://gitlab.com/"
+    res = swh_scheduler_celery_app.send_task(
+        "swh.lister.gitlab.tasks.FullGitLabRangeRelister",
+        kwargs=dict(url=url, split=300000),
+    )
+    assert res
+    res.wait()
+    assert res.successful()
+
+    promise = GroupResult.restore(res.result, app=swh_scheduler_celery_app)
+    for _ in range(5):
+        if promise.ready():
+            break
+        sleep(1)
+
+    assert mock_lister.from_configfile.call_args_list[0] == call(
+        incremental=False, url=url
+    )
+    range_calls = mock_lister.from_configfile.call_args_list[1:]
+    assert sorted(range_calls, key=lambda c: c.kwargs["first_id"]) == [
+        call(incremental=False, first_id=f, last_id=l, url=url)
+        for f, l in zip(expected_bounds[:-1], expected_bounds[1:])
+    ]
@@ -37,7 +37,18 @@ class GNULister(StatelessLister[GNUPageType]):
         max_origins_per_page: Optional[int] = None,
         max_pages: Optional[int] = None,
         enable_origins: bool = True,
+        download_cache_dir: Optional[str] = None,
+        download_cache_max_size: int = 256 * 1024 * 1024,
     ):
+        """Lister for the GNU FTP server.
+
+        Args:
+            download_cache_dir: directory where the tree.json.gz file is kept
+                between runs, to only download it again when it changed upstream.
+                Nothing is listed if it did not change since it was last listed.
+            download_cache_max_size: defaults to 256MiB. Maximum size in bytes of
+                the files kept in ``download_cache_dir``.
+        """
         super().__init__(
             scheduler=scheduler,
             url=url,
@@ -46,6 +57,8 @@ class GNULister(StatelessLister[GNUPageType]):
             max_origins_per_page=max_origins_per_page,
             max_pages=max_pages,
             enable_origins=enable_origins,
+            download_cache_dir=download_cache_dir,
+            download_cache_max_size=download_cache_max_size,
         )
         # no side-effect calls in constructor, if extra state is needed, as preconized
         # by the pattern docstring, this must happen in the get_pages method.
@@ -56,8 +69,21 @@ class GNULister(StatelessLister[GNUPageType]):
         Yield a single page listing all GNU projects.
         """
         # first fetch the manifest to parse
-        self.gnu_tree = GNUTree(f"{self.url}/tree.json.gz")
+        tree_url = f"{self.url}/tree.json.gz"
+        if self.download_cache is None:
+            self.gnu_tree = GNUTree(tree_url)
+            yield self.gnu_tree.projects
+            return
+
+        download = self.download_cache.fetch(self.http_request, tree_url)
+        if not download.downloaded:
+            self.fetches_avoided += 1
+        if not download.modified:
+            logger.info("%s did not change since it was last listed", tree_url)
+            return
+        self.gnu_tree = GNUTree(tree_url, raw_data_path=download.path)
         yield self.gnu_tree.projects
+        self.mark_download_listed(tree_url)
 
     def get_origins_from_page(self, page: GNUPageType) -> Iterator[ListedOrigin]:
         """
@@ -3,6 +3,8 @@
 # License: GNU General Public License version 3, or any later version
 # See top-level LICENSE file for more information
 
+import pytest
+
 from ..lister import GNULister
 
 
@@ -34,3 +36,51 @@ def test_gnu_lister_from_configfile(swh_scheduler_config, mocker):
     lister = GNULister.from_configfile()
     assert lister.scheduler is not None
     assert lister.credentials is not None
+
+
+def test_gnu_lister_download_cache(datadir, tmp_path, swh_scheduler, requests_mock):
+    """The tree.json.gz file is not listed again when it did not change upstream."""
+    tree_url = f"{GNULister.GNU_FTP_URL}/tree.json.gz"
+    with open(f"{datadir}/https_ftp.gnu.org/tree.json.gz", "rb") as tree:
+        requests_mock.get(
+            tree_url,
+            [
+                {"content": tree.read(), "headers": {"Last-Modified": "yesterday"}},
+                {"status_code": 304},
+            ],
+        )
+
+    stats = GNULister(scheduler=swh_scheduler, download_cache_dir=str(tmp_path)).run()
+    assert (stats.pages, stats.origins) == (1, 383)
+
+    stats = GNULister(scheduler=swh_scheduler, download_cache_dir=str(tmp_path)).run()
+    assert (stats.pages, stats.origins, stats.fetches_avoided) == (0, 0, 1)
+    assert requests_mock.last_request.headers["If-Modified-Since"] == "yesterday"
+
+
+def test_gnu_lister_download_cache_recording_failure(
+    datadir, tmp_path, swh_scheduler, requests_mock, mocker
+):
+    """The tree.json.gz file is listed again when its origins could not be
+    recorded."""
+    tree_url = f"{GNULister.GNU_FTP_URL}/tree.json.gz"
+    with open(f"{datadir}/https_ftp.gnu.org/tree.json.gz", "rb") as tree:
+        requests_mock.get(
+            tree_url,
+            [
+                {"content": tree.read(), "headers": {"Last-Modified": "yesterday"}},
+                {"status_code": 304},
+            ],
+        )
+
+    record_listed_origins = mocker.patch.object(
+        swh_scheduler,
+        "record_listed_origins",
+        side_effect=RuntimeError("scheduler is down"),
+    )
+    with pytest.raises(RuntimeError, match="scheduler is down"):
+        GNULister(scheduler=swh_scheduler, download_cache_dir=str(tmp_path)).run()
+
+    mocker.stop(record_listed_origins)
+    stats = GNULister(scheduler=swh_scheduler, download_cache_dir=str(tmp_path)).run()
+    assert (stats.pages, stats.origins, stats.fetches_avoided) == (1, 383, 1)
@@ -10,7 +10,7 @@ import logging
 from os import path
 from pathlib import Path
 import re
-from typing import Any, List, Mapping, Sequence, Tuple
+from typing import Any, List, Mapping, Optional, Sequence, Tuple
 from urllib.parse import urlparse
 
 import requests
@@ -23,8 +23,10 @@ logger = logging.getLogger(__name__)
 class GNUTree:
     """Gnu Tree's representation"""
 
-    def __init__(self, url: str):
+    def __init__(self, url: str, raw_data_path: Optional[str] = None):
         self.url = url  # filepath or uri
+        # local copy of the tree.json.gz file, read instead of url when set
+        self.raw_data_path = raw_data_path
         u = urlparse(url)
         self.base_url = "%s://%s" % (u.scheme, u.netloc)
         # Interesting top level directories
@@ -57,7 +59,7 @@ class GNUTree:
         projects = {}
         artifacts = {}
 
-        raw_data = load_raw_data(self.url)[0]
+        raw_data = load_raw_data(self.raw_data_path or self.url)[0]
         for directory in raw_data["contents"]:
             if directory["name"] not in self.top_level_directories:
                 continue
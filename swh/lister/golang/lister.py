@@ -29,12 +29,50 @@ class GolangStateType:
 GolangPageType = List[Dict[str, Any]]
 
 
+def split_time_range(
+    start: datetime, end: datetime, shards: int
+) -> List[Tuple[datetime, datetime]]:
+    """Split the ``[start, end]`` time range in ``shards`` consecutive ranges of the
+    same duration.
+
+    >>> from datetime import timezone
+    >>> split_time_range(
+    ...     datetime(2019, 1, 1, tzinfo=timezone.utc),
+    ...     datetime(2019, 1, 4, tzinfo=timezone.utc),
+    ...     3,
+    ... )  # doctest: +NORMALIZE_WHITESPACE
+    [(datetime.datetime(2019, 1, 1, 0, 0, tzinfo=datetime.timezone.utc),
+      datetime.datetime(2019, 1, 2, 0, 0, tzinfo=datetime.timezone.utc)),
+     (datetime.datetime(2019, 1, 2, 0, 0, tzinfo=datetime.timezone.utc),
+      datetime.datetime(2019, 1, 3, 0, 0, tzinfo=datetime.timezone.utc)),
+     (datetime.datetime(2019, 1, 3, 0, 0, tzinfo=datetime.timezone.utc),
+      datetime.datetime(2019, 1, 4, 0, 0, tzinfo=datetime.timezone.utc))]
+    """
+    if shards <= 1 or end <= start:
+        return [(start, end)]
+    duration = (end - start) / shards
+    bounds = [start + i * duration for i in range(shards)] + [end]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
 class GolangLister(Lister[GolangStateType, GolangPageType]):
     """
     List all Golang modules and send associated origins to scheduler.
 
     The lister queries the Golang module index, whose documentation can be found
     at https://index.golang.org
+
+    Providing the ``since`` and/or ``until`` arguments enables the "range" mode: in
+    that mode, the lister only lists the index entries whose timestamp is in the
+    ``[since, until]`` range, and the lister state in the scheduler backend is not
+    updated. This allows to split the listing of the whole index in time shards
+    listed concurrently.
+
+    Args:
+      incremental: start listing from the timestamp of the last entry seen by the
+        previous incremental listing
+      since: timestamp of the first index entries to list
+      until: timestamp of the last index entries to list
     """
 
     GOLANG_MODULES_INDEX_URL = "https://index.golang.org/index"
@@ -52,6 +90,8 @@ class GolangLister(Lister[GolangStateType, GolangPageType]):
         max_origins_per_page: Optional[int] = None,
         max_pages: Optional[int] = None,
         enable_origins: bool = True,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
     ):
         super().__init__(
             scheduler=scheduler,
@@ -65,6 +105,9 @@ class GolangLister(Lister[GolangStateType, GolangPageType]):
 
         self.session.headers.update({"Accept": "application/json"})
         self.incremental = incremental
+        self.since = since
+        self.until = until
+        self.range_listing = since is not None or until is not None
 
     def state_from_dict(self, d: Dict[str, Any]) -> GolangStateType:
         as_string = d.get("last_seen")
@@ -79,6 +122,10 @@ class GolangLister(Lister[GolangStateType, GolangPageType]):
         }
 
     def finalize(self):
+        if self.range_listing:
+            # Don't update the lister state when listing a range
+            return
+
         if self.incremental and self.state.last_seen is not None:
             scheduler_state = self.get_state_from_scheduler()
 
@@ -126,7 +173,28 @@ class GolangLister(Lister[GolangStateType, GolangPageType]):
 
         return page, since
 
+    def get_range_pages(self) -> Iterator[GolangPageType]:
+        """Return the pages of index entries whose timestamp is in the
+        ``[since, until]`` range, without updating the lister state."""
+        since = self.since
+        while True:
+            page, last_seen = self.get_single_page(since=since)
+            if self.until is not None:
+                page = [entry for entry in page if entry["Timestamp"] <= self.until]
+            if not page or last_seen == since:
+                # see get_pages for the infinite loop avoidance
+                return
+            yield page
+            assert last_seen is not None
+            if self.until is not None and last_seen >= self.until:
+                return
+            since = last_seen
+
     def get_pages(self) -> Iterator[GolangPageType]:
+        if self.range_listing:
+            yield from self.get_range_pages()
+            return
+
         since = None
         if self.incremental:
             since = self.state.last_seen
@@ -161,9 +229,9 @@ class GolangLister(Lister[GolangStateType, GolangPageType]):
             origin_url = f"https://pkg.go.dev/{path}"
 
             # Since the Go index lists versions and not just packages, there will
-            # be duplicates. Fortunately, `ListedOrigins` are "upserted" server-side,
-            # so only the last timestamp will be used, with no duplicates.
-            # Performance should not be an issue as they are sent to the db in bulk.
+            # be duplicates. They are merged in each batch before being sent to the
+            # scheduler, keeping the latest timestamp, and `ListedOrigins` are
+            # "upserted" server-side across batches.
             yield ListedOrigin(
                 lister_id=self.lister_obj.id,
                 url=origin_url,
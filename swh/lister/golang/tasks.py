@@ -2,9 +2,16 @@
 # License: GNU General Public License version 3, or any later version
 # See top-level LICENSE file for more information
 
-from celery import shared_task
+from datetime import datetime, timezone
+from typing import Dict, Optional
 
-from .lister import GolangLister
+from celery import group, shared_task
+import iso8601
+
+from .lister import GolangLister, split_time_range
+
+RANGE_SHARDS = 100
+"""Number of time ranges the Golang module index is split in by a full relisting"""
 
 
 @shared_task(name=__name__ + ".FullGolangLister")
@@ -20,6 +27,56 @@ def list_golang_incremental(**lister_args):
     return lister.run().dict()
 
 
+@shared_task(name=__name__ + ".RangeGolangLister")
+def _range_golang_lister(
+    since: Optional[str] = None, until: Optional[str] = None
+) -> Dict[str, int]:
+    """List the Golang module index entries whose timestamp is in the
+    ``[since, until]`` range (ISO 8601 dates)"""
+    lister = GolangLister.from_configfile(
+        since=iso8601.parse_date(since) if since else None,
+        until=iso8601.parse_date(until) if until else None,
+    )
+    return lister.run().dict()
+
+
+@shared_task(name=__name__ + ".FullGolangRelister", bind=True)
+def list_golang_full_range(
+    self,
+    shards: int = RANGE_SHARDS,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+) -> str:
+    """Full listing of the Golang module index
+
+    The ``[since, until]`` time range, which defaults to the range between the first
+    entry of the index and the current date, is split in ``shards`` ranges of the
+    same duration listed by concurrent tasks. The state of the incremental lister is
+    left untouched.
+    """
+    end = iso8601.parse_date(until) if until else datetime.now(tz=timezone.utc)
+    if since:
+        start = iso8601.parse_date(since)
+    else:
+        lister = GolangLister.from_configfile()
+        page, _ = lister.get_single_page()
+        start = page[0]["Timestamp"] if page else end
+
+    ranges = split_time_range(start, end, shards)
+    promise = group(
+        _range_golang_lister.s(
+            since=range_start.isoformat(), until=range_end.isoformat()
+        )
+        for range_start, range_end in ranges
+    )()
+    self.log.debug("%s OK (spawned %s subtasks)" % (self.name, len(ranges)))
+    try:
+        promise.save()  # so that we can restore the GroupResult in tests
+    except (NotImplementedError, AttributeError):
+        self.log.info("Unable to call save_group with current result backend.")
+    return promise.id
+
+
 @shared_task(name=__name__ + ".ping")
 def _ping():
     return "OK"
@@ -236,3 +236,63 @@ def test_golang_lister_incremental(swh_scheduler, requests_mock, datadir, mocker
     assert stats.pages == 0
     assert stats.origins == 0
     mock.assert_has_calls([mocker.call(since=page3_last_timestamp)])
+
+
+def test_golang_lister_range(swh_scheduler, requests_mock, datadir, mocker):
+    page1_last_timestamp = datetime.datetime(
+        2019, 4, 11, 18, 47, 29, 390564, tzinfo=datetime.timezone.utc
+    )
+    page2_last_timestamp = datetime.datetime(
+        2019, 4, 15, 13, 54, 35, 250835, tzinfo=datetime.timezone.utc
+    )
+    until = datetime.datetime(
+        2019, 4, 15, 13, 54, 37, 555525, tzinfo=datetime.timezone.utc
+    )
+
+    # incremental state of the lister, left untouched by range listings
+    lister = GolangLister(scheduler=swh_scheduler, incremental=True)
+    lister.state.last_seen = page1_last_timestamp
+    lister.set_state_in_scheduler(force_state=True)
+
+    requests_mock.get(
+        GolangLister.GOLANG_MODULES_INDEX_URL,
+        [
+            {"text": Path(datadir, "page-2.txt").read_text(), "status_code": 200},
+            {"text": Path(datadir, "page-3.txt").read_text(), "status_code": 200},
+        ],
+    )
+
+    lister = GolangLister(
+        scheduler=swh_scheduler, since=page1_last_timestamp, until=until
+    )
+    mock = mocker.spy(lister, "get_single_page")
+    stats = lister.run()
+
+    mock.assert_has_calls(
+        [
+            mocker.call(since=page1_last_timestamp),
+            mocker.call(since=page2_last_timestamp),
+        ]
+    )
+    assert mock.call_count == 2
+    assert stats.pages == 2
+    assert stats.origins == 7
+
+    scheduler_origins = swh_scheduler.get_listed_origins(lister.lister_obj.id).results
+    assert {origin.url for origin in scheduler_origins} == {
+        f"https://pkg.go.dev/{path}"
+        for path in (
+            "github.com/djherbis/buffer",
+            "github.com/djherbis/nio",
+            "github.com/gobuffalo/buffalo-plugins",
+            "github.com/markbates/refresh",
+            "github.com/mitchellh/go-homedir",
+            "github.com/gobuffalo/packr",
+            "golang.org/x/sys",
+        )
+    }
+    assert all(origin.last_update <= until for origin in scheduler_origins)
+
+    assert lister.get_state_from_scheduler() == GolangStateType(
+        last_seen=page1_last_timestamp
+    )
@@ -3,6 +3,11 @@
 # License: GNU General Public License version 3, or any later version
 # See top-level LICENSE file for more information
 
+from datetime import datetime, timezone
+from time import sleep
+
+from celery.result import GroupResult
+
 from swh.lister.pattern import ListerStats
 
 
@@ -50,3 +55,67 @@ def test_golang_incremental_listing_task(
 
     lister.from_configfile.assert_called_once_with(incremental=True)
     lister.run.assert_called_once_with()
+
+
+def test_golang_range_listing_task(
+    swh_scheduler_celery_app, swh_scheduler_celery_worker, mocker
+):
+    lister = mocker.patch("swh.lister.golang.tasks.GolangLister")
+    lister.from_configfile.return_value = lister
+    stats = ListerStats(pages=1, origins=28000)
+    lister.run.return_value = stats
+
+    res = swh_scheduler_celery_app.send_task(
+        "swh.lister.golang.tasks.RangeGolangLister",
+        kwargs=dict(since="2019-04-10T00:00:00+00:00", until="2019-04-11T00:00:00Z"),
+    )
+    assert res
+    res.wait()
+    assert res.successful()
+    assert res.result == stats.dict()
+
+    lister.from_configfile.assert_called_once_with(
+        since=datetime(2019, 4, 10, tzinfo=timezone.utc),
+        until=datetime(2019, 4, 11, tzinfo=timezone.utc),
+    )
+    lister.run.assert_called_once_with()
+
+
+def test_golang_full_range_listing_task(
+    swh_scheduler_celery_app, swh_scheduler_celery_worker, mocker
+):
+    lister = mocker.patch("swh.lister.golang.tasks.GolangLister")
+    lister.from_configfile.return_value = lister
+    first_timestamp = datetime(2019, 4, 10, tzinfo=timezone.utc)
+    lister.get_single_page.return_value = (
+        [{"Path": "golang.org/x/text", "Timestamp": first_timestamp}],
+        first_timestamp,
+    )
+    lister.run.return_value = ListerStats(pages=1, origins=28000)
+
+    res = swh_scheduler_celery_app.send_task(
+        "swh.lister.golang.tasks.FullGolangRelister",
+        kwargs=dict(shards=4, until="2019-04-14T00:00:00+00:00"),
+    )
+    assert res
+    res.wait()
+    assert res.successful()
+
+    promise = GroupResult.restore(res.result, app=swh_scheduler_celery_app)
+    for i in range(5):
+        if promise.ready():
+            break
+        sleep(1)
+
+    # retrieving the first timestamp of the index
+    assert lister.from_configfile.call_args_list[0] == mocker.call()
+    lister.get_single_page.assert_called_once_with()
+
+    range_calls = lister.from_configfile.call_args_list[1:]
+    assert sorted(range_calls, key=lambda c: c[1]["since"]) == [
+        mocker.call(
+            since=datetime(2019, 4, 10 + day, tzinfo=timezone.utc),
+            until=datetime(2019, 4, 11 + day, tzinfo=timezone.utc),
+        )
+        for day in range(4)
+    ]
@@ -2,12 +2,12 @@
 # License: GNU General Public License version 3, or any later version
 # See top-level LICENSE file for more information
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
 import gzip
 import json
 import logging
-from typing import Any, Dict, Iterator, Optional
+from typing import Any, Dict, Iterator, Optional, Set
 from urllib.parse import urljoin
 import zlib
 
@@ -17,6 +17,8 @@ from swh.lister.pattern import CredentialsType, Lister
 from swh.scheduler.interface import SchedulerInterface
 from swh.scheduler.model import ListedOrigin
 
+from ..utils import versions_digest
+
 logger = logging.getLogger(__name__)
 
 Repositories = Dict[str, Any]
@@ -28,6 +30,27 @@ class GrokmirrorListerState:
 
     last_listing_date: Optional[datetime] = None
     """Last date when Grokmirror lister was executed"""
+    repository_digests: Set[str] = field(default_factory=set)
+    """Digests of the manifest entries of the repositories found during last
+    listing, computed with :func:`repository_digest`"""
+
+
+def repository_digest(repo: str, meta: Dict[str, Any]) -> str:
+    """Return a digest of the fields of a repository manifest entry from which
+    its origins are listed.
+
+    >>> repository_digest("/linux.git", {"fingerprint": "6145", "modified": 1769983368})
+    'ThLFpEBwu09zjNw2'
+    """
+    return versions_digest(
+        [
+            f"repo {repo}",
+            f"fingerprint {meta.get('fingerprint')}",
+            f"modified {meta.get('modified')}",
+            f"reference {meta.get('reference')}",
+        ]
+        + [f"symlink {symlink}" for symlink in meta.get("symlinks", [])]
+    )
 
 
 class GrokmirrorLister(Lister[GrokmirrorListerState, Repositories]):
@@ -39,6 +62,10 @@ class GrokmirrorLister(Lister[GrokmirrorListerState, Repositories]):
 
     The lister checks the URLs /manifest.js.gz /manifest.js /manifest
 
+    A digest of the manifest entry of each repository is recorded in the lister
+    state, the next listings only send the origins of the repositories whose
+    entry is new or changed to the scheduler.
+
     https://git.kernel.org/pub/scm/utils/grokmirror/grokmirror.git/about/
     """
 
@@ -67,6 +94,9 @@ class GrokmirrorLister(Lister[GrokmirrorListerState, Repositories]):
             **kwargs,
         )
         self.listing_date = datetime.now(tz=timezone.utc)
+        # digests of the repositories of a completely listed manifest
+        self.repository_digests: Optional[Set[str]] = None
+        self.manifest_not_modified = False
 
         self.api_url = urljoin(self.url, "manifest.js.gz")
 
@@ -74,13 +104,15 @@ class GrokmirrorLister(Lister[GrokmirrorListerState, Repositories]):
         last_listing_date = d.get("last_listing_date")
         if last_listing_date is not None:
             d["last_listing_date"] = iso8601.parse_date(last_listing_date)
+        d["repository_digests"] = set(d.get("repository_digests", []))
         return GrokmirrorListerState(**d)
 
     def state_to_dict(self, state: GrokmirrorListerState) -> Dict[str, Any]:
-        d: Dict[str, Optional[str]] = {"last_listing_date": None}
+        d: Dict[str, Any] = {"last_listing_date": None}
         last_listing_date = state.last_listing_date
         if last_listing_date is not None:
             d["last_listing_date"] = last_listing_date.isoformat()
+        d["repository_digests"] = sorted(state.repository_digests)
         return d
 
     def get_pages(self) -> Iterator[Repositories]:
@@ -113,17 +145,29 @@ class GrokmirrorLister(Lister[GrokmirrorListerState, Repositories]):
 
             yield repositories
 
-        elif response.status_code != 304:
+        elif response.status_code == 304:
+            self.manifest_not_modified = True
+        else:
             response.raise_for_status()
 
     def get_origins_from_page(
         self, repositories: Repositories
     ) -> Iterator[ListedOrigin]:
-        """Convert Grokmirror repositories into a list of ListedOrigins."""
+        """Convert Grokmirror repositories into a list of ListedOrigins.
+
+        Only the origins of the repositories whose manifest entry changed since the
+        last listing are returned."""
         assert self.lister_obj.id is not None
 
+        repository_digests = set()
+
         for repo, meta in repositories.items():
 
+            digest = repository_digest(repo, meta)
+            repository_digests.add(digest)
+            if digest in self.state.repository_digests:
+                continue
+
             origin_url = urljoin(self.url, repo)
 
             kwargs: Dict[str, Any] = {}
@@ -166,5 +210,14 @@ class GrokmirrorLister(Lister[GrokmirrorListerState, Repositories]):
                     **kwargs,
                 )
 
+        self.repository_digests = repository_digests
+
     def finalize(self) -> None:
+        # the listing date is only recorded once the manifest was completely
+        # listed, otherwise its changes would not be listed by the next runs
+        if self.repository_digests is not None:
+            self.state.repository_digests = self.repository_digests
+        elif not self.manifest_not_modified:
+            return
         self.state.last_listing_date = self.listing_date
+        self.updated = True
@@ -2,7 +2,12 @@
 # License: GNU General Public License version 3, or any later version
 # See top-level LICENSE file for more information
 
+import gzip
+import json
+from pathlib import Path
+
 import pytest
+from requests import HTTPError
 
 from swh.lister import __version__
 from swh.lister.grokmirror.lister import GrokmirrorLister
@@ -42,7 +47,9 @@ def test_lister_grokmirror_run(requests_mock_datadir, swh_scheduler):
     stats = lister.run()
 
     expected_nb_origins = 7
-    assert stats == ListerStats(pages=1, origins=expected_nb_origins)
+    assert stats == ListerStats(
+        pages=1, origins=expected_nb_origins, origins_coalesced=2
+    )
 
     # test page parsing
     scheduler_origins = swh_scheduler.get_listed_origins(lister.lister_obj.id).results
@@ -59,3 +66,69 @@ def test_lister_grokmirror_run(requests_mock_datadir, swh_scheduler):
         user_agent = request.headers["User-Agent"]
         assert "Software Heritage grokmirror lister" in user_agent
         assert __version__ in user_agent
+
+
+def test_lister_grokmirror_run_changed_repositories(
+    datadir, requests_mock, swh_scheduler
+):
+    """Grokmirror lister only sends origins of new or changed repositories."""
+
+    manifest = json.loads(
+        gzip.decompress(
+            Path(datadir, "https_git.kernel.org", "manifest.js.gz").read_bytes()
+        )
+    )
+    requests_mock.get(
+        INSTANCE_URL + "manifest.js.gz",
+        content=gzip.compress(json.dumps(manifest).encode()),
+    )
+
+    lister = GrokmirrorLister(swh_scheduler, url=INSTANCE_URL)
+    stats = lister.run()
+    assert stats == ListerStats(pages=1, origins=7, origins_coalesced=2)
+    assert len(lister.state.repository_digests) == len(manifest)
+
+    manifest["/pub/scm/bluetooth/bluez.git"]["fingerprint"] = "0" * 40
+    manifest["/pub/scm/git/git.git"] = {"modified": 1769983368, "fingerprint": "1" * 40}
+    requests_mock.get(
+        INSTANCE_URL + "manifest.js.gz",
+        content=gzip.compress(json.dumps(manifest).encode()),
+    )
+
+    lister = GrokmirrorLister(swh_scheduler, url=INSTANCE_URL)
+    stats = lister.run()
+    assert stats == ListerStats(pages=1, origins=2)
+    assert len(lister.state.repository_digests) == len(manifest)
+
+    scheduler_origins = swh_scheduler.get_listed_origins(lister.lister_obj.id).results
+    assert len(scheduler_origins) == 8
+
+
+def test_lister_grokmirror_run_failure(datadir, requests_mock, swh_scheduler):
+    """The listing date is not recorded when the manifest could not be listed, so
+    that its changes are listed by the next runs."""
+    manifest = Path(datadir, "https_git.kernel.org", "manifest.js.gz").read_bytes()
+    requests_mock.get(INSTANCE_URL + "manifest.js.gz", content=manifest)
+
+    lister = GrokmirrorLister(swh_scheduler, url=INSTANCE_URL)
+    lister.run()
+    last_listing_date = lister.state.last_listing_date
+    assert last_listing_date is not None
+
+    requests_mock.get(INSTANCE_URL + "manifest.js.gz", status_code=403)
+    lister = GrokmirrorLister(swh_scheduler, url=INSTANCE_URL)
+    with pytest.raises(HTTPError):
+        lister.run()
+    lister = GrokmirrorLister(swh_scheduler, url=INSTANCE_URL)
+    assert lister.state.last_listing_date == last_listing_date
+
+    # the listing date is recorded when the manifest did not change
+    requests_mock.get(INSTANCE_URL + "manifest.js.gz", status_code=304)
+    stats = lister.run()
+    assert stats == ListerStats()
+    assert requests_mock.last_request.headers[
+        "If-Modified-Since"
+    ] == last_listing_date.strftime("%a, %d %b %Y %H:%M:%S GMT")
+    lister = GrokmirrorLister(swh_scheduler, url=INSTANCE_URL)
+    assert lister.state.last_listing_date > last_listing_date
+    assert len(lister.state.repository_digests) > 0
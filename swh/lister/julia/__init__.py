@@ -1,4 +1,4 @@
-# Copyright (C) 2023  The Software Heritage developers
+# Copyright (C) 2023-2026  The Software Heritage developers
 # See the AUTHORS file at the top-level directory of this distribution
 # License: GNU General Public License version 3, or any later version
 # See top-level LICENSE file for more information
@@ -32,6 +32,15 @@ walk through commits with the help of `Dulwich`_ to detect commit related to a n
 or a new version of a package. For each of those commits we get the path to `Package.toml`
 file from where we get the Git repository url for a package.
 
+Only the ``Package.toml`` and ``Versions.toml`` files are diffed for each commit, by
+comparing the trees of the commit and of its parent down to those files, and the
+``Package.toml`` file of a package is read from the Git objects of the HEAD commit, so
+the registry is cloned without working tree unless ``git_repo_path`` is set.
+
+When the ``registry_mirror_path`` parameter is set, the registry is cloned once in
+that directory and kept between runs: the following runs only fetch the new commits
+into it, which is much faster than cloning the whole registry again.
+
 Page listing
 ------------
 
@@ -1,4 +1,4 @@
-# Copyright (C) 2023-2025  The Software Heritage developers
+# Copyright (C) 2023-2026  The Software Heritage developers
 # See the AUTHORS file at the top-level directory of this distribution
 # License: GNU General Public License version 3, or any later version
 # See top-level LICENSE file for more information
@@ -8,11 +8,13 @@ import datetime
 import logging
 from pathlib import Path
 import shutil
+import stat
 import tempfile
 from typing import Any, Dict, Iterator, Optional, Tuple
 
 from dulwich import porcelain
-from dulwich.objects import Commit
+from dulwich.object_store import BaseObjectStore, tree_lookup_path
+from dulwich.objects import Blob, Commit, ObjectID, Tree
 from dulwich.repo import Repo
 from dulwich.walk import WalkEntry
 import iso8601
@@ -28,6 +30,57 @@ logger = logging.getLogger(__name__)
 # Aliasing the page results returned by `get_pages` method from the lister.
 JuliaListerPage = Tuple[str, str]
 
+PACKAGE_FILES = (b"Package.toml", b"Versions.toml")
+
+
+def _changed_tree_entries(
+    store: BaseObjectStore, old_tree_id: Optional[ObjectID], new_tree_id: ObjectID
+) -> Iterator[Tuple[bytes, int, ObjectID, Optional[ObjectID]]]:
+    """Yield the name, mode and id of the entries added or modified in a tree,
+    along with the id of the previous entry if it was a tree."""
+    old_entries: Dict[bytes, Tuple[int, ObjectID]] = {}
+    if old_tree_id is not None:
+        old_tree = store[old_tree_id]
+        assert isinstance(old_tree, Tree)
+        old_entries = {
+            entry.path: (entry.mode, entry.sha) for entry in old_tree.items()
+        }
+    new_tree = store[new_tree_id]
+    assert isinstance(new_tree, Tree)
+    for entry in new_tree.items():
+        old_mode, old_sha = old_entries.get(entry.path, (0, None))
+        if old_sha != entry.sha:
+            yield (
+                entry.path,
+                entry.mode,
+                entry.sha,
+                old_sha if stat.S_ISDIR(old_mode) else None,
+            )
+
+
+def changed_package_files(
+    store: BaseObjectStore, old_tree_id: Optional[ObjectID], new_tree_id: ObjectID
+) -> Iterator[bytes]:
+    """Yield the paths of the ``Package.toml`` and ``Versions.toml`` files added or
+    modified between two root trees of the registry, laid out as
+    ``<initial>/<package name>/<file>``.
+
+    Only the subtrees that differ are read, other files are not diffed."""
+    for initial, mode, tree_id, old_tree_id in _changed_tree_entries(
+        store, old_tree_id, new_tree_id
+    ):
+        if not stat.S_ISDIR(mode):
+            continue
+        package_entries = _changed_tree_entries(store, old_tree_id, tree_id)
+        for package, mode, package_tree_id, old_package_tree_id in package_entries:
+            if not stat.S_ISDIR(mode):
+                continue
+            for filename, _, _, _ in _changed_tree_entries(
+                store, old_package_tree_id, package_tree_id
+            ):
+                if filename in PACKAGE_FILES:
+                    yield b"/".join((initial, package, filename))
+
 
 @dataclass
 class JuliaListerState:
@@ -38,7 +91,16 @@ class JuliaListerState:
 
 
 class JuliaLister(Lister[JuliaListerState, JuliaListerPage]):
-    """List Julia packages origins"""
+    """List Julia packages origins
+
+    Args:
+        git_repo_path: path of a clone of the registry, with a working tree, updated
+            with a pull before listing.
+        registry_mirror_path: if ``git_repo_path`` is not provided, path of a bare
+            mirror of the registry kept between runs, in which only the new commits
+            are fetched before listing. Otherwise, the registry is cloned without
+            working tree in a temporary directory removed once listed.
+    """
 
     LISTER_NAME = "julia"
     VISIT_TYPE = "git"  # Julia origins url are Git repositories
@@ -60,6 +122,7 @@ class JuliaLister(Lister[JuliaListerState, JuliaListerPage]):
         # if not provided, a temporary directory is used to clone the
         # git repository of Julia packages
         git_repo_path: Optional[str] = None,
+        registry_mirror_path: Optional[str] = None,
     ):
         super().__init__(
             scheduler=scheduler,
@@ -71,11 +134,16 @@ class JuliaLister(Lister[JuliaListerState, JuliaListerPage]):
             enable_origins=enable_origins,
         )
 
-        self.remove_git_repo = git_repo_path is None
+        self.bare_repo = git_repo_path is None
+        self.remove_git_repo = git_repo_path is None and registry_mirror_path is None
         if git_repo_path is not None:
             self.repo_path = Path(git_repo_path)
+        elif registry_mirror_path is not None:
+            self.repo_path = Path(registry_mirror_path)
         else:
             self.repo_path = Path(tempfile.mkdtemp(), "General")
+        self.repo: Optional[Repo] = None
+        self.head_tree_id: Optional[ObjectID] = None
 
     def get_registry_repository(self) -> None:
         """Get Julia General Registry Git repository up to date on disk"""
@@ -83,14 +151,37 @@ class JuliaLister(Lister[JuliaListerState, JuliaListerPage]):
             porcelain.clone(
                 source=self.url,
                 target=self.repo_path,
+                bare=self.bare_repo,
                 errstream=porcelain.NoneStream(),
-            )
+            ).close()
         except FileExistsError:
-            porcelain.pull(
-                self.repo_path,
-                remote_location=self.url,
-                errstream=porcelain.NoneStream(),
-            )
+            if not self.bare_repo:
+                porcelain.pull(
+                    self.repo_path,
+                    remote_location=self.url,
+                    errstream=porcelain.NoneStream(),
+                )
+                return
+            with porcelain.open_repo_closing(self.repo_path) as repo:
+                # only the objects of the new commits are transferred
+                result = porcelain.fetch(
+                    repo,
+                    remote_location=self.url,
+                    errstream=porcelain.NoneStream(),
+                )
+                repo.refs[b"HEAD"] = result.refs[b"HEAD"]  # type: ignore
+
+    def read_head_package_file(self, path: bytes) -> Optional[bytes]:
+        """Return the content of a registry file in the HEAD commit, or
+        :const:`None` if it does not exist anymore."""
+        assert self.repo is not None and self.head_tree_id is not None
+        store = self.repo.object_store
+        try:
+            _, sha = tree_lookup_path(store.__getitem__, self.head_tree_id, path)
+        except KeyError:
+            return None
+        blob = store[sha]
+        return blob.data if isinstance(blob, Blob) else None
 
     def state_from_dict(self, d: Dict[str, Any]) -> JuliaListerState:
         return JuliaListerState(**d)
@@ -105,36 +196,42 @@ class JuliaLister(Lister[JuliaListerState, JuliaListerPage]):
         a new package version.
 
         Returns a dict with origin url as key and iso8601 commit date as value
+
+        Only the ``Package.toml`` and ``Versions.toml`` files modified by the commit
+        are diffed, and the ``Package.toml`` file is read from the HEAD commit.
         """
-        assert entry
+        assert entry and self.repo is not None
 
         if (
             entry.commit
-            and entry.changes()
+            # merge commits are not considered
+            and len(entry.commit.parents) <= 1
             and (
                 entry.commit.message.startswith(b"New package: ")
                 or entry.commit.message.startswith(b"New version: ")
             )
         ):
+            store = self.repo.object_store
+            parent_tree_id = None
+            if entry.commit.parents:
+                parent = store[entry.commit.parents[0]]
+                assert isinstance(parent, Commit)
+                parent_tree_id = parent.tree
+
             package_toml = None
-            for change in entry.changes():
-                if change and hasattr(change, "new") and change.new is not None:
-                    if change.new.path.endswith(b"/Package.toml"):
-                        package_toml = self.repo_path / change.new.path.decode()
-                        break
-                    elif change.new.path.endswith(b"/Versions.toml"):
-                        versions_path = self.repo_path / change.new.path.decode()
-                        if versions_path.exists():
-                            package_path, _ = change.new.path.decode().split(
-                                "Versions.toml"
-                            )
-                            package_toml = (
-                                self.repo_path / package_path / "Package.toml"
-                            )
-                            break
-
-            if package_toml and package_toml.exists():
-                origin = toml.load(package_toml)["repo"]
+            for path in changed_package_files(store, parent_tree_id, entry.commit.tree):
+                if path.endswith(b"/Package.toml"):
+                    package_toml = self.read_head_package_file(path)
+                    break
+                elif self.read_head_package_file(path) is not None:
+                    package_path, _ = path.split(b"Versions.toml")
+                    package_toml = self.read_head_package_file(
+                        package_path + b"Package.toml"
+                    )
+                    break
+
+            if package_toml:
+                origin = toml.loads(package_toml.decode())["repo"]
                 last_update = datetime.datetime.fromtimestamp(
                     entry.commit.commit_time,
                     tz=datetime.timezone.utc,
@@ -147,8 +244,8 @@ class JuliaLister(Lister[JuliaListerState, JuliaListerPage]):
         """Yield an iterator which returns 'page'
 
         To build a list of origins the ``Julia General registry`` Git
-        repository is cloned to look at commits history to discover new
-        package and new package versions.
+        repository is cloned, or fetched in its mirror, to look at commits
+        history to discover new package and new package versions.
 
         Depending on ``last_seen_commit`` state it initiate a commit walker
         since the last time the lister has been executed.
@@ -159,19 +256,27 @@ class JuliaLister(Lister[JuliaListerState, JuliaListerPage]):
         self.get_registry_repository()
         assert self.repo_path.exists()
 
-        repo = Repo(str(self.repo_path))
-
-        # Detect commits related to new package and new versions since last_seen_commit
-        if not self.state.last_seen_commit:
-            walker = repo.get_walker()
-        else:
-            last = repo[self.state.last_seen_commit.encode()]
-            assert isinstance(last, Commit)
-            walker = repo.get_walker(since=last.commit_time, exclude=[last.id])
-
-        assert walker
-        for entry in walker:
-            yield self.get_origin_data(entry=entry)
+        with Repo(str(self.repo_path)) as repo:
+            self.repo = repo
+            head = repo[repo.head()]
+            assert isinstance(head, Commit)
+            self.head_tree_id = head.tree
+
+            # Detect commits related to new package and new versions since
+            # last_seen_commit
+            if not self.state.last_seen_commit:
+                walker = repo.get_walker()
+            else:
+                last = repo[self.state.last_seen_commit.encode()]
+                assert isinstance(last, Commit)
+                walker = repo.get_walker(since=last.commit_time, exclude=[last.id])
+
+            assert walker
+            try:
+                for entry in walker:
+                    yield self.get_origin_data(entry=entry)
+            finally:
+                self.repo = None
 
     def get_origins_from_page(self, page: JuliaListerPage) -> Iterator[ListedOrigin]:
         """Iterate on all pages and yield ListedOrigin instances
@@ -192,8 +297,8 @@ class JuliaLister(Lister[JuliaListerState, JuliaListerPage]):
 
     def finalize(self) -> None:
         # Get Git HEAD commit hash
-        repo = Repo(str(self.repo_path))
-        self.state.last_seen_commit = repo.head().decode("ascii")
+        with Repo(str(self.repo_path)) as repo:
+            self.state.last_seen_commit = repo.head().decode("ascii")
         self.updated = True
         # Rm tmp directory repo_path
         if self.repo_path.exists() and self.remove_git_repo:
@@ -1,4 +1,4 @@
-# Copyright (C) 2023  The Software Heritage developers
+# Copyright (C) 2023-2026  The Software Heritage developers
 # See the AUTHORS file at the top-level directory of this distribution
 # License: GNU General Public License version 3, or any later version
 # See top-level LICENSE file for more information
@@ -167,3 +167,50 @@ def test_julia_lister_incremental_no_changes(datadir, tmp_path, swh_scheduler):
     assert res.pages == 0
     # Nothing new
     assert res.origins == 0
+
+
+def test_julia_lister_registry_mirror(datadir, tmp_path, swh_scheduler, mocker):
+    archive_path = Path(datadir, "fake-julia-registry-repository_0.tar.gz")
+    repo_url = prepare_repository_from_archive(archive_path, "General", tmp_path)
+    mirror_path = Path(tmp_path, "mirror")
+
+    # First run clones the registry in the mirror
+    lister = JuliaLister(
+        url=repo_url, scheduler=swh_scheduler, registry_mirror_path=mirror_path
+    )
+    res = lister.run()
+    assert res.pages == 3
+    assert res.origins == len(expected_origins_0)
+
+    with porcelain.open_repo_closing(mirror_path) as mirror:
+        assert mirror.bare
+        assert mirror.head().decode("ascii") == lister.state.last_seen_commit
+
+    # Second run only fetches the new commits in the mirror
+    archive_path = Path(datadir, "fake-julia-registry-repository_1.tar.gz")
+    repo_url = prepare_repository_from_archive(archive_path, "General", tmp_path)
+    with porcelain.open_repo_closing(Path(tmp_path, "General")) as repo:
+        expected_last_seen_commit = repo.head().decode("ascii")
+
+    clone = mocker.spy(porcelain, "clone")
+    fetch = mocker.spy(porcelain, "fetch")
+    lister = JuliaLister(
+        url=repo_url, scheduler=swh_scheduler, registry_mirror_path=mirror_path
+    )
+    res = lister.run()
+
+    # the existing mirror is not cloned again
+    assert isinstance(clone.spy_exception, FileExistsError)
+    assert fetch.call_count == 1
+    assert lister.state.last_seen_commit == expected_last_seen_commit
+    assert res.pages == 2
+    assert res.origins == len(expected_origins_1)
+    assert mirror_path.exists()
+
+    scheduler_origins = swh_scheduler.get_listed_origins(lister.lister_obj.id).results
+    assert {
+        (scheduled.url, scheduled.last_update) for scheduled in scheduler_origins
+    } == {
+        (origin, iso8601.parse_date(last_update))
+        for origin, last_update in {**expected_origins_0, **expected_origins_1}.items()
+    }
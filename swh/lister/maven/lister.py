@@ -6,24 +6,29 @@
 from dataclasses import asdict, dataclass
 from datetime import datetime, timezone
 import gzip
+from io import BufferedIOBase, BytesIO
+import json
 import logging
 import os
 import re
 import shutil
+import struct
 import subprocess
 import tempfile
-from typing import Any, Dict, Iterator, List, Optional
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
 from urllib.parse import urljoin
 
 from bs4 import BeautifulSoup
 from lxml import etree
 import ndjson
 import requests
+from requests.adapters import HTTPAdapter
 
 from swh.scheduler.interface import SchedulerInterface
 from swh.scheduler.model import ListedOrigin
 
 from ..pattern import CredentialsType, Lister
+from ..utils import open_sqlite_store, ordered_concurrent_map
 
 logger = logging.getLogger(__name__)
 
@@ -31,6 +36,183 @@ RepoPage = Optional[Dict[str, Any]]
 
 SUPPORTED_SCM_TYPES = ("git", "svn", "hg", "cvs", "bzr")
 
+SCM_CONNECTION_PATH = ["project", "scm", "connection"]
+
+INDEX_PATH = ".index/"
+INDEX_PROPERTIES = "nexus-maven-repository-index.properties"
+INDEX_CHUNK = "nexus-maven-repository-index.{}.gz"
+
+
+def extract_scm_connection(pom: bytes) -> Optional[str]:
+    """Extract the ``project/scm/connection`` value of a POM file.
+
+    The XML document is parsed incrementally and parsing stops as soon as the
+    element is found, falling back to a lenient BeautifulSoup parsing for documents
+    lxml cannot parse on its own (e.g. with a wrong encoding declaration).
+
+    Raises:
+        lxml.etree.Error if the document cannot be parsed at all
+
+    """
+    path: List[str] = []
+    try:
+        for event, element in etree.iterparse(
+            BytesIO(pom),
+            events=("start", "end"),
+            resolve_entities=False,
+            no_network=True,
+        ):
+            if event == "start":
+                path.append(etree.QName(element).localname)
+                continue
+            if path == SCM_CONNECTION_PATH:
+                return element.text or ""
+            path.pop()
+            if len(path) > 1:
+                # drop parsed elements not on the path to the scm connection
+                element.clear()
+        return None
+    except etree.XMLSyntaxError:
+        parsed_pom = BeautifulSoup(pom, "xml")
+        connection = parsed_pom.select_one("project scm connection")
+        return connection.text if connection is not None else None
+
+
+def parse_index_properties(content: str) -> Dict[str, str]:
+    """Parse the properties file describing a maven index.
+
+    >>> parse_index_properties(
+    ...     "#Sat Oct 16 2021\\nnexus.index.chain-id=1318453614498\\n"
+    ...     "nexus.index.last-incremental = 42\\n"
+    ... )
+    {'nexus.index.chain-id': '1318453614498', 'nexus.index.last-incremental': '42'}
+    """
+    properties = {}
+    for line in content.splitlines():
+        line = line.strip()
+        if not line or line.startswith(("#", "!")) or "=" not in line:
+            continue
+        key, value = line.split("=", 1)
+        properties[key.strip()] = value.strip()
+    return properties
+
+
+def _read_exactly(data: BufferedIOBase, size: int) -> bytes:
+    read = data.read(size)
+    if len(read) != size:
+        raise EOFError("Truncated maven index data")
+    return read
+
+
+def read_index_data(data: BufferedIOBase) -> Iterator[Dict[str, str]]:
+    """Read the documents of a maven index data file, as published for the full
+    index and its incremental chunks.
+
+    The binary format is the one written by the ``IndexDataWriter`` class of maven
+    indexer: a version byte and a timestamp, followed by documents made of a field
+    count and of the (flags, name, value) tuples of their fields.
+
+    Yields:
+        the documents of the file, as dicts mapping field names to their values
+
+    Raises:
+        ValueError if the format version is not supported
+        EOFError if the file is truncated
+    """
+    version = data.read(1)
+    if version != b"\x01":
+        raise ValueError(f"Unsupported maven index data version {version!r}")
+    # skip the index timestamp
+    _read_exactly(data, 8)
+    while True:
+        header = data.read(4)
+        if not header:
+            return
+        if len(header) != 4:
+            raise EOFError("Truncated maven index data")
+        (field_count,) = struct.unpack(">i", header)
+        document = {}
+        for _ in range(field_count):
+            # skip the indexing flags of the field
+            _read_exactly(data, 1)
+            (name_length,) = struct.unpack(">H", _read_exactly(data, 2))
+            name = _read_exactly(data, name_length).decode("utf-8", errors="ignore")
+            (value_length,) = struct.unpack(">i", _read_exactly(data, 4))
+            value = _read_exactly(data, value_length)
+            document[name] = value.decode("utf-8", errors="ignore")
+        yield document
+
+
+class PomStore:
+    """On-disk store of the POM files found in a maven index, mapping their URL to
+    the id of the last index document referencing them.
+
+    Entries are stored in a SQLite database whose page cache is bounded by
+    ``cache_size`` bytes, so the memory used does not grow with the index size.
+    """
+
+    def __init__(self, path: str, cache_size: int):
+        self.path = path
+        self.db = open_sqlite_store(self.path, cache_size)
+        self.db.execute(
+            "CREATE TABLE poms (url TEXT PRIMARY KEY, doc INTEGER NOT NULL)"
+        )
+
+    def add(self, url: str, doc: int) -> None:
+        self.db.execute(
+            "INSERT INTO poms VALUES (?, ?) "
+            "ON CONFLICT (url) DO UPDATE SET doc = excluded.doc",
+            (url, doc),
+        )
+
+    def __len__(self) -> int:
+        return self.db.execute("SELECT count(*) FROM poms").fetchone()[0]
+
+    def items(self) -> Iterator[Tuple[str, int]]:
+        """Iterate over the stored (POM URL, document id) tuples sorted by
+        document id."""
+        self.db.commit()
+        self.db.execute("CREATE INDEX IF NOT EXISTS poms_doc ON poms (doc)")
+        yield from self.db.execute("SELECT url, doc FROM poms ORDER BY doc")
+
+    def close(self) -> None:
+        self.db.close()
+        os.remove(self.path)
+
+
+class SourceArchiveStore:
+    """On-disk store of the source archive pages found in incremental chunks of a
+    maven index, which are not sorted by package contrary to full index exports.
+
+    Pages are stored in a SQLite database whose page cache is bounded by
+    ``cache_size`` bytes, and are iterated over sorted by package then document id.
+    """
+
+    def __init__(self, path: str, cache_size: int):
+        self.path = path
+        self.db = open_sqlite_store(self.path, cache_size)
+        self.db.execute(
+            "CREATE TABLE sources "
+            "(gid TEXT NOT NULL, aid TEXT NOT NULL, doc INTEGER NOT NULL, page TEXT)"
+        )
+
+    def add(self, page: Dict[str, Any]) -> None:
+        self.db.execute(
+            "INSERT INTO sources VALUES (?, ?, ?, ?)",
+            (page["gid"], page["aid"], page["doc"], json.dumps(page)),
+        )
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        self.db.commit()
+        for (page,) in self.db.execute(
+            "SELECT page FROM sources ORDER BY gid, aid, doc"
+        ):
+            yield json.loads(page)
+
+    def close(self) -> None:
+        self.db.close()
+        os.remove(self.path)
+
 
 @dataclass
 class MavenListerState:
@@ -47,6 +229,18 @@ class MavenListerState:
 
     """
 
+    index_chain_id: Optional[str] = None
+    """Id of the chain of incremental chunks of the maven index, changing when
+    the index is rebuilt from scratch
+
+    """
+
+    last_seen_chunk: int = -1
+    """Number of the last incremental chunk of the maven index ingested during
+       an incremental pass
+
+    """
+
 
 class MavenLister(Lister[MavenListerState, RepoPage]):
     """List origins from a Maven repository.
@@ -63,6 +257,11 @@ class MavenLister(Lister[MavenListerState, RepoPage]):
     (https://gitlab.softwareheritage.org/swh/devel/fixtures/maven-index-exporter).
     To be able to execute the tool, Java runtime environment >= 17 must be available
     in the lister execution environment.
+
+    In incremental mode, once the whole index has been listed, only the incremental
+    chunks of the index published since the last listing are downloaded and read.
+    As they only reference the new versions of packages, the artifacts of the maven
+    origins previously listed are merged with the new ones.
     """
 
     LISTER_NAME = "maven"
@@ -82,6 +281,9 @@ class MavenLister(Lister[MavenListerState, RepoPage]):
         incremental: bool = True,
         with_github_session=True,
         process_pom_files: bool = True,
+        max_inflight_batches: int = 0,
+        pom_fetch_workers: int = 1,
+        pom_store_cache_size: int = 64 * 1024 * 1024,
     ):
         """Lister class for Maven repositories.
 
@@ -96,6 +298,12 @@ class MavenLister(Lister[MavenListerState, RepoPage]):
             with_github_session: defaults to :const:`True`. Defines if canonical
                 URL for extracted github repository should be retrieved with the
                 GitHub REST API.
+            pom_fetch_workers: defaults to 1. Number of threads fetching and parsing
+                POM files concurrently, the extracted SCM URLs are still processed
+                in the order of the index documents.
+            pom_store_cache_size: defaults to 64MiB. Maximum size in bytes of the
+                memory cache of the on-disk store of POM file URLs, gathered while
+                reading the index.
         """
         self.BASE_URL = url.rstrip("/") + "/"
         self.incremental = incremental
@@ -109,16 +317,31 @@ class MavenLister(Lister[MavenListerState, RepoPage]):
             max_origins_per_page=max_origins_per_page,
             max_pages=max_pages,
             enable_origins=enable_origins,
+            max_inflight_batches=max_inflight_batches,
         )
 
         self.session.headers.update({"Accept": "application/json"})
 
         self.jar_origin: Optional[ListedOrigin] = None
         self.jar_origin_docs: List[int] = []
+        # hashable keys of the artifacts of the current jar origin, for deduplication
+        self.jar_origin_artifacts: Set[Tuple[Tuple[str, Any], ...]] = set()
         self.last_origin_url: Optional[str] = None
         self.last_seen_doc = self.state.last_seen_doc
         self.last_seen_pom = self.state.last_seen_pom
+        self.index_chain_id = self.state.index_chain_id
+        self.last_seen_chunk = self.state.last_seen_chunk
+        self.index_page: RepoPage = None
+        self.listing_chunks = False
         self.process_pom_files = process_pom_files
+        self.pom_fetch_workers = pom_fetch_workers
+        self.pom_store_cache_size = pom_store_cache_size
+
+        if self.pom_fetch_workers > 1:
+            # keep a pooled connection per worker
+            adapter = HTTPAdapter(pool_maxsize=self.pom_fetch_workers)
+            self.session.mount("http://", adapter)
+            self.session.mount("https://", adapter)
 
     def state_from_dict(self, d: Dict[str, Any]) -> MavenListerState:
         return MavenListerState(**d)
@@ -127,8 +350,8 @@ class MavenLister(Lister[MavenListerState, RepoPage]):
         return asdict(state)
 
     def get_pages(self) -> Iterator[RepoPage]:
-        """Retrieve and parse exported maven indexes to
-        identify all pom files and src archives.
+        """Retrieve and parse exported maven indexes, or their incremental
+        chunks, to identify all pom files and src archives.
         """
 
         # Example of returned RepoPage's:
@@ -147,120 +370,278 @@ class MavenLister(Lister[MavenListerState, RepoPage]):
         #     "project": "openengsb-framework",
         #   },
         #   ...
+        #   {
+        #     "type": "index",
+        #     "chain_id": "1318453614498",
+        #     "chunk": 842,
+        #   },
         # ]
 
-        out_pom: Dict = {}
+        chunks = self.get_index_chunks() if self.incremental else None
+        if chunks is None and self.incremental and self.state.last_seen_chunk >= 0:
+            # Document ids of a new full export cannot be compared to the ones
+            # given to the documents of the previously listed chunks
+            logger.info("Index chunks cannot be followed, listing the whole index")
+            self.last_seen_doc = self.last_seen_pom = -1
+            self.state.last_seen_doc = self.state.last_seen_pom = -1
+        self.listing_chunks = chunks is not None
 
         with tempfile.TemporaryDirectory() as tmpdir:
+            # POM file URLs are stored on disk, as there are millions of them in
+            # the biggest repositories
+            pom_store = PomStore(
+                os.path.join(tmpdir, "poms.sqlite"), self.pom_store_cache_size
+            )
+            try:
+                if chunks is None:
+                    yield from self.get_index_export_pages(tmpdir, pom_store)
+                else:
+                    yield from self.get_index_chunks_pages(chunks, tmpdir, pom_store)
+
+                # Notify that maven index listing has finished
+                yield None
+
+                if self.process_pom_files:
+                    # Now fetch pom files and scan them for scm info.
+                    logger.info("Found %s poms.", len(pom_store))
+                    logger.info("Fetching poms ...")
+                    for scm_page in ordered_concurrent_map(
+                        self.get_pom_scm,
+                        pom_store.items(),
+                        workers=self.pom_fetch_workers,
+                    ):
+                        if scm_page is not None:
+                            yield scm_page
+            finally:
+                pom_store.close()
+
+        if self.index_page is not None:
+            # Record the last chunk of the index once it has been fully listed
+            yield self.index_page
+
+    def get_index_chunks(self) -> Optional[List[int]]:
+        """Find the incremental chunks of the maven index published since the last
+        incremental pass, from the properties file of the index.
+
+        Returns:
+            the numbers of the chunks to list, or None if the whole index must be
+            listed, because no chunk was listed before or because the published
+            chunks no longer follow the last listed one
+        """
+        self.index_page = None
+        try:
+            response = self.http_request(
+                urljoin(self.BASE_URL, INDEX_PATH + INDEX_PROPERTIES)
+            )
+        except requests.RequestException as error:
+            logger.warning("Could not fetch maven index properties: %s", error)
+            return None
+
+        properties = parse_index_properties(response.text)
+        chain_id = properties.get("nexus.index.chain-id")
+        last_chunk = properties.get("nexus.index.last-incremental", "")
+        if chain_id is None or not last_chunk.isdigit():
+            logger.info("No incremental chunks published for the maven index")
+            return None
+        self.index_page = {
+            "type": "index",
+            "chain_id": chain_id,
+            "chunk": int(last_chunk),
+        }
+
+        if self.state.last_seen_chunk < 0 or self.state.index_chain_id != chain_id:
+            return None
 
-            work_dir = os.path.join(tmpdir, "work")
-            publish_dir = os.path.join(tmpdir, "publish")
-            os.makedirs(work_dir, exist_ok=True)
-            os.makedirs(publish_dir, exist_ok=True)
-
-            # Execute maven index exporter tool to dump maven repository
-            # index to NDJSON format
-            subprocess.check_call(
-                [
-                    "python3",
-                    "/opt/maven-index-exporter/run_full_export.py",
-                    "--base-url",
-                    self.BASE_URL,
-                    "--work-dir",
-                    work_dir,
-                    "--publish-dir",
-                    publish_dir,
-                ],
+        published = {
+            int(value)
+            for key, value in properties.items()
+            if key.startswith("nexus.index.incremental-") and value.isdigit()
+        }
+        chunks = list(range(self.state.last_seen_chunk + 1, int(last_chunk) + 1))
+        if not published.issuperset(chunks):
+            logger.info(
+                "Maven index chunks following chunk %s are no longer published",
+                self.state.last_seen_chunk,
             )
+            return None
+        return chunks
+
+    def get_index_export_pages(
+        self, tmpdir: str, pom_store: PomStore
+    ) -> Iterator[RepoPage]:
+        """Export the whole maven index with the maven index exporter tool, and
+        yield the pages of the source archives it references."""
+        work_dir = os.path.join(tmpdir, "work")
+        publish_dir = os.path.join(tmpdir, "publish")
+        os.makedirs(work_dir, exist_ok=True)
+        os.makedirs(publish_dir, exist_ok=True)
+
+        # Execute maven index exporter tool to dump maven repository
+        # index to NDJSON format
+        subprocess.check_call(
+            [
+                "python3",
+                "/opt/maven-index-exporter/run_full_export.py",
+                "--base-url",
+                self.BASE_URL,
+                "--work-dir",
+                work_dir,
+                "--publish-dir",
+                publish_dir,
+            ],
+        )
 
-            # Remove no longer needed files to save some disk space
-            shutil.rmtree(work_dir)
-
-            # Read NDJSON file line by line and process it, documents are sorted
-            # by groupId and artifactId so every versions of a given maven package
-            # are processed sequentially.
-            with gzip.open(
-                os.path.join(publish_dir, "maven-index-export.ndjson.gz"),
-                mode="rt",
-                encoding="utf-8",
-                errors="ignore",
-            ) as f:
-                reader = ndjson.reader(f)
-                for entry in reader:
-                    doc_id = entry["doc"]
-                    gid, aid, version, classifier, ext = entry["u"].split("|")
-                    ext = ext.strip()
-                    path = "/".join(gid.split("."))
-                    if (
-                        self.process_pom_files
-                        and classifier == "NA"
-                        and ext.lower() == "pom"
-                    ):
-                        # Store pom file URL to extract SCM URLs at end of listing
-                        # process.If incremental mode, we don't record any pom file
-                        # that is before our last recorded doc id.
-                        if self.incremental and self.last_seen_pom >= doc_id:
-                            continue
-                        url_path = f"{path}/{aid}/{version}/{aid}-{version}.{ext}"
-                        url_pom = urljoin(
-                            self.BASE_URL,
-                            url_path,
-                        )
-                        out_pom[url_pom] = doc_id
-                    elif (
-                        classifier.lower() == "sources" or ("src" in classifier)
-                    ) and ext.lower() in ("zip", "jar"):
-                        # Yield maven source package info
-                        url_path = (
-                            f"{path}/{aid}/{version}/{aid}-{version}-{classifier}.{ext}"
-                        )
-                        url_src = urljoin(self.BASE_URL, url_path)
-                        m_time = entry["i"].split("|")[1]
-                        artifact_metadata_d = {
-                            "type": "maven",
-                            "url": url_src,
-                            "doc": doc_id,
-                            "gid": gid,
-                            "aid": aid,
-                            "version": version,
-                            "time": int(m_time),
-                        }
-                        logger.debug(
-                            "* Yielding jar %s: %s", url_src, artifact_metadata_d
-                        )
-                        yield artifact_metadata_d
-
-        # Notify that maven index listing has finished
-        yield None
-
-        if self.process_pom_files:
-            # Now fetch pom files and scan them for scm info.
-            logger.info("Found %s poms.", len(out_pom))
-            logger.info("Fetching poms ...")
-            for pom_url in out_pom:
-                try:
-                    response = self.http_request(pom_url)
-                    parsed_pom = BeautifulSoup(response.content, "xml")
-                    connection = parsed_pom.select_one("project scm connection")
-                    if connection is not None:
-                        artifact_metadata_d = {
-                            "type": "scm",
-                            "doc": out_pom[pom_url],
-                            "url": connection.text,
-                        }
-                        logger.debug(
-                            "* Yielding pom %s: %s", pom_url, artifact_metadata_d
-                        )
-                        yield artifact_metadata_d
-                    else:
-                        logger.debug("No project.scm.connection in pom %s", pom_url)
-                except requests.HTTPError:
-                    logger.warning(
-                        "POM info page could not be fetched, skipping project '%s'",
-                        pom_url,
-                    )
-                except etree.Error as error:
-                    logger.info("Could not parse POM %s XML: %s.", pom_url, error)
+        # Remove no longer needed files to save some disk space
+        shutil.rmtree(work_dir)
+
+        # Read NDJSON file line by line and process it, documents are
+        # sorted by groupId and artifactId so every versions of a given
+        # maven package are processed sequentially.
+        with gzip.open(
+            os.path.join(publish_dir, "maven-index-export.ndjson.gz"),
+            mode="rt",
+            encoding="utf-8",
+            errors="ignore",
+        ) as f:
+            reader = ndjson.reader(f)
+            for entry in reader:
+                page = self.get_index_entry_page(entry, pom_store)
+                if page is not None:
+                    yield page
+
+    def get_index_chunks_pages(
+        self, chunks: List[int], tmpdir: str, pom_store: PomStore
+    ) -> Iterator[RepoPage]:
+        """Download and read incremental chunks of the maven index, and yield the
+        pages of the source archives they reference, sorted by package."""
+        source_store = SourceArchiveStore(
+            os.path.join(tmpdir, "sources.sqlite"), self.pom_store_cache_size
+        )
+        try:
+            for entry in self.get_index_chunks_entries(chunks, tmpdir):
+                page = self.get_index_entry_page(entry, pom_store)
+                if page is not None:
+                    source_store.add(page)
+            yield from source_store
+        finally:
+            source_store.close()
+
+    def get_index_chunks_entries(
+        self, chunks: List[int], tmpdir: str
+    ) -> Iterator[Dict[str, Any]]:
+        """Download incremental chunks of the maven index and yield their documents
+        in the format of the maven index exporter tool.
+
+        Chunks do not hold the document ids of the index, so their documents are
+        numbered after the last one seen during the previous incremental pass.
+        """
+        doc_id = self.state.last_seen_doc
+        for chunk in chunks:
+            chunk_file = INDEX_CHUNK.format(chunk)
+            logger.info("Fetching maven index chunk %s", chunk_file)
+            response = self.http_request(
+                urljoin(self.BASE_URL, INDEX_PATH + chunk_file), stream=True
+            )
+            chunk_path = os.path.join(tmpdir, chunk_file)
+            with open(chunk_path, "wb") as f:
+                for data in response.iter_content(chunk_size=1024 * 1024):
+                    f.write(data)
+
+            with gzip.open(chunk_path) as f:
+                for document in read_index_data(f):
+                    if "u" not in document or "i" not in document:
+                        # descriptor, groups or deleted artifact document
+                        continue
+                    uinfo = document["u"].split("|")
+                    if len(uinfo) == 4:
+                        # the file extension is only in the artifact info
+                        uinfo.append(document["i"].split("|")[-1])
+                    doc_id += 1
+                    yield {"doc": doc_id, "u": "|".join(uinfo), "i": document["i"]}
+
+            os.remove(chunk_path)
+
+    def get_index_entry_page(
+        self, entry: Dict[str, Any], pom_store: PomStore
+    ) -> RepoPage:
+        """Process a document of the maven index, storing the URL of the POM files
+        it references.
+
+        Returns:
+            a page of type maven if the document references a source archive,
+            None otherwise
+        """
+        doc_id = entry["doc"]
+        gid, aid, version, classifier, ext = entry["u"].split("|")
+        ext = ext.strip()
+        path = "/".join(gid.split("."))
+        if self.process_pom_files and classifier == "NA" and ext.lower() == "pom":
+            # Store pom file URL to extract SCM URLs at end of
+            # listing process. If incremental mode, we don't record
+            # any pom file that is before our last recorded doc id.
+            if self.incremental and self.last_seen_pom >= doc_id:
+                return None
+            url_path = f"{path}/{aid}/{version}/{aid}-{version}.{ext}"
+            url_pom = urljoin(
+                self.BASE_URL,
+                url_path,
+            )
+            pom_store.add(url_pom, doc_id)
+        elif (
+            classifier.lower() == "sources" or ("src" in classifier)
+        ) and ext.lower() in (
+            "zip",
+            "jar",
+        ):
+            # Yield maven source package info
+            url_path = f"{path}/{aid}/{version}/{aid}-{version}-{classifier}.{ext}"
+            url_src = urljoin(self.BASE_URL, url_path)
+            m_time = entry["i"].split("|")[1]
+            artifact_metadata_d = {
+                "type": "maven",
+                "url": url_src,
+                "doc": doc_id,
+                "gid": gid,
+                "aid": aid,
+                "version": version,
+                "time": int(m_time),
+            }
+            logger.debug("* Yielding jar %s: %s", url_src, artifact_metadata_d)
+            return artifact_metadata_d
+        return None
+
+    def get_pom_scm(self, pom: Tuple[str, int]) -> RepoPage:
+        """Fetch a POM file and extract its SCM connection.
+
+        Args:
+            pom: a tuple holding the URL of the POM file and its index document id
+
+        Returns:
+            a page of type scm if the POM file holds an SCM connection, None otherwise
+        """
+        pom_url, doc_id = pom
+        try:
+            response = self.http_request(pom_url)
+            connection = extract_scm_connection(response.content)
+        except requests.HTTPError:
+            logger.warning(
+                "POM info page could not be fetched, skipping project '%s'",
+                pom_url,
+            )
+        except etree.Error as error:
+            logger.info("Could not parse POM %s XML: %s.", pom_url, error)
+        else:
+            if connection is not None:
+                artifact_metadata_d = {
+                    "type": "scm",
+                    "doc": doc_id,
+                    "url": connection,
+                }
+                logger.debug("* Yielding pom %s: %s", pom_url, artifact_metadata_d)
+                return artifact_metadata_d
+            else:
+                logger.debug("No project.scm.connection in pom %s", pom_url)
+        return None
 
     def get_scm(self, page: RepoPage) -> Optional[ListedOrigin]:
         """Retrieve scm origin out of the page information. Only called when type of the
@@ -319,6 +700,34 @@ class MavenLister(Lister[MavenListerState, RepoPage]):
             visit_type=visit_type,
         )
 
+    def get_jar_origin(self) -> ListedOrigin:
+        """Return the current maven origin, completed with the artifacts it was
+        previously listed with when listing incremental chunks of the index.
+        """
+        assert self.jar_origin is not None
+        if not self.listing_chunks:
+            return self.jar_origin
+
+        assert self.lister_obj.id is not None
+        listed_origins = self.scheduler.get_listed_origins(
+            lister_id=self.lister_obj.id, urls=[self.jar_origin.url], enabled=None
+        ).results
+        listed_artifacts = []
+        for listed_origin in listed_origins:
+            if listed_origin.visit_type != self.jar_origin.visit_type:
+                continue
+            for artifact in listed_origin.extra_loader_arguments.get("artifacts", []):
+                if tuple(sorted(artifact.items())) not in self.jar_origin_artifacts:
+                    listed_artifacts.append(artifact)
+            if listed_origin.last_update and (
+                self.jar_origin.last_update is None
+                or listed_origin.last_update > self.jar_origin.last_update
+            ):
+                self.jar_origin.last_update = listed_origin.last_update
+
+        self.jar_origin.extra_loader_arguments["artifacts"][:0] = listed_artifacts
+        return self.jar_origin
+
     def get_origins_from_page(self, page: RepoPage) -> Iterator[ListedOrigin]:
         """Convert a page of Maven repositories into a list of ListedOrigins."""
         if page is None:
@@ -327,7 +736,7 @@ class MavenLister(Lister[MavenListerState, RepoPage]):
                 not self.incremental
                 or (any(doc > self.last_seen_doc for doc in self.jar_origin_docs))
             ):
-                yield self.jar_origin
+                yield self.get_jar_origin()
         elif page["type"] == "scm":
             listed_origin = self.get_scm(page)
             if listed_origin:
@@ -355,6 +764,7 @@ class MavenLister(Lister[MavenListerState, RepoPage]):
                 "time": last_update_iso,
                 "base_url": self.BASE_URL,
             }
+            artifact_key = tuple(sorted(artifact.items()))
 
             if origin_url != self.last_origin_url:
                 # All versions of a given maven package have been processed,
@@ -365,10 +775,11 @@ class MavenLister(Lister[MavenListerState, RepoPage]):
                     # versions since last listing
                     or (any(doc > self.last_seen_doc for doc in self.jar_origin_docs))
                 ):
-                    yield self.jar_origin
+                    yield self.get_jar_origin()
 
                 # Keep track of maven index documents ids for package versions
                 self.jar_origin_docs = [page["doc"]]
+                self.jar_origin_artifacts = {artifact_key}
 
                 # Create ListedOrigin instance for newly seen maven package
                 assert self.lister_obj.id is not None
@@ -381,9 +792,9 @@ class MavenLister(Lister[MavenListerState, RepoPage]):
                 )
             elif self.jar_origin:
                 # Update list of source artifacts for the current ListedOrigin
-                artifacts = self.jar_origin.extra_loader_arguments["artifacts"]
-                if artifact not in artifacts:
-                    artifacts.append(artifact)
+                if artifact_key not in self.jar_origin_artifacts:
+                    self.jar_origin_artifacts.add(artifact_key)
+                    self.jar_origin.extra_loader_arguments["artifacts"].append(artifact)
                     self.jar_origin_docs.append(page["doc"])
                 if (
                     self.jar_origin.last_update
@@ -416,6 +827,9 @@ class MavenLister(Lister[MavenListerState, RepoPage]):
             ):
                 self.state.last_seen_doc = page["doc"]
                 self.state.last_seen_pom = page["doc"]
+            elif page and page["type"] == "index":
+                self.state.index_chain_id = page["chain_id"]
+                self.state.last_seen_chunk = page["chunk"]
 
     def finalize(self) -> None:
         """Finalize the lister state, set update if any progress has been made.
@@ -432,3 +846,9 @@ class MavenLister(Lister[MavenListerState, RepoPage]):
                     self.last_seen_pom < last_seen_pom
                 ):
                     self.updated = True
+
+            if (self.index_chain_id, self.last_seen_chunk) != (
+                self.state.index_chain_id,
+                self.state.last_seen_chunk,
+            ):
+                self.updated = True
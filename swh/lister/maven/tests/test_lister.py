@@ -3,15 +3,24 @@
 # License: GNU General Public License version 3, or any later version
 # See top-level LICENSE file for more information
 
+import gzip
+from io import BytesIO
+import json
 import os
 from pathlib import Path
+import struct
 import subprocess
 
 import iso8601
 import pytest
 import requests
 
-from swh.lister.maven.lister import MavenLister
+from swh.lister.maven.lister import (
+    MavenLister,
+    PomStore,
+    extract_scm_connection,
+    read_index_data,
+)
 
 MVN_URL = "https://repo1.maven.org/maven2/"  # main maven repo url
 
@@ -19,6 +28,9 @@ URL_POM_1 = MVN_URL + "al/aldi/sprova4j/0.1.0/sprova4j-0.1.0.pom"
 URL_POM_2 = MVN_URL + "al/aldi/sprova4j/0.1.1/sprova4j-0.1.1.pom"
 URL_POM_3 = MVN_URL + "com/arangodb/arangodb-graphql/1.2/arangodb-graphql-1.2.pom"
 
+INDEX_URL = MVN_URL + ".index/"
+URL_INDEX_PROPERTIES = INDEX_URL + "nexus-maven-repository-index.properties"
+
 
 USER_REPO0 = "aldialimucaj/sprova4j"
 GIT_REPO_URL0_HTTPS = f"https://github.com/{USER_REPO0}"
@@ -81,9 +93,15 @@ def mock_maven_index_exporter(mocker, publish_dir):
     mocker.patch("subprocess.check_call")
 
 
+@pytest.mark.parametrize("pom_fetch_workers", [1, 4])
 @pytest.mark.parametrize("mvn_url", [MVN_URL, MVN_URL.rstrip("/")])
 def test_maven_full_listing(
-    swh_scheduler, mocker, maven_index_full_publish_dir, mvn_url, requests_mock_datadir
+    swh_scheduler,
+    mocker,
+    maven_index_full_publish_dir,
+    mvn_url,
+    pom_fetch_workers,
+    requests_mock_datadir,
 ):
     """Covers full listing of multiple pages, checking page results and listed
     origins, statelessness."""
@@ -96,7 +114,9 @@ def test_maven_full_listing(
         url=mvn_url,
         instance="maven.org",
         incremental=False,
+        pom_fetch_workers=pom_fetch_workers,
     )
+    commit_page = mocker.spy(lister, "commit_page")
 
     stats = lister.run()
 
@@ -122,6 +142,18 @@ def test_maven_full_listing(
     assert scheduler_state.last_seen_doc == -1
     assert scheduler_state.last_seen_pom == -1
 
+    # scm pages are processed in the order of the index documents
+    scm_docs = [
+        call.args[0]["doc"]
+        for call in commit_page.call_args_list
+        if call.args[0] and call.args[0]["type"] == "scm"
+    ]
+    assert len(scm_docs) == 3
+    assert scm_docs == sorted(scm_docs)
+
+    # the on-disk store of POM files is removed after listing
+    assert not os.path.exists(os.path.join(maven_index_full_publish_dir, "poms.sqlite"))
+
 
 def test_maven_full_listing_malformed(
     swh_scheduler,
@@ -313,9 +345,10 @@ def test_maven_incremental_listing(
     assert scheduler_state.last_seen_pom == 4
 
 
-def test_maven_list_index_export_error(swh_scheduler, mocker):
+def test_maven_list_index_export_error(swh_scheduler, mocker, requests_mock):
     """should stop listing if the maven index exporter tool failed."""
 
+    requests_mock.get(URL_INDEX_PROPERTIES, status_code=404)
     mocker.patch("subprocess.check_call").side_effect = subprocess.CalledProcessError(
         returncode=1, cmd=["python3", "/opt/maven-index-exporter/run_full_export.py"]
     )
@@ -432,3 +465,212 @@ def test_maven_list_pom_multi_byte_encoding(
 
     scheduler_origins = swh_scheduler.get_listed_origins(lister.lister_obj.id).results
     assert len(scheduler_origins) == 3
+
+
+@pytest.mark.parametrize(
+    "pom,expected_connection",
+    [
+        (
+            b"<project><scm><connection>scm:git:https://example.org/repo.git"
+            b"</connection></scm></project>",
+            "scm:git:https://example.org/repo.git",
+        ),
+        (
+            b'<project xmlns="http://maven.apache.org/POM/4.0.0"><build><scm>'
+            b"<connection>nested</connection></scm></build><scm><url>foo</url>"
+            b"<connection>scm:svn:https://example.org/svn</connection></scm>"
+            b"</project>",
+            "scm:svn:https://example.org/svn",
+        ),
+        (b"<project><scm><url>https://example.org</url></scm></project>", None),
+        (b"<project><scm><connection/></scm></project>", ""),
+        (
+            '<?xml version="1.0" encoding="UTF-8"?><project><scm><connection>'
+            "scm:git:https://example.org/repo.git</connection></scm></project>".encode(
+                "utf-32"
+            ),
+            "scm:git:https://example.org/repo.git",
+        ),
+    ],
+)
+def test_maven_extract_scm_connection(pom, expected_connection):
+    assert extract_scm_connection(pom) == expected_connection
+
+
+def test_maven_pom_store(tmp_path):
+    pom_store = PomStore(str(tmp_path / "poms.sqlite"), cache_size=1024 * 1024)
+
+    pom_store.add(URL_POM_3, 4)
+    pom_store.add(URL_POM_1, 1)
+    pom_store.add(URL_POM_2, 3)
+    # a POM file referenced again is kept with its last document id
+    pom_store.add(URL_POM_1, 5)
+
+    assert len(pom_store) == 3
+    assert list(pom_store.items()) == [(URL_POM_2, 3), (URL_POM_3, 4), (URL_POM_1, 5)]
+
+    pom_store.close()
+    assert not (tmp_path / "poms.sqlite").exists()
+
+
+def test_maven_jar_origin_many_versions(swh_scheduler, mocker, tmp_path):
+    """Aggregation of artifacts of a maven package with many versions in a synthetic
+    index export, duplicated index entries must be ignored."""
+    nb_versions = 5000
+    publish_dir = tmp_path / "publish"
+    publish_dir.mkdir()
+    with gzip.open(publish_dir / "maven-index-export.ndjson.gz", "wt") as f:
+        for doc_id in range(nb_versions):
+            for _ in range(2):
+                entry = {
+                    "u": f"org.example|many-versions|1.{doc_id}|sources|jar",
+                    "doc": doc_id,
+                    "i": f"jar|{1626109619335 + doc_id * 1000}|14316|2|2|0|jar",
+                }
+                f.write(json.dumps(entry) + "\n")
+
+    mock_maven_index_exporter(mocker, str(tmp_path))
+
+    lister = MavenLister(
+        scheduler=swh_scheduler,
+        url=MVN_URL,
+        incremental=False,
+        process_pom_files=False,
+    )
+    stats = lister.run()
+
+    assert stats.pages == 2 * nb_versions + 1
+    scheduler_origins = swh_scheduler.get_listed_origins(lister.lister_obj.id).results
+    assert len(scheduler_origins) == 1
+    artifacts = scheduler_origins[0].extra_loader_arguments["artifacts"]
+    assert [artifact["version"] for artifact in artifacts] == [
+        f"1.{doc_id}" for doc_id in range(nb_versions)
+    ]
+
+
+def index_data(documents):
+    """Serialize documents in the maven index data format."""
+    data = BytesIO()
+    data.write(b"\x01" + struct.pack(">q", 1626111437014))
+    for document in documents:
+        data.write(struct.pack(">i", len(document)))
+        for name, value in document.items():
+            data.write(b"\x07" + struct.pack(">H", len(name)) + name.encode())
+            data.write(struct.pack(">i", len(value.encode())) + value.encode())
+    return data.getvalue()
+
+
+def index_properties(chain_id, chunks):
+    lines = [
+        "#Mon Jul 12 17:37:17 UTC 2021",
+        f"nexus.index.chain-id={chain_id}",
+        f"nexus.index.last-incremental={chunks[-1]}",
+    ]
+    for i, chunk in enumerate(reversed(chunks)):
+        lines.append(f"nexus.index.incremental-{i}={chunk}")
+    return "\n".join(lines) + "\n"
+
+
+def test_maven_read_index_data():
+    documents = [
+        {"DESCRIPTOR": "NexusIndex", "IDXINFO": "1.0|index"},
+        {"u": "al.aldi|sprova4j|0.1.1|sources|jar", "i": "jar|1626111425534"},
+        {"del": "al.aldi|sprova4j|0.1.0|sources|jar"},
+        {"n": "Nöt ÄSCII"},
+    ]
+    assert list(read_index_data(BytesIO(index_data(documents)))) == documents
+
+    with pytest.raises(EOFError):
+        list(read_index_data(BytesIO(index_data(documents)[:-3])))
+
+    with pytest.raises(ValueError, match="version"):
+        list(read_index_data(BytesIO(b"\x02" + index_data(documents)[1:])))
+
+
+def test_maven_incremental_listing_index_chunks(
+    swh_scheduler,
+    requests_mock_datadir,
+    requests_mock,
+    mocker,
+    tmp_path,
+    maven_index_full_publish_dir,
+    maven_index_incr_first_publish_dir,
+):
+    """Covers incremental listing of the chunks of the index published since the
+    first full listing, and the fallback to a full listing on new index chains."""
+    requests_mock.get(URL_INDEX_PROPERTIES, text=index_properties("1", [1, 2, 3]))
+    mock_maven_index_exporter(mocker, maven_index_incr_first_publish_dir)
+
+    lister = MavenLister(scheduler=swh_scheduler, url=MVN_URL, incremental=True)
+    stats = lister.run()
+
+    assert stats.pages == 4
+    assert stats.origins == 2
+    scheduler_state = lister.get_state_from_scheduler()
+    assert scheduler_state.index_chain_id == "1"
+    assert scheduler_state.last_seen_chunk == 3
+    assert scheduler_state.last_seen_doc == 1
+
+    # Only the new chunk is listed, in an unsorted order
+    requests_mock.get(URL_INDEX_PROPERTIES, text=index_properties("1", [2, 3, 4]))
+    chunk = index_data(
+        [
+            {"DESCRIPTOR": "NexusIndex", "IDXINFO": "1.0|index"},
+            {
+                "u": "al.aldi|sprova4j|0.1.1|sources|jar",
+                "i": "jar|1626111425534|14510|2|2|0|jar",
+            },
+            {"del": "al.aldi|sprova4j|0.1.0|NA|pom"},
+            {
+                "u": "com.arangodb|arangodb-graphql|1.2|NA|pom",
+                "i": "jar|1624265143830|-1|0|0|0|pom",
+            },
+        ]
+    )
+    requests_mock.get(
+        INDEX_URL + "nexus-maven-repository-index.4.gz", content=gzip.compress(chunk)
+    )
+    mocker.patch("tempfile.TemporaryDirectory.__enter__").return_value = str(tmp_path)
+    check_call = mocker.patch("subprocess.check_call")
+
+    lister = MavenLister(scheduler=swh_scheduler, url=MVN_URL, incremental=True)
+    stats = lister.run()
+
+    check_call.assert_not_called()
+    assert lister.updated
+    assert stats.pages == 4
+    assert stats.origins == 2
+    assert list(tmp_path.iterdir()) == []
+
+    scheduler_origins = swh_scheduler.get_listed_origins(lister.lister_obj.id).results
+    assert {origin.url for origin in scheduler_origins} == {
+        ORIGIN_SRC,
+        ORIGIN_GIT,
+        ORIGIN_GIT_INCR,
+    }
+    for origin in scheduler_origins:
+        if origin.visit_type == "maven":
+            # artifacts listed from the full export are kept
+            assert origin.extra_loader_arguments["artifacts"] == list(LIST_SRC_DATA)
+            assert origin.last_update == iso8601.parse_date(LIST_SRC_DATA[1]["time"])
+
+    scheduler_state = lister.get_state_from_scheduler()
+    assert scheduler_state.index_chain_id == "1"
+    assert scheduler_state.last_seen_chunk == 4
+    assert scheduler_state.last_seen_doc == 3
+    assert scheduler_state.last_seen_pom == 3
+
+    # The index was rebuilt, the whole index is listed again
+    requests_mock.get(URL_INDEX_PROPERTIES, text=index_properties("2", [1]))
+    mock_maven_index_exporter(mocker, maven_index_full_publish_dir)
+
+    lister = MavenLister(scheduler=swh_scheduler, url=MVN_URL, incremental=True)
+    stats = lister.run()
+
+    assert stats.pages == 7
+    assert stats.origins == 3
+    scheduler_state = lister.get_state_from_scheduler()
+    assert scheduler_state.index_chain_id == "2"
+    assert scheduler_state.last_seen_chunk == 1
+    assert scheduler_state.last_seen_doc == 4
+    assert scheduler_state.last_seen_pom == 4
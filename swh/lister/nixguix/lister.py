@@ -17,6 +17,7 @@ Artifacts can be of types:
 
 import base64
 import binascii
+import codecs
 from dataclasses import dataclass
 from datetime import datetime
 import email.parser
@@ -26,16 +27,22 @@ from enum import Enum
 import logging
 import random
 import re
-from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 from urllib.parse import urlparse
 
+from requests.adapters import HTTPAdapter
+
 from swh.core.tarball import MIMETYPE_TO_ARCHIVE_FORMAT
 from swh.lister import TARBALL_EXTENSIONS
 from swh.lister.pattern import CredentialsType, StatelessLister
 from swh.lister.utils import (
     ArtifactNatureMistyped,
     ArtifactNatureUndetected,
+    HostConcurrencyLimiter,
+    buffered_shuffle,
     is_tarball,
+    iter_json_items,
+    ordered_concurrent_map,
     url_contains_tarball_filename,
 )
 from swh.scheduler.model import ListedOrigin
@@ -59,6 +66,9 @@ DEFAULT_EXTENSIONS_TO_IGNORE = [
 ]
 """By default, ignore binary files and archives containing binaries."""
 
+MANIFEST_CHUNK_SIZE = 1024 * 1024
+"""Size of the chunks of the manifest decoded at once when streaming it."""
+
 
 class ChecksumLayout(Enum):
     """The possible artifact types listed out of the manifest."""
@@ -128,6 +138,30 @@ class ArtifactType(Enum):
 PageResult = Tuple[ArtifactType, Union[Artifact, VCS]]
 
 
+@dataclass
+class ManifestSource:
+    """Artifact of the manifest whose nature is being detected."""
+
+    artifact: Dict[str, Any]
+    """The artifact, as found in the manifest"""
+    artifact_type: str
+    """Type of the artifact (url, git, svn, hg)"""
+    origin: str
+    """Canonical url of the artifact, updated once its nature is detected"""
+    urls: List[str]
+    """Urls of the artifact, with a scheme"""
+    fallback_urls: List[str]
+    """Urls to retrieve the artifact if the canonical url no longer works"""
+    integrity: Optional[str]
+    """Integrity hash of the artifact"""
+    output_hash_mode: str
+    """How the integrity hash is computed (flat, recursive)"""
+    is_tar: bool = True
+    """Whether the artifact is a tarball or a file"""
+    nature_error: Optional[ValueError] = None
+    """Error raised when detecting the nature of the artifact, if any"""
+
+
 VCS_SUPPORTED = ("git", "svn", "hg")
 
 # Rough approximation of what we can find of mimetypes for tarballs "out there"
@@ -201,6 +235,16 @@ class NixGuixLister(StatelessLister[PageResult]):
     Optionally, when the ``extension_to_ignore`` parameter is provided, it extends the
     default extensions to ignore (:const:`DEFAULT_EXTENSIONS_TO_IGNORE`) with those passed.
     This can be optionally used to filter some more binary files detected in the wild.
+
+    The manifest artifacts are processed in a random order. By default, the whole
+    manifest is loaded in memory to be shuffled. When the ``shuffle_buffer_size``
+    parameter is provided, the manifest is instead parsed as it is downloaded and its
+    artifacts are shuffled through a buffer of that many artifacts, so the memory used
+    does not grow with the manifest size.
+
+    The nature of artifacts can be detected concurrently by ``probe_workers``
+    threads, with at most ``probe_max_per_host`` of them querying the same host. The
+    artifacts are still listed in the order of the manifest.
     """
 
     LISTER_NAME = "nixguix"
@@ -219,6 +263,9 @@ class NixGuixLister(StatelessLister[PageResult]):
         canonicalize: bool = True,
         extensions_to_ignore: List[str] = [],
         nixos_cache_url: str = "https://cache.nixos.org",
+        shuffle_buffer_size: Optional[int] = None,
+        probe_workers: int = 1,
+        probe_max_per_host: int = 4,
         **kwargs: Any,
     ):
         super().__init__(
@@ -236,6 +283,15 @@ class NixGuixLister(StatelessLister[PageResult]):
         self.origin_upstream = origin_upstream
         self.extensions_to_ignore = DEFAULT_EXTENSIONS_TO_IGNORE + extensions_to_ignore
         self.nixos_cache_url = nixos_cache_url
+        self.shuffle_buffer_size = shuffle_buffer_size
+        self.probe_workers = probe_workers
+        self.host_limiter = HostConcurrencyLimiter(probe_max_per_host)
+
+        if self.probe_workers > 1:
+            # keep a pooled connection per worker
+            adapter = HTTPAdapter(pool_maxsize=self.probe_workers)
+            self.session.mount("http://", adapter)
+            self.session.mount("https://", adapter)
 
     def build_artifact(
         self, artifact_url: str, artifact_type: str
@@ -271,110 +327,48 @@ class NixGuixLister(StatelessLister[PageResult]):
 
     def get_pages(self) -> Iterator[PageResult]:
         """Yield one page per "typed" origin referenced in manifest."""
-        # fetch and parse the manifest...
-        response = self.http_request(self.url)
+        sources: Iterable[Any]
+        if self.shuffle_buffer_size is None:
+            # fetch and parse the manifest...
+            response = self.http_request(self.url)
+
+            # ... if any
+            raw_data = response.json()
+            random.shuffle(raw_data["sources"])
+            sources = raw_data["sources"]
+        else:
+            # parse the manifest artifacts as they are downloaded
+            response = self.http_request(self.url, stream=True)
+            chunks = codecs.iterdecode(
+                response.iter_content(chunk_size=MANIFEST_CHUNK_SIZE), "utf-8"
+            )
+            sources = buffered_shuffle(
+                iter_json_items(chunks, "sources"), self.shuffle_buffer_size
+            )
 
-        # ... if any
-        raw_data = response.json()
         yield ArtifactType.VCS, VCS(origin=self.origin_upstream, type="git")
 
-        sources = raw_data["sources"]
-        random.shuffle(sources)
-
-        for artifact in sources:
-            artifact_type = artifact["type"]
-            origin_urls = artifact.get("urls")
-            outputHash = artifact.get("outputHash")
-            outputHashMode = artifact.get("outputHashMode", "flat")
-            integrity = artifact.get("integrity")
-
-            if artifact_type == "url" and not origin_urls:
-                # Nothing to fetch
-                logger.warning("Skipping url <%s>: empty artifact", artifact)
-                continue
-            elif origin_urls:
-                # Deal with urls with empty scheme (basic fallback to http)
-                urls = []
-                for url in origin_urls:
-                    urlparsed = urlparse(url)
-                    if urlparsed.scheme == "" and not re.match(r"^\w+@[^/]+:", url):
-                        logger.warning("Missing scheme for <%s>: fallback to http", url)
-                        fixed_url = f"http://{url}"
-                    else:
-                        fixed_url = url
-                    urls.append(fixed_url)
-
-                origin_urls = urls
-                origin, *fallback_urls = urls
-
-                # Let's check and filter it out if it is to be ignored (if possible).
-                # Some origin urls may not have extension at this point (e.g
-                # http://git.marmaro.de/?p=mmh;a=snp;h=<id>;sf=tgz), let them through.
-                parsed_url = urlparse(origin)
-                if artifact_type == "url" and (
-                    url_contains_tarball_filename(
-                        parsed_url,
-                        self.extensions_to_ignore,
-                        raise_when_no_extension=False,
-                    )
-                    # ignore nuget URLs as the archives contains binaries not source code
-                    or parsed_url.netloc == "www.nuget.org"
-                ):
-                    logger.warning(
-                        "Skipping artifact <%s>: 'file' artifact of type <%s> is"
-                        " ignored due to lister configuration. It should ignore"
-                        " origins with extension [%s]",
-                        origin,
-                        artifact_type,
-                        ",".join(self.extensions_to_ignore),
-                    )
-                    continue
-
-                if integrity is None and outputHash is None:
-                    logger.warning(
-                        "Skipping url <%s>: missing integrity and outputHash field",
-                        origin,
-                    )
-                    continue
-
-                # Falls back to outputHash field if integrity is missing
-                if integrity is None and outputHash:
-                    # We'll deal with outputHash as integrity field
-                    integrity = outputHash
-
-                if integrity is None or not outputHashMode:
-                    logger.warning(
-                        "Skipping url <%s>: missing integrity or outputHashMode field",
-                        origin,
-                    )
-                    continue
-            elif artifact_type in ("git", "hg", "svn"):
-                for vcs_url_field in ("git_url", "svn_url", "hg_url"):
-                    if vcs_url_field in artifact:
-                        origin = artifact[vcs_url_field]
-                        origin_urls = [origin]
-                        break
-            else:
-                logger.warning(
-                    "Skipping artifact <%s>: unsupported type %s",
-                    artifact,
-                    artifact_type,
-                )
-                continue
-
-            try:
-                is_tar, origin = (
-                    (True, origin)
-                    if (artifact["type"] != "url" or outputHashMode == "recursive")
-                    else is_tarball(origin_urls, self.session)
-                )
-            except ArtifactNatureUndetected:
+        for source in ordered_concurrent_map(
+            self.detect_artifact_nature,
+            filter(None, map(self.prepare_source, sources)),
+            workers=self.probe_workers,
+        ):
+            artifact = source.artifact
+            artifact_type = source.artifact_type
+            origin = source.origin
+            fallback_urls = source.fallback_urls
+            parsed_url = urlparse(source.urls[0])
+            integrity = source.integrity
+            outputHashMode = source.output_hash_mode
+            is_tar = source.is_tar
+
+            if isinstance(source.nature_error, ArtifactNatureUndetected):
                 logger.warning(
                     "Skipping url <%s>: undetected remote artifact type",
                     artifact["urls"][0],
                 )
                 continue
-            except ArtifactNatureMistyped:
+            elif isinstance(source.nature_error, ArtifactNatureMistyped):
                 logger.warning(
                     "Mistyped url <%s>: trying to deal with it properly", origin
                 )
@@ -495,6 +489,8 @@ class NixGuixLister(StatelessLister[PageResult]):
                     yield built_artifact
                     continue
 
+                # url artifacts without integrity are skipped by prepare_source
+                assert integrity is not None
                 failure_log_if_any = (
                     f"Skipping url: <{origin}>: integrity computation failure "
                     f"for <{artifact}>"
@@ -545,6 +541,122 @@ class NixGuixLister(StatelessLister[PageResult]):
                     last_update=None,
                 )
 
+    def prepare_source(self, artifact: Dict[str, Any]) -> Optional[ManifestSource]:
+        """Check and normalize the URLs of an artifact of the manifest.
+
+        Returns:
+            the artifact along with its origin URLs, or None if it must be skipped
+        """
+        artifact_type = artifact["type"]
+        origin_urls = artifact.get("urls")
+        outputHash = artifact.get("outputHash")
+        outputHashMode = artifact.get("outputHashMode", "flat")
+        integrity = artifact.get("integrity")
+
+        if artifact_type == "url" and not origin_urls:
+            # Nothing to fetch
+            logger.warning("Skipping url <%s>: empty artifact", artifact)
+            return None
+        elif origin_urls:
+            # Deal with urls with empty scheme (basic fallback to http)
+            urls = []
+            for url in origin_urls:
+                urlparsed = urlparse(url)
+                if urlparsed.scheme == "" and not re.match(r"^\w+@[^/]+:", url):
+                    logger.warning("Missing scheme for <%s>: fallback to http", url)
+                    fixed_url = f"http://{url}"
+                else:
+                    fixed_url = url
+                urls.append(fixed_url)
+
+            origin_urls = urls
+            origin, *fallback_urls = urls
+
+            # Let's check and filter it out if it is to be ignored (if possible).
+            # Some origin urls may not have extension at this point (e.g
+            # http://git.marmaro.de/?p=mmh;a=snp;h=<id>;sf=tgz), let them through.
+            parsed_url = urlparse(origin)
+            if artifact_type == "url" and (
+                url_contains_tarball_filename(
+                    parsed_url,
+                    self.extensions_to_ignore,
+                    raise_when_no_extension=False,
+                )
+                # ignore nuget URLs as the archives contains binaries not source code
+                or parsed_url.netloc == "www.nuget.org"
+            ):
+                logger.warning(
+                    "Skipping artifact <%s>: 'file' artifact of type <%s> is"
+                    " ignored due to lister configuration. It should ignore"
+                    " origins with extension [%s]",
+                    origin,
+                    artifact_type,
+                    ",".join(self.extensions_to_ignore),
+                )
+                return None
+
+            if integrity is None and outputHash is None:
+                logger.warning(
+                    "Skipping url <%s>: missing integrity and outputHash field",
+                    origin,
+                )
+                return None
+
+            # Falls back to outputHash field if integrity is missing
+            if integrity is None and outputHash:
+                # We'll deal with outputHash as integrity field
+                integrity = outputHash
+
+            if integrity is None or not outputHashMode:
+                logger.warning(
+                    "Skipping url <%s>: missing integrity or outputHashMode field",
+                    origin,
+                )
+                return None
+        elif artifact_type in ("git", "hg", "svn"):
+            for vcs_url_field in ("git_url", "svn_url", "hg_url"):
+                if vcs_url_field in artifact:
+                    origin = artifact[vcs_url_field]
+                    origin_urls = [origin]
+                    fallback_urls = []
+                    break
+            else:
+                logger.warning("Skipping artifact <%s>: missing url", artifact)
+                return None
+        else:
+            logger.warning(
+                "Skipping artifact <%s>: unsupported type %s",
+                artifact,
+                artifact_type,
+            )
+            return None
+
+        return ManifestSource(
+            artifact=artifact,
+            artifact_type=artifact_type,
+            origin=origin,
+            urls=origin_urls,
+            fallback_urls=fallback_urls,
+            integrity=integrity,
+            output_hash_mode=outputHashMode,
+        )
+
+    def detect_artifact_nature(self, source: ManifestSource) -> ManifestSource:
+        """Detect if the artifact of a manifest source is a tarball or a file,
+        querying its URLs when their extensions are inconclusive.
+
+        This is executed concurrently for consecutive sources, with a limited number
+        of concurrent queries per host.
+        """
+        if source.artifact["type"] == "url" and source.output_hash_mode != "recursive":
+            try:
+                source.is_tar, source.origin = is_tarball(
+                    source.urls, self.session, self.host_limiter
+                )
+            except (ArtifactNatureUndetected, ArtifactNatureMistyped) as error:
+                source.nature_error = error
+        return source
+
     def vcs_to_listed_origin(self, artifact: VCS) -> Iterator[ListedOrigin]:
         """Given a vcs repository, yield a ListedOrigin."""
         assert self.lister_obj.id is not None
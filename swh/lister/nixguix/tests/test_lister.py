@@ -9,6 +9,7 @@ import logging
 from operator import itemgetter
 import os
 from pathlib import Path
+import threading
 from typing import Dict, List
 from urllib.parse import urlparse
 
@@ -231,11 +232,22 @@ def test_is_tarball_last_resort_url_fetch(requests_mock_datadir, requests_mock):
     assert is_tar is False
 
 
-def test_lister_nixguix_ok(datadir, swh_scheduler, requests_mock):
+@pytest.mark.parametrize(
+    "shuffle_buffer_size,probe_workers", [(None, 1), (1, 1), (5, 1), (None, 4)]
+)
+def test_lister_nixguix_ok(
+    datadir, swh_scheduler, requests_mock, shuffle_buffer_size, probe_workers
+):
     """NixGuixLister should list all origins per visit type"""
     url = SOURCES["guix"]["manifest"]
     origin_upstream = SOURCES["guix"]["repo"]
-    lister = NixGuixLister(swh_scheduler, url=url, origin_upstream=origin_upstream)
+    lister = NixGuixLister(
+        swh_scheduler,
+        url=url,
+        origin_upstream=origin_upstream,
+        shuffle_buffer_size=shuffle_buffer_size,
+        probe_workers=probe_workers,
+    )
     assert "User-Agent" in lister.session.headers
 
     response = page_response(datadir, "success")
@@ -392,6 +404,78 @@ def test_lister_nixguix_ok(datadir, swh_scheduler, requests_mock):
     assert dict(mapping_visit_types) == expected_visit_types
 
 
+def test_lister_nixguix_concurrent_probes_keep_manifest_order(
+    datadir, swh_scheduler, requests_mock, mocker
+):
+    """Artifacts whose nature is detected concurrently are listed in the order of
+    the manifest, with a limited number of concurrent probes per host, including
+    the hosts of their fallback urls."""
+    url = SOURCES["guix"]["manifest"]
+    origin_upstream = SOURCES["guix"]["repo"]
+    sources = [
+        {
+            "type": "url",
+            "urls": [
+                f"https://host{i % 2}.example.org/download?id={i}",
+                f"https://mirror.example.org/download?id={i}",
+            ],
+            "integrity": "sha256-1XPjW0rqDf0D0aBmVx3MgdHxM4VbnSzbavcDvlswaJ8=",
+        }
+        for i in range(20)
+    ]
+    requests_mock.get(url, json={"sources": sources})
+    mocker.patch("swh.lister.nixguix.lister.random.shuffle")
+
+    for i, source in enumerate(sources):
+        # the first url of each artifact is unavailable, its mirror is probed next
+        requests_mock.head(source["urls"][0], status_code=404)
+        requests_mock.head(
+            source["urls"][1],
+            headers={"Content-Type": "application/gzip" if i % 3 else "text/plain"},
+        )
+
+    lister = NixGuixLister(
+        swh_scheduler,
+        url=url,
+        origin_upstream=origin_upstream,
+        probe_workers=6,
+        probe_max_per_host=2,
+    )
+
+    lock = threading.Lock()
+    probing = defaultdict(int)
+    max_probing = defaultdict(int)
+    session_head = lister.session.head
+
+    def head(url, **kwargs):
+        host = urlparse(url).netloc
+        with lock:
+            probing[host] += 1
+            max_probing[host] = max(max_probing[host], probing[host])
+        # make the first artifacts the slowest to probe (time.sleep is mocked)
+        threading.Event().wait(0.001 * (20 - int(url.rsplit("=", 1)[1])))
+        with lock:
+            probing[host] -= 1
+        return session_head(url, **kwargs)
+
+    mocker.patch.object(lister.session, "head", side_effect=head)
+
+    pages = list(lister.get_pages())
+
+    assert [artifact.origin for _, artifact in pages[1:]] == [
+        source["urls"][0] for source in sources
+    ]
+    assert [artifact.visit_type for _, artifact in pages[1:]] == [
+        "tarball-directory" if i % 3 else "content" for i in range(20)
+    ]
+    assert set(max_probing) == {
+        "host0.example.org",
+        "host1.example.org",
+        "mirror.example.org",
+    }
+    assert max(max_probing.values()) <= 2
+
+
 def test_lister_nixguix_mostly_noop(datadir, swh_scheduler, requests_mock):
     """NixGuixLister should ignore unsupported or incomplete or to ignore origins"""
     url = SOURCES["nixpkgs"]["manifest"]
@@ -484,7 +568,7 @@ def test_lister_nixguix_svn_export_sub_trees(datadir, swh_scheduler, requests_mo
 
     listed_result = lister.run()
 
-    assert listed_result == ListerStats(pages=7, origins=5)
+    assert listed_result == ListerStats(pages=7, origins=5, origins_coalesced=2)
 
     scheduler_origins = {
         origin.url: origin
@@ -514,12 +598,18 @@ def expected_nixpkgs_origins(datadir):
         return json.load(expected_origins)
 
 
+@pytest.mark.parametrize("shuffle_buffer_size", [None, 3])
 def test_lister_nixguix_list_nixpkgs(
-    requests_mock_datadir, swh_scheduler, expected_nixpkgs_origins
+    requests_mock_datadir, swh_scheduler, expected_nixpkgs_origins, shuffle_buffer_size
 ):
     url = SOURCES["nixpkgs"]["manifest"]
     origin_upstream = SOURCES["nixpkgs"]["repo"]
-    lister = NixGuixLister(swh_scheduler, url=url, origin_upstream=origin_upstream)
+    lister = NixGuixLister(
+        swh_scheduler,
+        url=url,
+        origin_upstream=origin_upstream,
+        shuffle_buffer_size=shuffle_buffer_size,
+    )
 
     listed_result = lister.run()
 
@@ -5,17 +5,22 @@
 
 from dataclasses import dataclass
 from datetime import datetime
+from io import BytesIO
 import logging
 from typing import Any, Dict, Iterator, List, Optional
 
 from bs4 import BeautifulSoup
 import iso8601
+from lxml import etree
+import requests
+from requests.adapters import HTTPAdapter
 from requests.exceptions import HTTPError
 
 from swh.scheduler.interface import SchedulerInterface
 from swh.scheduler.model import ListedOrigin
 
 from ..pattern import CredentialsType, Lister
+from ..utils import HostConcurrencyLimiter, LRUSet, ordered_concurrent_map
 
 logger = logging.getLogger(__name__)
 
@@ -24,6 +29,38 @@ logger = logging.getLogger(__name__)
 NugetListerPage = List[Dict[str, str]]
 
 
+def extract_nuspec_repository(nuspec: bytes) -> Optional[Dict[str, str]]:
+    """Extract the attributes of the ``repository`` element of a nuspec file.
+
+    The XML document is parsed incrementally and parsing stops as soon as the
+    element is found, falling back to a lenient BeautifulSoup parsing for documents
+    lxml cannot parse on its own.
+
+    Raises:
+        lxml.etree.Error if the document cannot be parsed at all
+
+    """
+    try:
+        for _, element in etree.iterparse(
+            BytesIO(nuspec),
+            events=("start",),
+            resolve_entities=False,
+            no_network=True,
+        ):
+            if etree.QName(element).localname == "repository":
+                return dict(element.attrib)
+        return None
+    except etree.XMLSyntaxError:
+        repository = BeautifulSoup(nuspec, "xml").select_one("repository")
+        if repository is None:
+            return None
+        return {
+            name: value
+            for name, value in repository.attrs.items()
+            if isinstance(value, str)
+        }
+
+
 @dataclass
 class NugetListerState:
     """Store lister state for incremental mode operations"""
@@ -33,7 +70,14 @@ class NugetListerState:
 
 
 class NugetLister(Lister[NugetListerState, NugetListerPage]):
-    """List Nuget (Package manager for .NET) origins."""
+    """List Nuget (Package manager for .NET) origins.
+
+    The catalog holds an entry per version of a package, while a single origin is
+    listed for the vcs repository of a package. Catalog pages and their entries are
+    thus processed from the newest to the oldest, and only the newest entry of each
+    package is resolved, the ids of the packages already resolved during the run
+    being remembered in a bounded set.
+    """
 
     LISTER_NAME = "nuget"
     INSTANCE = "nuget"
@@ -49,7 +93,22 @@ class NugetLister(Lister[NugetListerState, NugetListerPage]):
         max_origins_per_page: Optional[int] = None,
         max_pages: Optional[int] = None,
         enable_origins: bool = True,
+        resolve_workers: int = 1,
+        resolve_max_per_host: int = 4,
+        resolved_packages_cache_size: int = 1_000_000,
     ):
+        """Lister class for the Nuget catalog.
+
+        Args:
+            resolve_workers: defaults to 1. Number of threads fetching the catalog
+                leaf and the nuspec file of the items of a catalog page concurrently,
+                origins are still listed in the order of the page.
+            resolve_max_per_host: defaults to 4. Maximum number of threads fetching
+                files from the same host at once.
+            resolved_packages_cache_size: defaults to 1000000. Maximum number of
+                package ids remembered as already resolved during the run, the older
+                entries of these packages are not resolved.
+        """
         super().__init__(
             scheduler=scheduler,
             credentials=credentials,
@@ -60,6 +119,15 @@ class NugetLister(Lister[NugetListerState, NugetListerPage]):
             enable_origins=enable_origins,
         )
         self.listing_date: Optional[datetime] = None
+        self.resolve_workers = resolve_workers
+        self.host_limiter = HostConcurrencyLimiter(resolve_max_per_host)
+        self.resolved_packages = LRUSet(resolved_packages_cache_size)
+
+        if self.resolve_workers > 1:
+            # keep a pooled connection per worker
+            adapter = HTTPAdapter(pool_maxsize=self.resolve_workers)
+            self.session.mount("http://", adapter)
+            self.session.mount("https://", adapter)
 
     def state_from_dict(self, d: Dict[str, Any]) -> NugetListerState:
         last_listing_date = d.get("last_listing_date")
@@ -87,7 +155,11 @@ class NugetLister(Lister[NugetListerState, NugetListerPage]):
         self.listing_date = iso8601.parse_date(index["commitTimeStamp"])
 
         assert "items" in index
-        for page in index["items"]:
+        for page in sorted(
+            index["items"],
+            key=lambda page: iso8601.parse_date(page["commitTimeStamp"]),
+            reverse=True,
+        ):
             assert page["@id"]
             assert page["commitTimeStamp"]
 
@@ -116,51 +188,87 @@ class NugetLister(Lister[NugetListerState, NugetListerPage]):
 
         To check if a vcs repository exists, we need for each entry in a page to retrieve
         a .nuspec file, which is a package metadata xml file, and search for a `repository`
-        value.
+        value. Entries are resolved concurrently by ``resolve_workers`` threads.
+        """
+        for origin in ordered_concurrent_map(
+            self.resolve_catalog_item,
+            self.select_catalog_items(page),
+            workers=self.resolve_workers,
+        ):
+            if origin is not None:
+                yield origin
+
+    def select_catalog_items(self, page: NugetListerPage) -> List[Dict[str, str]]:
+        """Select the entries of a catalog page to resolve, from the newest to the
+        oldest, skipping the package versions older than an already resolved one."""
+        items = []
+        for elt in sorted(
+            page,
+            key=lambda elt: iso8601.parse_date(elt["commitTimeStamp"]),
+            reverse=True,
+        ):
+            if elt.get("@type") == "nuget:PackageDetails" and "nuget:id" in elt:
+                package_id = elt["nuget:id"].lower()
+                if package_id in self.resolved_packages:
+                    # catalog leaf and nuspec file requests
+                    self.fetches_avoided += 2
+                    continue
+                self.resolved_packages.add(package_id)
+            items.append(elt)
+        return items
+
+    def limited_http_request(self, url: str) -> requests.Response:
+        """Send an HTTP request, waiting for the number of concurrent requests to
+        the same host to be under the configured limit."""
+        with self.host_limiter.limit(url):
+            return self.http_request(url=url)
+
+    def resolve_catalog_item(self, elt: Dict[str, str]) -> Optional[ListedOrigin]:
+        """Fetch the catalog leaf and the nuspec file of a catalog page entry.
+
+        Returns:
+            the origin of the vcs repository of the package if its nuspec file
+            references one, None otherwise
         """
         assert self.lister_obj.id is not None
 
-        for elt in page:
-            try:
-                res = self.http_request(url=elt["@id"])
-            except HTTPError:
-                logger.warning(
-                    "Failed to fetch page %s, skipping it from listing.",
-                    elt["@id"],
-                )
-                continue
-
-            data = res.json()
-            pkgname = data["id"]
-            nuspec_url = (
-                f"https://api.nuget.org/v3-flatcontainer/{pkgname.lower()}/"
-                f"{data['version'].lower()}/{pkgname.lower()}.nuspec"
+        try:
+            res = self.limited_http_request(elt["@id"])
+        except HTTPError:
+            logger.warning(
+                "Failed to fetch page %s, skipping it from listing.",
+                elt["@id"],
             )
+            return None
 
-            try:
-                res_metadata = self.http_request(url=nuspec_url)
-            except HTTPError:
-                logger.warning(
-                    "Failed to fetch nuspec file %s, skipping it from listing.",
-                    nuspec_url,
-                )
-                continue
-            xml = BeautifulSoup(res_metadata.content, "xml")
-            repo = xml.select_one("repository")
-            if repo and "url" in repo.attrs and "type" in repo.attrs:
-                vcs_url = repo.attrs["url"]
-                vcs_type = repo.attrs["type"]
-                last_update = iso8601.parse_date(elt["commitTimeStamp"])
-                assert isinstance(vcs_url, str)
-                assert isinstance(vcs_type, str)
-                yield ListedOrigin(
-                    lister_id=self.lister_obj.id,
-                    visit_type=vcs_type,
-                    url=vcs_url,
-                    last_update=last_update,
-                )
-            else:
-                continue
+        data = res.json()
+        pkgname = data["id"]
+        nuspec_url = (
+            f"https://api.nuget.org/v3-flatcontainer/{pkgname.lower()}/"
+            f"{data['version'].lower()}/{pkgname.lower()}.nuspec"
+        )
+
+        try:
+            res_metadata = self.limited_http_request(nuspec_url)
+        except HTTPError:
+            logger.warning(
+                "Failed to fetch nuspec file %s, skipping it from listing.",
+                nuspec_url,
+            )
+            return None
+        try:
+            repo = extract_nuspec_repository(res_metadata.content)
+        except etree.Error as error:
+            logger.info("Could not parse nuspec file %s: %s.", nuspec_url, error)
+            return None
+        if repo and "url" in repo and "type" in repo:
+            return ListedOrigin(
+                lister_id=self.lister_obj.id,
+                visit_type=repo["type"],
+                url=repo["url"],
+                last_update=iso8601.parse_date(elt["commitTimeStamp"]),
+            )
+        return None
 
     def finalize(self) -> None:
         self.state.last_listing_date = self.listing_date
@@ -3,14 +3,17 @@
 # License: GNU General Public License version 3, or any later version
 # See top-level LICENSE file for more information
 
-from swh.lister.nuget.lister import NugetLister
+import pytest
+
+from swh.lister.nuget.lister import NugetLister, extract_nuspec_repository
 
 expected_origins = ["https://github.com/sillsdev/libpalaso.git"]
 expected_origins_incremental = ["https://github.com/moq/Moq.AutoMocker"]
 
 
-def test_nuget_lister(datadir, requests_mock_datadir, swh_scheduler):
-    lister = NugetLister(scheduler=swh_scheduler)
+@pytest.mark.parametrize("resolve_workers", [1, 4])
+def test_nuget_lister(datadir, requests_mock_datadir, swh_scheduler, resolve_workers):
+    lister = NugetLister(scheduler=swh_scheduler, resolve_workers=resolve_workers)
     res = lister.run()
 
     assert res.pages == 2
@@ -129,3 +132,104 @@ def test_nuget_lister_incremental_no_changes(
     assert lister.state.last_listing_date == last_date
     assert res.pages == 0
     assert res.origins == 0
+
+
+@pytest.mark.parametrize(
+    "nuspec,expected_repository",
+    [
+        (
+            b"""<?xml version="1.0" encoding="utf-8"?>
+<package xmlns="http://schemas.microsoft.com/packaging/2013/05/nuspec.xsd">
+  <metadata>
+    <id>Moq.AutoMock</id>
+    <repository type="git" url="https://github.com/moq/Moq.AutoMocker" />
+  </metadata>
+</package>""",
+            {"type": "git", "url": "https://github.com/moq/Moq.AutoMocker"},
+        ),
+        (
+            b"""<?xml version="1.0" encoding="utf-8"?>
+<package><metadata><id>NoRepository</id></metadata></package>""",
+            None,
+        ),
+        (
+            # undefined entity, parsed by BeautifulSoup
+            b"""<package><metadata><description>&nbsp;</description>
+<repository type="git" url="https://example.org/repo.git"/></metadata></package>""",
+            {"type": "git", "url": "https://example.org/repo.git"},
+        ),
+    ],
+)
+def test_nuget_extract_nuspec_repository(nuspec, expected_repository):
+    assert extract_nuspec_repository(nuspec) == expected_repository
+
+
+def test_nuget_lister_resolves_newest_package_entries(requests_mock, swh_scheduler):
+    """Only the newest catalog entry of each package is resolved during a run."""
+    catalog_url = "https://api.nuget.org/v3/catalog0"
+    nuspec = (
+        '<package><metadata><repository type="git" url="https://example.org/{}.git"/>'
+        "</metadata></package>"
+    )
+
+    def entry(package, version, timestamp):
+        leaf_url = f"{catalog_url}/data/{timestamp}/{package}.{version}.json"
+        requests_mock.get(leaf_url, json={"id": package, "version": version})
+        requests_mock.get(
+            f"https://api.nuget.org/v3-flatcontainer/{package.lower()}/{version}/"
+            f"{package.lower()}.nuspec",
+            text=nuspec.format(f"{package}-{version}"),
+        )
+        return {
+            "@id": leaf_url,
+            "@type": "nuget:PackageDetails",
+            "commitTimeStamp": f"2022-10-{timestamp}T00:00:00Z",
+            "nuget:id": package,
+            "nuget:version": version,
+        }
+
+    pages = {
+        "page0": [entry("Foo", "1.0", "01"), entry("Bar", "1.0", "02")],
+        "page1": [
+            entry("foo", "1.1", "03"),
+            entry("Foo", "1.3", "05"),
+            entry("Foo", "1.2", "04"),
+        ],
+    }
+    for name, items in pages.items():
+        requests_mock.get(f"{catalog_url}/{name}.json", json={"items": items})
+    requests_mock.get(
+        NugetLister.API_INDEX_URL,
+        json={
+            "commitTimeStamp": "2022-10-05T00:00:00Z",
+            "items": [
+                {"@id": f"{catalog_url}/page0.json", "commitTimeStamp": "2022-10-02"},
+                {"@id": f"{catalog_url}/page1.json", "commitTimeStamp": "2022-10-05"},
+            ],
+        },
+    )
+
+    lister = NugetLister(scheduler=swh_scheduler, resolve_workers=2)
+    stats = lister.run()
+
+    assert stats.pages == 2
+    assert stats.origins == 2
+    # catalog leaves and nuspec files of the 3 older Foo entries
+    assert stats.fetches_avoided == 6
+    fetched_leaves = [
+        request.url
+        for request in requests_mock.request_history
+        if request.url.startswith(f"{catalog_url}/data/")
+    ]
+    assert fetched_leaves == [
+        f"{catalog_url}/data/05/Foo.1.3.json",
+        f"{catalog_url}/data/02/Bar.1.0.json",
+    ]
+
+    scheduler_origins = swh_scheduler.get_listed_origins(lister.lister_obj.id).results
+    assert sorted(
+        (origin.url, origin.last_update.day) for origin in scheduler_origins
+    ) == [
+        ("https://example.org/Bar-1.0.git", 2),
+        ("https://example.org/Foo-1.3.git", 5),
+    ]
@@ -5,10 +5,28 @@
 
 from __future__ import annotations
 
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 import copy
 from dataclasses import dataclass
 import logging
-from typing import Any, Dict, Generic, Iterable, Iterator, List, Optional, Set, TypeVar
+from queue import Full, Queue
+import threading
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Generator,
+    Generic,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+)
 from urllib.parse import urlparse
 
 import attr
@@ -23,7 +41,7 @@ from swh.scheduler.interface import SchedulerInterface
 from swh.scheduler.utils import utcnow
 
 from . import USER_AGENT_TEMPLATE
-from .utils import is_valid_origin_url
+from .utils import DownloadCache, is_valid_origin_url
 
 logger = logging.getLogger(__name__)
 
@@ -32,16 +50,54 @@ logger = logging.getLogger(__name__)
 class ListerStats:
     pages: int = 0
     origins: int = 0
+    fetches_avoided: int = 0
+    origins_coalesced: int = 0
 
     def __add__(self, other: ListerStats) -> ListerStats:
-        return self.__class__(self.pages + other.pages, self.origins + other.origins)
+        return self.__class__(
+            self.pages + other.pages,
+            self.origins + other.origins,
+            self.fetches_avoided + other.fetches_avoided,
+            self.origins_coalesced + other.origins_coalesced,
+        )
 
     def __iadd__(self, other: ListerStats):
         self.pages += other.pages
         self.origins += other.origins
+        self.fetches_avoided += other.fetches_avoided
+        self.origins_coalesced += other.origins_coalesced
 
     def dict(self) -> Dict[str, int]:
-        return {"pages": self.pages, "origins": self.origins}
+        return {
+            "pages": self.pages,
+            "origins": self.origins,
+            "fetches_avoided": self.fetches_avoided,
+            "origins_coalesced": self.origins_coalesced,
+        }
+
+
+def coalesce_origins(
+    origins: Iterable[model.ListedOrigin],
+) -> List[model.ListedOrigin]:
+    """Merge the listed origins sharing the same URL and visit type.
+
+    Only the last listed of those origins is kept, in the position of the first one,
+    with the most recent ``last_update`` date found among them.
+    """
+    coalesced: Dict[Tuple[str, str], model.ListedOrigin] = {}
+    for origin in origins:
+        key = (origin.url, origin.visit_type)
+        previous = coalesced.get(key)
+        if (
+            previous is not None
+            and previous.last_update is not None
+            and (
+                origin.last_update is None or origin.last_update < previous.last_update
+            )
+        ):
+            origin = attr.evolve(origin, last_update=previous.last_update)
+        coalesced[key] = origin
+    return list(coalesced.values())
 
 
 StateType = TypeVar("StateType")
@@ -50,6 +106,44 @@ PageType = TypeVar("PageType")
 BackendStateType = Dict[str, Any]
 CredentialsType = Optional[Dict[str, Dict[str, List[Dict[str, str]]]]]
 
+_END_OF_PAGES = object()
+
+
+class _OriginsWriter:
+    """Record batches of origins from a background thread.
+
+    Batches are written in the order they were submitted, by a single thread. At most
+    ``max_inflight`` batches can be pending at once: submitting a new batch blocks
+    until the oldest one has been written, and re-raises the error that occurred while
+    writing it, if any.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[List[model.ListedOrigin]], Any],
+        max_inflight: int,
+        name: str,
+    ):
+        self.send = send
+        self.max_inflight = max_inflight
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+        self.inflight: Deque[Future] = deque()
+
+    def submit(self, origins: List[model.ListedOrigin]) -> None:
+        while len(self.inflight) >= self.max_inflight:
+            self.inflight.popleft().result()
+        # copy the batch as the caller can reuse the list to gather the next one
+        self.inflight.append(self.executor.submit(self.send, list(origins)))
+
+    def wait(self) -> None:
+        """Block until all the submitted batches have been written."""
+        while self.inflight:
+            self.inflight.popleft().result()
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        self.inflight.clear()
+
 
 class Lister(Generic[StateType, PageType]):
     """The base class for a Software Heritage lister.
@@ -91,6 +185,19 @@ class Lister(Generic[StateType, PageType]):
       max_origins_per_page: the maximum number of origins processed per page
       enable_origins: whether the created origins should be enabled or not
       record_batch_size: maximum number of records to flush to the scheduler at once.
+      prefetch_pages: when strictly positive, :meth:`get_pages` is consumed in a
+        background thread which fetches up to that number of pages ahead of the
+        page currently being processed. Pages are still processed and committed in
+        order. This must only be enabled for listers whose :meth:`get_pages` does
+        not depend on state updated by :meth:`commit_page` during the run.
+      max_inflight_batches: when strictly positive, batches of origins are recorded
+        in the scheduler by a background thread while the next batch is being
+        filled, with at most that number of batches waiting to be recorded.
+        :meth:`wait_for_recorded_origins` can be used as a barrier.
+      download_cache_dir: when set, directory of a :class:`swh.lister.utils.DownloadCache`
+        in which the listers supporting it keep the files they download between runs,
+        see :meth:`mark_download_listed`
+      download_cache_max_size: maximum size in bytes of the download cache
 
     Generic types:
       - *StateType*: concrete lister type; should usually be a :class:`dataclass` for
@@ -115,6 +222,10 @@ class Lister(Generic[StateType, PageType]):
         with_github_session: bool = False,
         record_batch_size: int = 1000,
         first_visits_queue_prefix: Optional[str] = None,
+        prefetch_pages: int = 0,
+        max_inflight_batches: int = 0,
+        download_cache_dir: Optional[str] = None,
+        download_cache_max_size: int = 4 * 1024 * 1024 * 1024,
     ):
         if not self.LISTER_NAME:
             raise ValueError("Must set the LISTER_NAME attribute on Lister classes")
@@ -171,6 +282,22 @@ class Lister(Generic[StateType, PageType]):
         self.max_origins_per_page = max_origins_per_page
         self.enable_origins = enable_origins
         self.record_batch_size = record_batch_size
+        self.prefetch_pages = prefetch_pages
+        self.max_inflight_batches = max_inflight_batches
+        self.origins_writer: Optional[_OriginsWriter] = None
+        self.download_cache: Optional[DownloadCache] = (
+            DownloadCache(download_cache_dir, download_cache_max_size)
+            if download_cache_dir
+            else None
+        )
+        self.listed_download_urls: List[str] = []
+        self.fetches_avoided = 0
+        """Number of HTTP requests the lister did not need to send during the
+        current run, e.g. thanks to deduplication, reported in :class:`ListerStats`"""
+        self.origins_coalesced = 0
+        """Number of duplicate listed origins merged by :meth:`send_origins` before
+        being recorded in the scheduler during the current run, reported in
+        :class:`ListerStats`"""
 
     def build_url(self, instance: str) -> str:
         """Optionally build the forge url to list. When the url is not provided in the
@@ -214,20 +341,32 @@ class Lister(Generic[StateType, PageType]):
 
         Returns:
           A counter with the number of pages and origins seen for this run
-          of the lister.
+          of the lister, the number of HTTP requests it avoided and the number
+          of duplicate origins it did not send to the scheduler.
 
         """
         full_stats = ListerStats()
         self.recorded_origins = set()
+        self.fetches_avoided = 0
+        self.origins_coalesced = 0
+        self.listed_download_urls = []
+
+        if self.max_inflight_batches:
+            self.origins_writer = _OriginsWriter(
+                self.send_origins,
+                self.max_inflight_batches,
+                name=f"{self.LISTER_NAME}-writer",
+            )
 
+        origins: List[model.ListedOrigin] = []
+        pages = self.iter_pages()
         try:
-            origins: List[model.ListedOrigin] = []
-            for page in self.get_pages():
+            for page in pages:
                 full_stats.pages += 1
                 for i, origin in enumerate(self.get_origins_from_page(page)):
                     origins.append(origin)
                     if len(origins) == self.record_batch_size:
-                        self.send_origins(origins)
+                        self.record_origins(origins)
                         origins.clear()
 
                     if (
@@ -247,14 +386,38 @@ class Lister(Generic[StateType, PageType]):
                     logger.info("Reached page limit of %s, terminating", self.max_pages)
                     break
         finally:
-            if origins:
-                self.send_origins(origins)
+            # stop any background page fetching before flushing the last origins
+            pages.close()
+            try:
+                if origins:
+                    self.record_origins(origins)
+                # writing errors must be raised before the state gets updated
+                self.wait_for_recorded_origins()
+                if self.download_cache is not None:
+                    for url in self.listed_download_urls:
+                        self.download_cache.mark_listed(url)
+            finally:
+                if self.origins_writer is not None:
+                    self.origins_writer.close()
+                    self.origins_writer = None
             self.finalize()
             self.set_state_in_scheduler(with_listing_finished_date=True)
 
         full_stats.origins = len(self.recorded_origins)
+        full_stats.fetches_avoided = self.fetches_avoided
+        full_stats.origins_coalesced = self.origins_coalesced
         return full_stats
 
+    def mark_download_listed(self, url: str) -> None:
+        """Mark the file downloaded from ``url`` through :attr:`download_cache` as
+        listed, once the origins listed from it are recorded in the scheduler.
+
+        This should be called from :meth:`get_pages` once the file was completely
+        listed; it is a no-op when no download cache is configured.
+        """
+        if self.download_cache is not None:
+            self.listed_download_urls.append(url)
+
     def get_state_from_scheduler(self) -> StateType:
         """Update the state in the current instance from the state in the scheduler backend.
 
@@ -333,6 +496,64 @@ class Lister(Generic[StateType, PageType]):
         """
         raise NotImplementedError
 
+    def iter_pages(self) -> Generator[PageType, None, None]:
+        """Iterate over the pages yielded by :meth:`get_pages`.
+
+        When :attr:`prefetch_pages` is set, :meth:`get_pages` is consumed by a
+        background thread filling a bounded queue, so the next pages get fetched while
+        the current one is being processed. Pages are yielded in the order they were
+        produced, and any exception raised by :meth:`get_pages` is raised again once
+        the pages fetched before it have been yielded.
+        """
+        if not self.prefetch_pages:
+            yield from self.get_pages()
+            return
+
+        queue: Queue[Tuple[Any, Optional[BaseException]]] = Queue(
+            maxsize=self.prefetch_pages
+        )
+        stop = threading.Event()
+
+        def put(item: Tuple[Any, Optional[BaseException]]) -> bool:
+            while not stop.is_set():
+                try:
+                    queue.put(item, timeout=0.1)
+                    return True
+                except Full:
+                    continue
+            return False
+
+        def produce() -> None:
+            pages = self.get_pages()
+            try:
+                for page in pages:
+                    if not put((page, None)):
+                        return
+            except BaseException as e:
+                put((_END_OF_PAGES, e))
+            else:
+                put((_END_OF_PAGES, None))
+            finally:
+                close = getattr(pages, "close", None)
+                if close is not None:
+                    close()
+
+        producer = threading.Thread(
+            target=produce, name=f"{self.LISTER_NAME}-prefetch", daemon=True
+        )
+        producer.start()
+        try:
+            while True:
+                page, exc = queue.get()
+                if page is _END_OF_PAGES:
+                    if exc is not None:
+                        raise exc
+                    return
+                yield page
+        finally:
+            stop.set()
+            producer.join()
+
     def get_origins_from_page(self, page: PageType) -> Iterator[model.ListedOrigin]:
         """Extract a list of :class:`model.ListedOrigin` from a raw page of results.
 
@@ -355,10 +576,33 @@ class Lister(Generic[StateType, PageType]):
         """
         pass
 
+    def record_origins(self, origins: List[model.ListedOrigin]) -> None:
+        """Record a batch of origins in the scheduler, either directly with
+        :meth:`send_origins`, or in the background when :attr:`max_inflight_batches`
+        is set."""
+        if self.origins_writer is not None:
+            self.origins_writer.submit(origins)
+        else:
+            self.send_origins(origins)
+
+    def wait_for_recorded_origins(self) -> None:
+        """Block until all the batches of origins passed to :meth:`record_origins`
+        have been recorded in the scheduler, raising any error that occurred while
+        recording them.
+
+        This is a noop when origins are recorded synchronously, and can be used in
+        :meth:`commit_page` when the state update must not get ahead of the recorded
+        origins.
+        """
+        if self.origins_writer is not None:
+            self.origins_writer.wait()
+
     def send_origins(self, origins: Iterable[model.ListedOrigin]) -> List[str]:
         """Record the stream of valid :class:`model.ListedOrigin` in the scheduler.
 
-        This will filter out invalid urls prior to record origins to the scheduler.
+        This will filter out invalid urls prior to record origins to the scheduler, and
+        merge the origins listed several times in the batch (see
+        :func:`coalesce_origins`).
 
         Returns:
           the list of origin URLs recorded in scheduler database
@@ -370,6 +614,9 @@ class Lister(Generic[StateType, PageType]):
                 valid_origins.append(origin)
             else:
                 logger.warning("Skipping invalid origin: %s", origin.url)
+        coalesced_origins = coalesce_origins(valid_origins)
+        self.origins_coalesced += len(valid_origins) - len(coalesced_origins)
+        valid_origins = coalesced_origins
         if not self.enable_origins:
             logger.info("Disabling origins before sending them to the scheduler")
             valid_origins = [
@@ -33,6 +33,19 @@ Before sending a listed pubdev origin to the scheduler, we query the
 for a package (date of its latest release). It enables Software Heritage to create
 new loading task for a package only if it has new releases since last visit.
 
+Those queries can be made concurrently by setting the ``fetch_workers`` parameter
+of the lister.
+
+Incremental listing
+-------------------
+
+When the ``incremental`` parameter of the lister is set, the ETag of the package
+metadata and the date of its latest release are recorded in the lister state.
+The next listings send them in the ``If-None-Match`` and ``If-Modified-Since``
+headers of the package metadata queries, packages whose metadata did not change are
+not downloaded again, and only the packages with new releases are sent to the
+scheduler.
+
 Running tests
 -------------
 
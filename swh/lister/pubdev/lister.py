@@ -3,16 +3,21 @@
 # License: GNU General Public License version 3, or any later version
 # See top-level LICENSE file for more information
 
+from dataclasses import dataclass, field
+from email.utils import format_datetime
 import logging
-from typing import Iterator, List, Optional
+from typing import Any, Dict, Iterator, List, Optional
 
 import iso8601
+from requests import Response
+from requests.adapters import HTTPAdapter
 from requests.exceptions import HTTPError
 
 from swh.scheduler.interface import SchedulerInterface
 from swh.scheduler.model import ListedOrigin
 
-from ..pattern import CredentialsType, StatelessLister
+from ..pattern import CredentialsType, Lister
+from ..utils import ordered_concurrent_map
 
 logger = logging.getLogger(__name__)
 
@@ -20,8 +25,30 @@ logger = logging.getLogger(__name__)
 PubDevListerPage = List[str]
 
 
-class PubDevLister(StatelessLister[PubDevListerPage]):
-    """List pub.dev (Dart, Flutter) origins."""
+@dataclass
+class PubDevListerState:
+    """State of pub.dev lister"""
+
+    last_published: Dict[str, str] = field(default_factory=dict)
+    """Dictionary mapping a package name to the publication date of its latest
+    version found during last listing"""
+    etags: Dict[str, str] = field(default_factory=dict)
+    """Dictionary mapping a package name to the ETag of its metadata found during
+    last listing"""
+
+
+class PubDevLister(Lister[PubDevListerState, PubDevListerPage]):
+    """List pub.dev (Dart, Flutter) origins.
+
+    Args:
+        fetch_workers: defaults to 1. Number of threads fetching the metadata of
+            packages concurrently, origins are still listed in the order of the
+            package names.
+        incremental: defaults to :const:`False`. If :const:`True`, the metadata of
+            packages are fetched with conditional requests, based on the ETag and
+            latest publication date found during the previous listing, and only the
+            origins of packages with new versions are sent to the scheduler.
+    """
 
     LISTER_NAME = "pubdev"
     VISIT_TYPE = "pubdev"
@@ -41,6 +68,8 @@ class PubDevLister(StatelessLister[PubDevListerPage]):
         max_origins_per_page: Optional[int] = None,
         max_pages: Optional[int] = None,
         enable_origins: bool = True,
+        fetch_workers: int = 1,
+        incremental: bool = False,
     ):
         super().__init__(
             scheduler=scheduler,
@@ -53,6 +82,22 @@ class PubDevLister(StatelessLister[PubDevListerPage]):
         )
 
         self.session.headers.update({"Accept": "application/json"})
+        self.fetch_workers = fetch_workers
+        self.incremental = incremental
+        self.last_published: Dict[str, str] = {}
+        self.etags: Dict[str, str] = {}
+
+        if self.fetch_workers > 1:
+            # keep a pooled connection per worker
+            adapter = HTTPAdapter(pool_maxsize=self.fetch_workers)
+            self.session.mount("http://", adapter)
+            self.session.mount("https://", adapter)
+
+    def state_from_dict(self, d: Dict[str, Any]) -> PubDevListerState:
+        return PubDevListerState(**d)
+
+    def state_to_dict(self, state: PubDevListerState) -> Dict[str, Any]:
+        return {"last_published": state.last_published, "etags": state.etags}
 
     def get_pages(self) -> Iterator[PubDevListerPage]:
         """Yield an iterator which returns 'page'
@@ -70,27 +115,73 @@ class PubDevLister(StatelessLister[PubDevListerPage]):
         )
         yield response.json()["packages"]
 
+    def get_package_info(self, pkgname: str) -> Optional[Response]:
+        """Fetch the metadata of a package, with a conditional request in incremental
+        mode, or return :const:`None` if they could not be fetched."""
+        headers = {}
+        if self.incremental:
+            if etag := self.state.etags.get(pkgname):
+                headers["If-None-Match"] = etag
+            if last_published := self.state.last_published.get(pkgname):
+                headers["If-Modified-Since"] = format_datetime(
+                    iso8601.parse_date(last_published), usegmt=True
+                )
+        try:
+            return self.http_request(
+                url=self.PACKAGE_INFO_URL_PATTERN.format(
+                    base_url=self.url, pkgname=pkgname
+                ),
+                headers=headers,
+            )
+        except HTTPError:
+            logger.warning(
+                "Failed to fetch metadata for package %s, skipping it from listing.",
+                pkgname,
+            )
+            return None
+
     def get_origins_from_page(self, page: PubDevListerPage) -> Iterator[ListedOrigin]:
-        """Iterate on all pages and yield ListedOrigin instances."""
+        """Iterate on all pages and yield ListedOrigin instances.
+
+        Package metadata are fetched concurrently by ``fetch_workers`` threads."""
         assert self.lister_obj.id is not None
 
-        for pkgname in page:
-            package_info_url = self.PACKAGE_INFO_URL_PATTERN.format(
-                base_url=self.url, pkgname=pkgname
-            )
-            try:
-                response = self.http_request(url=package_info_url)
-            except HTTPError:
-                logger.warning(
-                    "Failed to fetch metadata for package %s, skipping it from listing.",
-                    pkgname,
-                )
+        for pkgname, response in zip(
+            page,
+            ordered_concurrent_map(
+                self.get_package_info, page, workers=self.fetch_workers
+            ),
+        ):
+            if response is None:
+                continue
+
+            if response.status_code == 304:
+                # package metadata did not change since last listing
+                self.fetches_avoided += 1
+                for known, current in (
+                    (self.state.last_published, self.last_published),
+                    (self.state.etags, self.etags),
+                ):
+                    if pkgname in known:
+                        current[pkgname] = known[pkgname]
                 continue
+
             package_metadata = response.json()
             package_versions = package_metadata["versions"]
             last_published = max(
                 package_version["published"] for package_version in package_versions
             )
+            self.last_published[pkgname] = last_published
+            if etag := response.headers.get("ETag"):
+                self.etags[pkgname] = etag
+
+            if (
+                self.incremental
+                and self.state.last_published.get(pkgname) == last_published
+            ):
+                # no new version published since last listing
+                continue
+
             origin_url = self.ORIGIN_URL_PATTERN.format(
                 base_url=self.url, pkgname=pkgname
             )
@@ -100,3 +191,9 @@ class PubDevLister(StatelessLister[PubDevListerPage]):
                 url=origin_url,
                 last_update=iso8601.parse_date(last_published),
             )
+
+    def finalize(self) -> None:
+        if self.incremental:
+            self.state.last_published = self.last_published
+            self.state.etags = self.etags
+            self.updated = True
@@ -3,6 +3,11 @@
 # License: GNU General Public License version 3, or any later version
 # See top-level LICENSE file for more information
 
+import json
+from pathlib import Path
+
+import pytest
+
 from swh.lister import USER_AGENT_TEMPLATE
 from swh.lister.pubdev.lister import PubDevLister
 
@@ -12,8 +17,9 @@ expected_origins = {
 }
 
 
-def test_pubdev_lister(datadir, requests_mock_datadir, swh_scheduler):
-    lister = PubDevLister(scheduler=swh_scheduler)
+@pytest.mark.parametrize("fetch_workers", [1, 4])
+def test_pubdev_lister(datadir, requests_mock_datadir, swh_scheduler, fetch_workers):
+    lister = PubDevLister(scheduler=swh_scheduler, fetch_workers=fetch_workers)
     res = lister.run()
 
     assert res.pages == 1
@@ -50,3 +56,58 @@ def test_pubdev_lister_skip_package(
 
     assert res.pages == 1
     assert res.origins == 1
+
+
+def test_pubdev_lister_incremental(datadir, requests_mock, swh_scheduler):
+    api_url = "https://pub.dev/api/"
+
+    def api_data(name):
+        return Path(datadir, "https_pub.dev", f"api_{name}").read_bytes()
+
+    babylon = json.loads(api_data("packages_Babylon"))
+    new_babylon = json.loads(api_data("packages_Babylon"))
+    new_babylon["versions"].append(
+        dict(new_babylon["versions"][-1], published="2023-01-01T00:00:00.000Z")
+    )
+
+    requests_mock.get(f"{api_url}package-names", content=api_data("package-names"))
+    requests_mock.get(
+        f"{api_url}packages/Autolinker",
+        [
+            {"content": api_data("packages_Autolinker"), "headers": {"ETag": '"a1"'}},
+            {"status_code": 304},
+        ],
+    )
+    requests_mock.get(
+        f"{api_url}packages/Babylon",
+        [{"json": babylon}, {"json": babylon}, {"json": new_babylon}],
+    )
+
+    lister = PubDevLister(scheduler=swh_scheduler, incremental=True)
+    res = lister.run()
+    assert res.origins == 2
+    assert set(lister.state.last_published) == {"Autolinker", "Babylon"}
+    assert lister.state.etags == {"Autolinker": '"a1"'}
+
+    # Autolinker metadata did not change and no new version of Babylon
+    lister = PubDevLister(scheduler=swh_scheduler, incremental=True, fetch_workers=2)
+    res = lister.run()
+    assert res.origins == 0
+    assert res.fetches_avoided == 1
+
+    autolinker_request, babylon_request = [
+        request
+        for request in requests_mock.request_history[-2:]
+        if "/packages/" in request.url
+    ]
+    assert autolinker_request.headers["If-None-Match"] == '"a1"'
+    assert "If-Modified-Since" in autolinker_request.headers
+    assert "If-None-Match" not in babylon_request.headers
+    assert "If-Modified-Since" in babylon_request.headers
+
+    # new version of Babylon published
+    lister = PubDevLister(scheduler=swh_scheduler, incremental=True)
+    res = lister.run()
+    assert res.origins == 1
+    assert lister.state.last_published["Babylon"] == "2023-01-01T00:00:00.000Z"
+    assert lister.state.etags == {"Autolinker": '"a1"'}
@@ -5,19 +5,23 @@
 
 from dataclasses import dataclass, field
 from datetime import datetime, timezone
+import gzip
 from itertools import product
 import logging
 from string import Template
 from typing import Any, Dict, Iterator, List, Optional, Set, Tuple, TypedDict
 from urllib.parse import urljoin
 
+from lxml import etree
 import repomd
+from requests.exceptions import HTTPError
 
 from swh.lister.pattern import CredentialsType
 from swh.scheduler.interface import SchedulerInterface
 from swh.scheduler.model import ListedOrigin
 
 from ..pattern import Lister
+from ..utils import versions_digest
 
 logger = logging.getLogger(__name__)
 
@@ -61,6 +65,23 @@ def _get_last_modified(pkg: repomd.Package) -> datetime:
     return datetime.utcfromtimestamp(int(ts)).replace(tzinfo=timezone.utc)
 
 
+_XML_PARSER = etree.XMLParser(resolve_entities=False, huge_tree=True)
+
+
+def _get_repomd_checksums(repomd_xml: bytes) -> str:
+    """Get a digest of the revision and of the metadata files checksums found in
+    a ``repomd.xml`` file."""
+    root = etree.fromstring(repomd_xml, _XML_PARSER)
+    revision = root.findtext("repo:revision", namespaces=repomd._ns)
+    return versions_digest(
+        [f"revision {revision}"]
+        + [
+            f"{data.get('type')} {data.findtext('repo:checksum', namespaces=repomd._ns)}"
+            for data in root.findall("repo:data", namespaces=repomd._ns)
+        ]
+    )
+
+
 def _get_checksums(pkg: repomd.Package) -> Dict[str, str]:
     """Get checksums associated to rpm archive."""
     cs = pkg._element.find("common:checksum", namespaces=repomd._ns)
@@ -74,9 +95,12 @@ def _get_checksums(pkg: repomd.Package) -> Dict[str, str]:
 class RPMListerState:
     """State of RPM lister"""
 
-    package_versions: Dict[PkgName, Set[PkgVersion]] = field(default_factory=dict)
-    """Dictionary mapping a package name to all the versions found during
-    last listing"""
+    package_versions_digests: Dict[PkgName, str] = field(default_factory=dict)
+    """Dictionary mapping a package name to a digest of all the versions found during
+    last listing, computed with :func:`swh.lister.utils.versions_digest`"""
+    repomd_checksums: Dict[str, str] = field(default_factory=dict)
+    """Dictionary mapping the URL of a ``repomd.xml`` file to a digest of its
+    revision and metadata files checksums found during last listing"""
 
 
 class RPMLister(Lister[RPMListerState, RPMPageType]):
@@ -96,7 +120,8 @@ class RPMLister(Lister[RPMListerState, RPMPageType]):
         rpm_src_data: list of dictionaries holding data required to list RPM source packages,
             see examples in the config directory.
         incremental: if :const:`True`, only packages with new versions are sent to the
-            scheduler when relisting
+            scheduler when relisting, and no package metadata are downloaded if
+            none of the ``repomd.xml`` files changed since the last listing
     """
 
     LISTER_NAME = "rpm"
@@ -129,62 +154,116 @@ class RPMLister(Lister[RPMListerState, RPMPageType]):
         self.listed_origins: Dict[RPMOrigin, ListedOrigin] = {}
         self.origins_to_send: Set[RPMOrigin] = set()
         self.package_versions: Dict[PkgName, Set[PkgVersion]] = {}
+        # whether the previously listed packages whose versions changed were sent
+        self.changed_packages_sent = False
 
     def state_from_dict(self, d: Dict[str, Any]) -> RPMListerState:
-        return RPMListerState(package_versions={k: set(v) for k, v in d.items()})
-
-    def state_to_dict(self, state: RPMListerState) -> Dict[str, Any]:
-        return {k: list(v) for k, v in state.package_versions.items()}
-
-    def repo_request(
-        self,
-        index_url_template: Template,
-        base_url: str,
-        release: Release,
-        component: Component,
-    ) -> Optional[RPMPageType]:
-        """Return parsed packages for a given distribution release and component."""
-
-        index_url = index_url_template.substitute(
-            base_url=base_url.rstrip("/"), release=release, component=component
+        if not isinstance(d.get("package_versions_digests"), dict):
+            # states recorded by previous versions of the lister only map package
+            # names to digests or lists of versions
+            d = {"package_versions_digests": d}
+        return RPMListerState(
+            package_versions_digests={
+                k: v if isinstance(v, str) else versions_digest(v)
+                for k, v in d["package_versions_digests"].items()
+            },
+            repomd_checksums=d.get("repomd_checksums", {}),
         )
 
-        try:
-            repo = repomd.load(index_url)  # throws error if no repomd.xml is not found
-        except Exception:
-            logger.debug("Repository metadata not found at URL %s", index_url)
-            return None
-        else:
-            logger.debug(
-                "Fetched metadata from url: %s, found %d packages", index_url, len(repo)
-            )
-            return repo
-
-    def get_pages(self) -> Iterator[RPMPageType]:
-        """Return an iterator on parsed rpm packages, one page per (release, component) pair."""
+    def state_to_dict(self, state: RPMListerState) -> Dict[str, Any]:
+        return {
+            "package_versions_digests": state.package_versions_digests,
+            "repomd_checksums": state.repomd_checksums,
+        }
+
+    def index_urls(self) -> Iterator[Tuple[Release, Component, str]]:
+        """Return an iterator on all possible package repository URLs for each
+        (release, component) pair."""
         for rpm_src_data in self.rpm_src_data:
             index_url_templates = [
                 Template(index_url_template)
                 for index_url_template in rpm_src_data["index_url_templates"]
             ]
-            # try all possible package repository URLs for each (release, component) pair
             for release, component, index_url_template in product(
                 rpm_src_data["releases"],
                 rpm_src_data["components"],
                 index_url_templates,
             ):
-                repo = self.repo_request(
-                    index_url_template,
-                    rpm_src_data["base_url"],
-                    release,
-                    component,
+                yield release, component, index_url_template.substitute(
+                    base_url=rpm_src_data["base_url"].rstrip("/"),
+                    release=release,
+                    component=component,
                 )
-                if repo is not None:
-                    # valid package repository found, yield page
-                    yield (release, component, repo)
+
+    def repo_request(self, index_url: str, repomd_xml: bytes) -> Optional[repomd.Repo]:
+        """Return parsed packages of the package repository located at a given URL,
+        whose ``repomd.xml`` file was already fetched."""
+        try:
+            root = etree.fromstring(repomd_xml, _XML_PARSER)
+            primary_href = root.xpath(
+                'repo:data[@type="primary"]/repo:location/@href', namespaces=repomd._ns
+            )[0]
+            primary_url = urljoin(index_url.rstrip("/") + "/", primary_href)
+            response = self.http_request(primary_url)
+            metadata = etree.fromstring(gzip.decompress(response.content), _XML_PARSER)
+        except Exception:
+            logger.debug("Repository metadata not found at URL %s", index_url)
+            return None
+        repo = repomd.Repo(index_url, metadata)
+        logger.debug(
+            "Fetched metadata from url: %s, found %d packages", index_url, len(repo)
+        )
+        return repo
+
+    def get_pages(self) -> Iterator[RPMPageType]:
+        """Return an iterator on parsed rpm packages, one page per (release, component) pair.
+
+        In incremental mode, no page is returned if none of the ``repomd.xml`` files
+        changed since the last listing."""
+        # whether all package repositories could be listed
+        complete = True
+        repomd_checksums = {}
+        repositories = []
+        # try all possible package repository URLs for each (release, component) pair
+        for release, component, index_url in self.index_urls():
+            repomd_url = urljoin(index_url.rstrip("/") + "/", "repodata/repomd.xml")
+            try:
+                response = self.http_request(repomd_url)
+            except HTTPError as e:
+                if e.response is None or e.response.status_code != 404:
+                    # the package repository may exist but could not be reached
+                    complete = False
+                logger.debug("Repository metadata not found at URL %s", index_url)
+                continue
+            repomd_checksums[repomd_url] = _get_repomd_checksums(response.content)
+            repositories.append((release, component, index_url, response.content))
+
+        if (
+            self.incremental
+            and repomd_checksums
+            and repomd_checksums == self.state.repomd_checksums
+        ):
+            logger.info(
+                "Repository metadata of %s did not change since last listing",
+                self.instance,
+            )
+            return
+
+        for release, component, index_url, repomd_xml in repositories:
+            repo = self.repo_request(index_url, repomd_xml)
+            if repo is None:
+                complete = False
+                continue
+            # valid package repository found, yield page
+            yield (release, component, repo)
 
         yield None
 
+        # all pages processed, the next listing can be skipped if none of the
+        # repository metadata changed and all package repositories were listed
+        if self.incremental and complete:
+            self.state.repomd_checksums = repomd_checksums
+
     def origin_url_for_package(self, package_name: PkgName) -> RPMOrigin:
         """Return the origin url for the given package."""
         # TODO: Use a better origin URL before deploying the lister to production
@@ -196,9 +275,15 @@ class RPMLister(Lister[RPMListerState, RPMPageType]):
         assert self.lister_obj.id is not None
 
         if page is None:
-            # all pages processed, yield listed origins
+            # all pages processed, add previously listed packages whose versions
+            # changed to the origins to send then yield them
+            for package_name, package_versions in self.package_versions.items():
+                digest = self.state.package_versions_digests.get(package_name)
+                if digest is not None and digest != versions_digest(package_versions):
+                    self.origins_to_send.add(self.origin_url_for_package(package_name))
             for origin_url in self.origins_to_send:
                 yield self.listed_origins[origin_url]
+            self.changed_packages_sent = True
             return
 
         release, component, repo = page
@@ -284,21 +369,15 @@ class RPMLister(Lister[RPMListerState, RPMPageType]):
             # add package version key to the set of found versions
             self.package_versions[package_name].add(package_version_key)
 
-            # package has already been listed during a previous listing process
-            if self.incremental and package_name in self.state.package_versions:
-                new_versions = (
-                    self.package_versions[package_name]
-                    - self.state.package_versions[package_name]
-                )
-                # no new versions so far, no need to send the origin to the scheduler
-                if not new_versions:
-                    origins_to_send.remove(origin_url)
+            # package has already been listed during a previous listing process,
+            # whether its versions changed is only known once all pages are processed
+            if self.incremental and package_name in self.state.package_versions_digests:
+                origins_to_send.discard(origin_url)
 
         logger.debug(
-            "Found %s packages to update (%s new ones and %s packages with new versions).",
+            "Found %s packages to update (%s new ones).",
             len(origins_to_send),
             new_origins_count,
-            len(origins_to_send) - new_origins_count,
         )
         logger.debug(
             "Current total number of listed source packages is equal to %s.",
@@ -308,7 +387,18 @@ class RPMLister(Lister[RPMListerState, RPMPageType]):
         self.origins_to_send.update(origins_to_send)
 
     def finalize(self):
-        if self.incremental:
-            # set mapping between listed package names and versions as lister state
-            self.state.package_versions = self.package_versions
+        if self.incremental and self.package_versions:
+            # set mapping between listed package names and digests of their versions
+            # as lister state
+            package_versions_digests = {
+                package_name: versions_digest(package_versions)
+                for package_name, package_versions in self.package_versions.items()
+            }
+            if not self.changed_packages_sent:
+                # the listing stopped before the last page, keep the previous digests
+                # so that the changed packages are sent by the next listing
+                for package_name, digest in self.state.package_versions_digests.items():
+                    if package_name in package_versions_digests:
+                        package_versions_digests[package_name] = digest
+            self.state.package_versions_digests = package_versions_digests
         self.updated = len(self.listed_origins) > 0
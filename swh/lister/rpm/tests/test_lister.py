@@ -4,13 +4,14 @@
 # See top-level LICENSE file for more information
 
 from pathlib import Path
+import re
 from string import Template
 from typing import List
 
 import pytest
-from urllib3.exceptions import HTTPError
 
 from swh.lister.rpm.lister import Component, Release, RPMLister
+from swh.lister.utils import versions_digest
 from swh.scheduler.interface import SchedulerInterface
 
 FEDORA_URL = "https://fedoraproject.org/"
@@ -24,32 +25,34 @@ FEDORA_INDEX_URL_TEMPLATES = [
 ]
 
 
-def mock_repomd(mocker, side_effect):
-    """Mocks the .xml files fetched by repomd for the next lister run"""
-    cm = mocker.MagicMock()
-    cm.read.side_effect = side_effect
-    cm.__enter__.return_value = cm
-    mocker.patch("repomd.urllib.request.urlopen").return_value = cm
-
-
-def mock_fedora_repomd(datadir, mocker, use_altered_fedora36=False):
+def mock_fedora_repomd(datadir, requests_mock, use_altered_fedora36=False):
+    """Mocks the repomd.xml and primary.xml.gz files fetched by the next lister run"""
     repodata = [
         ["repomd26.xml", "primary26.xml.gz"],
         ["repomd36.xml", "primary36.xml.gz"],
     ]
     if use_altered_fedora36:
-        repodata[1][1] = "primary36-altered.xml.gz"
-
-    side_effect = []
+        repodata[1] = ["repomd36-altered.xml", "primary36-altered.xml.gz"]
 
-    for paths in repodata:
-        side_effect += [
-            Path(datadir, "archives.fedoraproject.org", path).read_bytes()
-            for path in paths
-        ]
-        side_effect += [HTTPError() for _ in range(len(FEDORA_INDEX_URL_TEMPLATES) - 1)]
-
-    mock_repomd(mocker, side_effect)
+    requests_mock.get(
+        re.compile(f"{FEDORA_ARCHIVE_URL}/.*/repomd.xml"), status_code=404
+    )
+    for release, (repomd_path, primary_path) in zip(["26", "36"], repodata):
+        repomd_xml = Path(datadir, "archives.fedoraproject.org", repomd_path)
+        requests_mock.get(
+            f"{rpm_repodata_url(release, 'Everything')}repodata/repomd.xml",
+            content=repomd_xml.read_bytes(),
+        )
+        primary_href = re.search(
+            r'<location href="([^"]*-primary\.xml\.gz)"', repomd_xml.read_text()
+        )
+        assert primary_href is not None
+        requests_mock.get(
+            rpm_repodata_url(release, "Everything") + primary_href.group(1),
+            content=Path(
+                datadir, "archives.fedoraproject.org", primary_path
+            ).read_bytes(),
+        )
 
 
 def rpm_repodata_url(release, component):
@@ -140,6 +143,7 @@ def run_lister(
     origin_count: int,
     incremental: bool = False,
     updated: bool = True,
+    skipped: bool = False,
 ):
     """Runs the lister and tests that the listed origins are correct."""
     lister = RPMLister(
@@ -160,10 +164,16 @@ def run_lister(
     stats = lister.run()
     scheduler_origins = swh_scheduler.get_listed_origins(lister.lister_obj.id).results
     lister_state = lister.get_state_from_scheduler()
-    state_pkg_versions = {k.split("/")[-1]: set(v) for k, v in pkg_versions.items()}
+    state_pkg_versions_digests = {
+        k.split("/")[-1]: versions_digest(v) for k, v in pkg_versions.items()
+    }
 
-    # One component from each release plus extra null page to flush origins
-    assert stats.pages == (len(releases) + 1 if updated else 1)
+    if skipped:
+        # repository metadata did not change since the previous listing
+        assert stats.pages == 0
+    else:
+        # One component from each release plus extra null page to flush origins
+        assert stats.pages == (len(releases) + 1 if updated else 1)
     assert stats.origins == origin_count
 
     assert {
@@ -171,12 +181,12 @@ def run_lister(
     } == pkg_versions
 
     if incremental:
-        assert lister_state.package_versions == state_pkg_versions
+        assert lister_state.package_versions_digests == state_pkg_versions_digests
         assert lister.updated == updated
 
 
 @pytest.mark.parametrize("status_code", [400, 404, 500])
-def test_fedora_lister_http_error(swh_scheduler, mocker, status_code):
+def test_fedora_lister_http_error(swh_scheduler, requests_mock, status_code):
     """
     Simulates handling of HTTP Errors while fetching packages for fedora releases.
     """
@@ -184,9 +194,8 @@ def test_fedora_lister_http_error(swh_scheduler, mocker, status_code):
     release = "18"
     component = "Everything"
 
-    mock_repomd(
-        mocker,
-        side_effect=[HTTPError() for _ in range(len(FEDORA_INDEX_URL_TEMPLATES))],
+    requests_mock.get(
+        re.compile(f"{FEDORA_ARCHIVE_URL}/.*/repomd.xml"), status_code=status_code
     )
 
     run_lister(
@@ -201,7 +210,7 @@ def test_fedora_lister_http_error(swh_scheduler, mocker, status_code):
 
 def test_full_rpm_lister(
     swh_scheduler,
-    mocker,
+    requests_mock,
     datadir,
     pkg_versions,
 ):
@@ -209,7 +218,7 @@ def test_full_rpm_lister(
     Simulates a full listing of packages for fedora releases.
     """
 
-    mock_fedora_repomd(datadir, mocker)
+    mock_fedora_repomd(datadir, requests_mock)
     run_lister(
         swh_scheduler,
         releases=["26", "36"],
@@ -221,7 +230,7 @@ def test_full_rpm_lister(
 
 def test_incremental_rpm_lister(
     swh_scheduler,
-    mocker,
+    requests_mock,
     datadir,
     pkg_versions,
 ):
@@ -230,7 +239,7 @@ def test_incremental_rpm_lister(
     """
 
     # First run
-    mock_fedora_repomd(datadir, mocker)
+    mock_fedora_repomd(datadir, requests_mock)
     run_lister(
         swh_scheduler,
         releases=["26", "36"],
@@ -240,7 +249,7 @@ def test_incremental_rpm_lister(
         incremental=True,
     )
     # Second run (no updates)
-    mock_fedora_repomd(datadir, mocker)
+    mock_fedora_repomd(datadir, requests_mock)
     run_lister(
         swh_scheduler,
         releases=["26", "36"],
@@ -248,11 +257,13 @@ def test_incremental_rpm_lister(
         pkg_versions=pkg_versions,
         origin_count=0,
         incremental=True,
+        updated=False,
+        skipped=True,
     )
 
     # Use an altered version of primary36.xml in which we updated the version
     # of package 0xFFFF to 0.10:
-    mock_fedora_repomd(datadir, mocker, use_altered_fedora36=True)
+    mock_fedora_repomd(datadir, requests_mock, use_altered_fedora36=True)
     # Add new version to the set of expected pkg versions:
     pkg_versions[rpm_package_origin_url("0xFFFF")].update(
         {
@@ -281,3 +292,178 @@ def test_incremental_rpm_lister(
         origin_count=1,
         incremental=True,
     )
+
+
+def test_incremental_rpm_lister_interrupted_listing(
+    swh_scheduler,
+    requests_mock,
+    datadir,
+    pkg_versions,
+):
+    """
+    Simulates an incremental listing stopping before the last page, the updated
+    packages must then be sent by the next listing.
+    """
+    mock_fedora_repomd(datadir, requests_mock)
+    run_lister(
+        swh_scheduler,
+        releases=["26", "36"],
+        components=["Everything"],
+        pkg_versions=pkg_versions,
+        origin_count=3,
+        incremental=True,
+    )
+    digests = RPMLister(
+        scheduler=swh_scheduler, url=FEDORA_URL, instance="Fedora", rpm_src_data=[]
+    ).state.package_versions_digests
+
+    # 0xFFFF gets updated in fedora36 but the listing stops after that page
+    mock_fedora_repomd(datadir, requests_mock, use_altered_fedora36=True)
+    lister = RPMLister(
+        scheduler=swh_scheduler,
+        url=FEDORA_URL,
+        instance="Fedora",
+        rpm_src_data=[
+            {
+                "base_url": FEDORA_ARCHIVE_URL,
+                "releases": ["26", "36"],
+                "components": ["Everything"],
+                "index_url_templates": FEDORA_INDEX_URL_TEMPLATES,
+            }
+        ],
+        incremental=True,
+        max_pages=2,
+    )
+    stats = lister.run()
+    assert stats.pages == 2
+    assert stats.origins == 0
+    assert lister.state.package_versions_digests == digests
+
+    # Next run sends the updated package
+    mock_fedora_repomd(datadir, requests_mock, use_altered_fedora36=True)
+    pkg_versions[rpm_package_origin_url("0xFFFF")]["36/Everything/0.10-4"] = {
+        "name": "0xFFFF",
+        "version": "0.10-4",
+        "build_time": "2022-01-19T19:13:53+00:00",
+        "url": rpm_src_package_url(
+            release="36",
+            component="Everything",
+            path="0/0xFFFF-0.10-4.fc36.src.rpm",
+        ),
+        "checksums": {
+            "sha256": "45eee8d990d502324ae665233c320b8a5469c25d735f1862e094c1878d6ff2cd"
+        },
+    }
+    run_lister(
+        swh_scheduler,
+        releases=["26", "36"],
+        components=["Everything"],
+        pkg_versions=pkg_versions,
+        origin_count=1,
+        incremental=True,
+    )
+
+
+def test_incremental_rpm_lister_repository_failure(
+    swh_scheduler,
+    requests_mock,
+    datadir,
+):
+    """
+    Simulates an incremental listing where the packages of a repository could not
+    be fetched, the next listing must not be skipped.
+    """
+
+    def lister():
+        return RPMLister(
+            scheduler=swh_scheduler,
+            url=FEDORA_URL,
+            instance="Fedora",
+            rpm_src_data=[
+                {
+                    "base_url": FEDORA_ARCHIVE_URL,
+                    "releases": ["26", "36"],
+                    "components": ["Everything"],
+                    "index_url_templates": FEDORA_INDEX_URL_TEMPLATES,
+                }
+            ],
+            incremental=True,
+        )
+
+    mock_fedora_repomd(datadir, requests_mock)
+    requests_mock.get(
+        re.compile(f"{rpm_repodata_url('36', 'Everything')}.*primary.xml.gz"),
+        status_code=404,
+    )
+    first_lister = lister()
+    stats = first_lister.run()
+    assert (stats.pages, stats.origins) == (2, 2)
+    assert first_lister.state.repomd_checksums == {}
+
+    # repository metadata did not change but all packages can now be fetched
+    mock_fedora_repomd(datadir, requests_mock)
+    second_lister = lister()
+    stats = second_lister.run()
+    assert (stats.pages, stats.origins) == (3, 2)
+    assert rpm_package_origin_url("2ping") in second_lister.recorded_origins
+    assert second_lister.state.repomd_checksums
+
+    stats = lister().run()
+    assert stats.pages == 0
+
+
+@pytest.mark.parametrize("status_code", [403, 500])
+def test_incremental_rpm_lister_unreachable_repository(
+    swh_scheduler, requests_mock, datadir, status_code
+):
+    """
+    Repository metadata checksums are not recorded when a package repository could
+    not be reached.
+    """
+    mock_fedora_repomd(datadir, requests_mock)
+    requests_mock.get(
+        f"{rpm_repodata_url('36', 'Everything')}repodata/repomd.xml",
+        status_code=status_code,
+    )
+    lister = RPMLister(
+        scheduler=swh_scheduler,
+        url=FEDORA_URL,
+        instance="Fedora",
+        rpm_src_data=[
+            {
+                "base_url": FEDORA_ARCHIVE_URL,
+                "releases": ["26", "36"],
+                "components": ["Everything"],
+                "index_url_templates": FEDORA_INDEX_URL_TEMPLATES,
+            }
+        ],
+        incremental=True,
+    )
+    stats = lister.run()
+    assert stats.pages == 2
+    assert lister.state.repomd_checksums == {}
+
+
+def test_rpm_lister_state_from_previous_formats(swh_scheduler):
+    """
+    Check lister states recorded by previous versions of the lister can be loaded.
+    """
+    lister = RPMLister(
+        scheduler=swh_scheduler,
+        url=FEDORA_URL,
+        instance="Fedora",
+        rpm_src_data=[],
+        incremental=True,
+    )
+    package_versions = ["26/Everything/2.11-4", "36/Everything/2.11-4"]
+
+    state = lister.state_from_dict(
+        {"0install": package_versions, "0xFFFF": versions_digest(["26/Everything/0.3"])}
+    )
+
+    assert state.package_versions_digests == {
+        "0install": versions_digest(package_versions),
+        "0xFFFF": versions_digest(["26/Everything/0.3"]),
+    }
+    assert state.repomd_checksums == {}
+    assert lister.state_from_dict(lister.state_to_dict(state)) == state
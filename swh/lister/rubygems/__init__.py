@@ -32,6 +32,13 @@ Relevant listing data are then retrieved by executing that query for each gem:
    FROM versions
    WHERE rubygem_id = <gem_id> AND yanked_at IS NULL
 
+Those queries require to load the dump in a temporary PostgreSQL database, which needs
+a PostgreSQL installation and many GB of disk. Alternatively, the ``stream`` dump engine
+(``dump_engine="stream"``) parses the ``COPY ... FROM stdin`` sections of the
+``rubygems`` and ``versions`` tables while the dump archive is downloaded. Gem names are
+kept in memory while versions are sorted by gem in temporary files, holding at most
+``dump_sort_buffer_size`` of them in memory, before being joined with their gem.
+
 Page listing
 ------------
 
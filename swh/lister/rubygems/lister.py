@@ -4,15 +4,18 @@
 # See top-level LICENSE file for more information
 
 import base64
-from datetime import timezone
+from datetime import datetime, timezone
 import gzip
+from itertools import groupby
 import logging
+from operator import itemgetter
 import os
+import re
 import shutil
 import subprocess
 import tarfile
 import tempfile
-from typing import Any, Dict, Iterator, Optional, Tuple
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
 from bs4 import BeautifulSoup
 import psycopg
@@ -23,11 +26,75 @@ from swh.scheduler.interface import SchedulerInterface
 from swh.scheduler.model import ListedOrigin
 
 from ..pattern import CredentialsType, StatelessLister
+from ..utils import external_sorted
 
 logger = logging.getLogger(__name__)
 
 RubyGemsListerPage = Dict[str, Any]
 
+COPY_STATEMENT = re.compile(r"COPY (?P<table>\S+) \((?P<columns>[^)]*)\) FROM stdin;")
+COPY_ESCAPE = re.compile(r"\\(?:([0-7]{1,3})|x([0-9a-fA-F]{1,2})|(.))")
+COPY_ESCAPED_CHARS = {"b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t", "v": "\v"}
+
+
+def _unescape_copy_value(match: re.Match) -> str:
+    octal, hexadecimal, char = match.groups()
+    if octal:
+        return chr(int(octal, 8))
+    if hexadecimal:
+        return chr(int(hexadecimal, 16))
+    return COPY_ESCAPED_CHARS.get(char, char)
+
+
+def copy_value(value: str) -> Optional[str]:
+    r"""Decode a value of a row of a ``COPY ... FROM stdin`` section, in the text
+    format of PostgreSQL.
+
+    >>> copy_value(r"a\tb\\c")
+    'a\tb\\c'
+    >>> copy_value(r"\N") is None
+    True
+    """
+    if value == "\\N":
+        return None
+    if "\\" not in value:
+        return value
+    return COPY_ESCAPE.sub(_unescape_copy_value, value)
+
+
+def iter_copy_rows(
+    lines: Iterable[bytes], columns: Dict[str, Tuple[str, ...]]
+) -> Iterator[Tuple[str, Tuple[Optional[str], ...]]]:
+    """Iterate over the rows of the ``COPY ... FROM stdin`` sections of a SQL dump
+    generated by ``pg_dump``, for the tables in ``columns``.
+
+    Args:
+        lines: lines of the SQL dump
+        columns: mapping of table names, as in the dump, to the columns of their
+            rows to yield
+
+    Returns:
+        an iterator of (table name, values of the columns) tuples
+    """
+    table: Optional[str] = None
+    indices: List[int] = []
+    for line in lines:
+        if table is None:
+            if not line.startswith(b"COPY "):
+                continue
+            match = COPY_STATEMENT.match(line.decode())
+            if match and match["table"] in columns:
+                table = match["table"]
+                header = [
+                    column.strip().strip('"') for column in match["columns"].split(",")
+                ]
+                indices = [header.index(column) for column in columns[table]]
+        elif line.startswith(b"\\."):
+            table = None
+        else:
+            values = line.decode().rstrip("\n").split("\t")
+            yield table, tuple(copy_value(values[index]) for index in indices)
+
 
 class RubyGemsLister(StatelessLister[RubyGemsListerPage]):
     """Lister for RubyGems.org, the Ruby community's gem hosting service.
@@ -57,6 +124,8 @@ class RubyGemsLister(StatelessLister[RubyGemsListerPage]):
         "https://rubygems.org/api/v2/rubygems/{gem}/versions/{version}.json"
     )
 
+    DUMP_ENGINES = ("postgresql", "stream")
+
     DB_NAME = "rubygems"
     DUMP_SQL_PATH = "public_postgresql/databases/PostgreSQL.sql.gz"
 
@@ -69,7 +138,29 @@ class RubyGemsLister(StatelessLister[RubyGemsListerPage]):
         max_origins_per_page: Optional[int] = None,
         max_pages: Optional[int] = None,
         enable_origins: bool = True,
+        download_cache_dir: Optional[str] = None,
+        download_cache_max_size: int = 16 * 1024 * 1024 * 1024,
+        dump_engine: str = "postgresql",
+        dump_sort_buffer_size: int = 200_000,
     ):
+        """Lister for RubyGems.org.
+
+        Args:
+            download_cache_dir: directory where the database dumps are kept between
+                runs. Nothing is listed if the latest dump did not change since it
+                was last listed.
+            download_cache_max_size: defaults to 16GiB. Maximum size in bytes of the
+                files kept in ``download_cache_dir``.
+            dump_engine: how gems are read from the database dump. ``postgresql``
+                loads it in a temporary PostgreSQL database, ``stream`` parses the
+                rows of the ``rubygems`` and ``versions`` tables while the dump is
+                read.
+            dump_sort_buffer_size: maximum number of versions held in memory by the
+                ``stream`` engine, which sorts them by gem on disk.
+        """
+        if dump_engine not in self.DUMP_ENGINES:
+            raise ValueError(f"Unknown dump engine {dump_engine!r}")
+
         super().__init__(
             scheduler=scheduler,
             credentials=credentials,
@@ -78,7 +169,11 @@ class RubyGemsLister(StatelessLister[RubyGemsListerPage]):
             max_origins_per_page=max_origins_per_page,
             max_pages=max_pages,
             enable_origins=enable_origins,
+            download_cache_dir=download_cache_dir,
+            download_cache_max_size=download_cache_max_size,
         )
+        self.dump_engine = dump_engine
+        self.dump_sort_buffer_size = dump_sort_buffer_size
 
     def get_latest_dump_file(self) -> str:
         response = self.http_request(self.RUBY_GEMS_POSTGRES_DUMP_LIST_URL)
@@ -105,24 +200,20 @@ class RubyGemsLister(StatelessLister[RubyGemsListerPage]):
 
         return db_url, db
 
-    def populate_rubygems_db(self, db_url: str):
-        dump_file = self.get_latest_dump_file()
-        dump_id = dump_file.split("/")[2]
-
-        response = self.http_request(f"{self.url}/{dump_file}", stream=True)
+    def download_dump(self, dump_url: str, dump_path: str) -> None:
+        response = self.http_request(dump_url, stream=True)
+        logger.debug(
+            "Downloading latest rubygems database dump: %s (%s bytes)",
+            dump_url,
+            response.headers["content-length"],
+        )
+        with open(dump_path, "wb") as dump:
+            for chunk in response.iter_content(chunk_size=HASH_BLOCK_SIZE):
+                dump.write(chunk)
 
+    def populate_rubygems_db(self, db_url: str, dump_path: str, dump_id: str):
         with tempfile.TemporaryDirectory() as temp_dir:
-            logger.debug(
-                "Downloading latest rubygems database dump: %s (%s bytes)",
-                dump_id,
-                response.headers["content-length"],
-            )
-            dump_file = os.path.join(temp_dir, "rubygems_dump.tar")
-            with open(dump_file, "wb") as dump:
-                for chunk in response.iter_content(chunk_size=HASH_BLOCK_SIZE):
-                    dump.write(chunk)
-
-            with tarfile.open(dump_file) as dump_tar:
+            with tarfile.open(dump_path) as dump_tar:
                 dump_tar.extractall(temp_dir)
 
                 logger.debug("Populating rubygems database with dump %s", dump_id)
@@ -157,10 +248,45 @@ class RubyGemsLister(StatelessLister[RubyGemsListerPage]):
                     )
 
     def get_pages(self) -> Iterator[RubyGemsListerPage]:
+        dump_file = self.get_latest_dump_file()
+        dump_id = dump_file.split("/")[2]
+        dump_url = f"{self.url}/{dump_file}"
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            dump_path: Optional[str] = None
+            if self.download_cache is not None:
+                download = self.download_cache.fetch(self.http_request, dump_url)
+                if not download.downloaded:
+                    self.fetches_avoided += 1
+                if not download.modified:
+                    logger.info("Database dump %s was already listed", dump_id)
+                    return
+                dump_path = download.path
+            elif self.dump_engine == "postgresql":
+                dump_path = os.path.join(temp_dir, "rubygems_dump.tar")
+                self.download_dump(dump_url, dump_path)
+
+            if self.dump_engine == "postgresql":
+                assert dump_path is not None
+                yield from self.get_dump_pages(dump_path, dump_id)
+            elif dump_path is not None:
+                with open(dump_path, "rb") as dump:
+                    yield from self.get_streamed_dump_pages(dump, dump_id)
+            else:
+                # the dump is read while it is downloaded
+                with self.http_request(dump_url, stream=True) as response:
+                    response.raw.decode_content = True
+                    yield from self.get_streamed_dump_pages(response.raw, dump_id)
+
+        self.mark_download_listed(dump_url)
+
+    def get_dump_pages(
+        self, dump_path: str, dump_id: str
+    ) -> Iterator[RubyGemsListerPage]:
         # spawn a temporary postgres instance (require initdb executable in environment)
         with Postgresql() as postgresql:
             db_url, db = self.create_rubygems_db(postgresql)
-            self.populate_rubygems_db(db_url)
+            self.populate_rubygems_db(db_url, dump_path, dump_id)
 
             with db.cursor() as cursor:
                 cursor.execute("SELECT id, name FROM rubygems")
@@ -174,19 +300,9 @@ class RubyGemsLister(StatelessLister[RubyGemsListerPage]):
                             (gem_id,),
                         )
                         versions = [
-                            {
-                                "number": number,
-                                "url": self.RUBY_GEM_DOWNLOAD_URL_PATTERN.format(
-                                    gem_fullname=full_name
-                                ),
-                                "date": built_at.replace(tzinfo=timezone.utc),
-                                "sha256": (
-                                    base64.decodebytes(sha256.encode()).hex()
-                                    if sha256
-                                    else None
-                                ),
-                                "size": size,
-                            }
+                            self.version_entry(
+                                built_at, full_name, number, sha256, size
+                            )
                             for (
                                 built_at,
                                 full_name,
@@ -201,6 +317,91 @@ class RubyGemsLister(StatelessLister[RubyGemsListerPage]):
                                 "versions": versions,
                             }
 
+    def get_streamed_dump_pages(
+        self, dump: IO[bytes], dump_id: str
+    ) -> Iterator[RubyGemsListerPage]:
+        """Read the rows of the rubygems and versions tables from a database dump
+        archive read as a stream, and yield a page for each gem.
+
+        Gem names are kept in memory while versions are sorted by gem on disk, so
+        the memory used does not grow with the number of versions.
+        """
+        gem_names: Dict[int, str] = {}
+
+        def iter_versions(sql: Iterable[bytes]) -> Iterator[Tuple[Any, ...]]:
+            for table, row in iter_copy_rows(
+                sql,
+                {
+                    "public.rubygems": ("id", "name"),
+                    "public.versions": (
+                        "rubygem_id",
+                        "built_at",
+                        "full_name",
+                        "number",
+                        "sha256",
+                        "size",
+                        "yanked_at",
+                    ),
+                },
+            ):
+                if table == "public.rubygems":
+                    gem_id, gem_name = row
+                    assert gem_id is not None and gem_name is not None
+                    gem_names[int(gem_id)] = gem_name
+                    continue
+                gem_id, built_at, full_name, number, sha256, size, yanked_at = row
+                if yanked_at is None:
+                    assert gem_id is not None and built_at is not None
+                    yield (
+                        int(gem_id),
+                        datetime.fromisoformat(built_at),
+                        full_name,
+                        number,
+                        sha256,
+                        int(size) if size is not None else None,
+                    )
+
+        with tarfile.open(fileobj=dump, mode="r|*") as dump_tar:
+            for member in dump_tar:
+                if member.name != self.DUMP_SQL_PATH:
+                    continue
+                logger.debug("Reading rubygems database dump %s", dump_id)
+                sql_gz = dump_tar.extractfile(member)
+                assert sql_gz is not None
+                with gzip.open(sql_gz, "rb") as sql:
+                    versions = external_sorted(
+                        iter_versions(sql),
+                        key=itemgetter(0),
+                        buffer_size=self.dump_sort_buffer_size,
+                    )
+                    for gem_id, gem_versions in groupby(versions, key=itemgetter(0)):
+                        if gem_id not in gem_names:
+                            continue
+                        logger.debug("Processing gem named %s", gem_names[gem_id])
+                        yield {
+                            "name": gem_names[gem_id],
+                            "versions": [
+                                self.version_entry(*version[1:])
+                                for version in gem_versions
+                            ],
+                        }
+
+    def version_entry(
+        self,
+        built_at: datetime,
+        full_name: str,
+        number: str,
+        sha256: Optional[str],
+        size: Optional[int],
+    ) -> Dict[str, Any]:
+        return {
+            "number": number,
+            "url": self.RUBY_GEM_DOWNLOAD_URL_PATTERN.format(gem_fullname=full_name),
+            "date": built_at.replace(tzinfo=timezone.utc),
+            "sha256": (base64.decodebytes(sha256.encode()).hex() if sha256 else None),
+            "size": size,
+        }
+
     def get_origins_from_page(self, page: RubyGemsListerPage) -> Iterator[ListedOrigin]:
         assert self.lister_obj.id is not None
 
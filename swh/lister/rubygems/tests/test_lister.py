@@ -128,8 +128,11 @@ def network_requests_mock(datadir, requests_mock):
     )
 
 
-def test_rubygems_lister(swh_scheduler, expected_listed_origins):
-    lister = RubyGemsLister(scheduler=swh_scheduler)
+@pytest.mark.parametrize("dump_engine", ["postgresql", "stream"])
+def test_rubygems_lister(swh_scheduler, expected_listed_origins, dump_engine):
+    lister = RubyGemsLister(
+        scheduler=swh_scheduler, dump_engine=dump_engine, dump_sort_buffer_size=2
+    )
     res = lister.run()
 
     assert res.pages == 2
@@ -146,3 +149,35 @@ def test_rubygems_lister(swh_scheduler, expected_listed_origins):
         }
         for origin in scheduler_origins
     ] == expected_listed_origins
+
+
+@pytest.mark.parametrize("dump_engine", ["postgresql", "stream"])
+def test_rubygems_lister_download_cache(
+    datadir, tmp_path, swh_scheduler, requests_mock, dump_engine
+):
+    """The latest database dump is not listed again once it was listed."""
+    content = Path(datadir, "rubygems_pgsql_dump.tar").read_bytes()
+    requests_mock.get(
+        f"{RubyGemsLister.RUBY_GEMS_POSTGRES_DUMP_BASE_URL}/{DUMP_FILEPATH}",
+        [{"content": content, "headers": {"ETag": "dump"}}, {"status_code": 304}],
+    )
+
+    lister = RubyGemsLister(
+        scheduler=swh_scheduler,
+        download_cache_dir=str(tmp_path),
+        dump_engine=dump_engine,
+    )
+    assert lister.run().pages == 2
+
+    lister = RubyGemsLister(
+        scheduler=swh_scheduler,
+        download_cache_dir=str(tmp_path),
+        dump_engine=dump_engine,
+    )
+    stats = lister.run()
+    assert (stats.pages, stats.origins, stats.fetches_avoided) == (0, 0, 1)
+
+
+def test_rubygems_lister_unknown_dump_engine(swh_scheduler):
+    with pytest.raises(ValueError, match="Unknown dump engine"):
+        RubyGemsLister(scheduler=swh_scheduler, dump_engine="mysql")
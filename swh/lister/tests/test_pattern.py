@@ -1,10 +1,13 @@
-# Copyright (C) 2020-2025  The Software Heritage developers
+# Copyright (C) 2020-2026  The Software Heritage developers
 # See the AUTHORS file at the top-level directory of this distribution
 # License: GNU General Public License version 3, or any later version
 # See top-level LICENSE file for more information
 
 from typing import TYPE_CHECKING, Any, Dict, Iterator, List
+import uuid
 
+import attr
+import iso8601
 import pytest
 
 from swh.lister import pattern
@@ -250,6 +253,96 @@ def test_listed_origins_count(swh_scheduler):
     assert run_result.origins == 1
 
 
+class ListerWithDuplicateOriginsInPages(RunnableStatelessLister):
+    def get_pages(self) -> Iterator[PageType]:
+        for page in range(2):
+            yield [
+                {"url": "https://example.org/module", "day": day, "type": "golang"}
+                for day in ("03", "05", "04")
+            ] + [
+                {"url": "https://example.org/module", "type": "git"},
+                {"url": f"https://example.org/module{page}", "type": "golang"},
+            ]
+
+    def get_origins_from_page(self, page: PageType) -> Iterator[ListedOrigin]:
+        assert self.lister_obj.id is not None
+        for origin in page:
+            yield ListedOrigin(
+                lister_id=self.lister_obj.id,
+                url=origin["url"],
+                visit_type=origin["type"],
+                last_update=(
+                    iso8601.parse_date(f"2023-01-{origin['day']}")
+                    if "day" in origin
+                    else None
+                ),
+            )
+
+
+@pytest.mark.parametrize("max_inflight_batches", [0, 2])
+def test_lister_coalesce_origins(swh_scheduler, mocker, max_inflight_batches):
+    lister = ListerWithDuplicateOriginsInPages(
+        scheduler=swh_scheduler,
+        url="https://example.org",
+        instance="example.org",
+        record_batch_size=5,
+        max_inflight_batches=max_inflight_batches,
+    )
+
+    spy = mocker.spy(swh_scheduler, "record_listed_origins")
+    run_result = lister.run()
+
+    assert run_result.pages == 2
+    assert run_result.origins == 3
+    # duplicates are only merged within a batch
+    assert run_result.origins_coalesced == 4
+    assert [len(call.args[0]) for call in spy.call_args_list] == [3, 3]
+
+    origins = swh_scheduler.get_listed_origins(lister_id=lister.lister_obj.id).results
+    assert sorted(
+        (
+            origin.url,
+            origin.visit_type,
+            origin.last_update.day if origin.last_update else None,
+        )
+        for origin in origins
+    ) == [
+        ("https://example.org/module", "git", None),
+        ("https://example.org/module", "golang", 5),
+        ("https://example.org/module0", "golang", None),
+        ("https://example.org/module1", "golang", None),
+    ]
+
+
+def test_coalesce_origins():
+    def origin(url, day=None):
+        return ListedOrigin(
+            lister_id=uuid.UUID(int=1),
+            url=url,
+            visit_type="git",
+            last_update=iso8601.parse_date(f"2023-01-{day}") if day else None,
+            extra_loader_arguments={"day": day},
+        )
+
+    assert pattern.coalesce_origins(
+        [
+            origin("https://example.org/a", "02"),
+            origin("https://example.org/b"),
+            origin("https://example.org/a", "01"),
+            origin("https://example.org/b", "03"),
+            origin("https://example.org/a"),
+            origin("https://example.org/c", "04"),
+        ]
+    ) == [
+        attr.evolve(
+            origin("https://example.org/a"),
+            last_update=iso8601.parse_date("2023-01-02"),
+        ),
+        origin("https://example.org/b", "03"),
+        origin("https://example.org/c", "04"),
+    ]
+
+
 class ListerWithALotOfPagesWithALotOfOrigins(RunnableStatelessLister):
     def get_pages(self) -> Iterator[PageType]:
         for page in range(10):
@@ -367,3 +460,173 @@ def test_lister_send_origins_with_stream_is_flushed_regularly(
     result = lister.run()
 
     assert spy.call_count == result.origins / batch_size
+
+
+@pytest.mark.parametrize("prefetch_pages", [1, 3, 20])
+def test_lister_prefetch_pages(swh_scheduler, mocker, prefetch_pages):
+    lister = ListerWithALotOfPagesWithALotOfOrigins(
+        scheduler=swh_scheduler,
+        url="https://example.org",
+        instance="example.org",
+        prefetch_pages=prefetch_pages,
+    )
+    commit_page = mocker.spy(lister, "commit_page")
+
+    run_result = lister.run()
+
+    assert run_result.pages == 10
+    assert run_result.origins == 100
+
+    # pages are committed in the order they were produced
+    assert [call.args[0] for call in commit_page.call_args_list] == list(
+        lister.get_pages()
+    )
+
+
+def test_lister_prefetch_pages_max_pages(swh_scheduler):
+    lister = ListerWithALotOfPagesWithALotOfOrigins(
+        scheduler=swh_scheduler,
+        url="https://example.org",
+        instance="example.org",
+        max_pages=2,
+        prefetch_pages=5,
+    )
+
+    run_result = lister.run()
+
+    assert run_result.pages == 2
+    assert run_result.origins == 20
+
+
+class ListerFailingAfterSomePages(ListerWithALotOfPagesWithALotOfOrigins):
+    def get_pages(self) -> Iterator[PageType]:
+        for pageno, page in enumerate(super().get_pages()):
+            if pageno == 3:
+                raise ValueError("page fetching failed")
+            yield page
+
+
+@pytest.mark.parametrize("prefetch_pages", [0, 2])
+def test_lister_prefetch_pages_error(swh_scheduler, mocker, prefetch_pages):
+    lister = ListerFailingAfterSomePages(
+        scheduler=swh_scheduler,
+        url="https://example.org",
+        instance="example.org",
+        prefetch_pages=prefetch_pages,
+    )
+    commit_page = mocker.spy(lister, "commit_page")
+
+    with pytest.raises(ValueError, match="page fetching failed"):
+        lister.run()
+
+    # pages fetched before the error are all processed and recorded
+    assert commit_page.call_count == 3
+    origins = swh_scheduler.get_listed_origins(lister_id=lister.lister_obj.id).results
+    assert len(origins) == 30
+
+
+@pytest.mark.parametrize("max_inflight_batches", [1, 2, 5])
+def test_lister_max_inflight_batches(swh_scheduler, mocker, max_inflight_batches):
+    lister = ListerWithALotOfPagesWithALotOfOrigins(
+        scheduler=swh_scheduler,
+        url="https://example.org",
+        instance="example.org",
+        record_batch_size=15,
+        max_inflight_batches=max_inflight_batches,
+    )
+
+    spy = mocker.spy(swh_scheduler, "record_listed_origins")
+    run_result = lister.run()
+
+    assert run_result.pages == 10
+    assert run_result.origins == 100
+    assert spy.call_count == 7
+    # batches are recorded in the order they were filled
+    recorded_urls = [o.url for call in spy.call_args_list for o in call.args[0]]
+    assert recorded_urls == [o["url"] for page in lister.get_pages() for o in page]
+    assert lister.origins_writer is None
+
+
+class ListerWaitingForRecordedOrigins(ListerWithALotOfPagesWithALotOfOrigins):
+    def commit_page(self, page: PageType) -> None:
+        self.wait_for_recorded_origins()
+        self.committed_origins = len(self.recorded_origins)
+
+
+def test_lister_wait_for_recorded_origins(swh_scheduler):
+    lister = ListerWaitingForRecordedOrigins(
+        scheduler=swh_scheduler,
+        url="https://example.org",
+        instance="example.org",
+        record_batch_size=10,
+        max_inflight_batches=3,
+    )
+
+    lister.run()
+
+    assert lister.committed_origins == 100
+
+
+def test_lister_max_inflight_batches_error(swh_scheduler, mocker):
+    lister = ListerWithALotOfPagesWithALotOfOrigins(
+        scheduler=swh_scheduler,
+        url="https://example.org",
+        instance="example.org",
+        record_batch_size=10,
+        max_inflight_batches=2,
+    )
+    mocker.patch.object(
+        swh_scheduler,
+        "record_listed_origins",
+        side_effect=RuntimeError("scheduler is down"),
+    )
+    finalize = mocker.spy(lister, "finalize")
+    set_state_in_scheduler = mocker.spy(lister, "set_state_in_scheduler")
+
+    with pytest.raises(RuntimeError, match="scheduler is down"):
+        lister.run()
+
+    finalize.assert_not_called()
+    set_state_in_scheduler.assert_not_called()
+    assert lister.origins_writer is None
+
+
+class ListerWithDownloadedFile(RunnableStatelessLister):
+    def get_pages(self) -> Iterator[PageType]:
+        yield from super().get_pages()
+        self.mark_download_listed("https://example.com/dump.json")
+
+
+@pytest.mark.parametrize("recording_fails", [False, True])
+def test_lister_mark_download_listed(swh_scheduler, mocker, tmp_path, recording_fails):
+    lister = ListerWithDownloadedFile(
+        scheduler=swh_scheduler,
+        url="https://example.com",
+        instance="example.com",
+        download_cache_dir=str(tmp_path),
+    )
+    assert lister.download_cache is not None
+    mark_listed = mocker.patch.object(lister.download_cache, "mark_listed")
+    if recording_fails:
+        mocker.patch.object(
+            swh_scheduler,
+            "record_listed_origins",
+            side_effect=RuntimeError("scheduler is down"),
+        )
+        with pytest.raises(RuntimeError, match="scheduler is down"):
+            lister.run()
+        mark_listed.assert_not_called()
+    else:
+        lister.run()
+        mark_listed.assert_called_once_with("https://example.com/dump.json")
+
+
+def test_lister_mark_download_listed_without_cache(swh_scheduler):
+    lister = ListerWithDownloadedFile(
+        scheduler=swh_scheduler, url="https://example.com", instance="example.com"
+    )
+    assert lister.download_cache is None
+
+    lister.run()
+
+    assert lister.listed_download_urls == []
@@ -2,9 +2,23 @@
 # License: GNU General Public License version 3, or any later version
 # See top-level LICENSE file for more information
 
+import json
+import os
+import random
+import threading
+
 import pytest
+import requests
 
-from swh.lister.utils import split_range
+from swh.lister.utils import (
+    DownloadCache,
+    buffered_shuffle,
+    external_sorted,
+    iter_json_items,
+    iter_json_members,
+    ordered_concurrent_map,
+    split_range,
+)
 
 
 @pytest.mark.parametrize(
@@ -38,3 +52,167 @@ def test_split_range_errors(total_pages, nb_pages):
     for total_pages, nb_pages in [(None, 1), (100, None)]:
         with pytest.raises(TypeError):
             next(split_range(total_pages, nb_pages))
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_ordered_concurrent_map(workers):
+    def func(i):
+        # make first items the slowest to complete (time.sleep is mocked)
+        threading.Event().wait(0.001 * (20 - i))
+        return i * i
+
+    assert list(ordered_concurrent_map(func, range(20), workers=workers)) == [
+        i * i for i in range(20)
+    ]
+
+
+def test_ordered_concurrent_map_bounded():
+    consumed = 0
+    lock = threading.Lock()
+
+    def items():
+        nonlocal consumed
+        for i in range(100):
+            with lock:
+                consumed += 1
+            yield i
+
+    results = ordered_concurrent_map(lambda i: i, items(), workers=2, max_pending=5)
+    assert next(results) == 0
+    # only a bounded window of items is consumed ahead of the yielded results
+    assert consumed <= 6
+    assert list(results) == list(range(1, 100))
+
+
+def test_ordered_concurrent_map_error():
+    def func(i):
+        if i == 3:
+            raise ValueError(i)
+        return i
+
+    results = ordered_concurrent_map(func, range(10), workers=3)
+    assert [next(results) for _ in range(3)] == [0, 1, 2]
+    with pytest.raises(ValueError):
+        next(results)
+
+
+def test_buffered_shuffle():
+    consumed = 0
+
+    def items():
+        nonlocal consumed
+        for i in range(1000):
+            consumed += 1
+            yield i
+
+    shuffled = buffered_shuffle(items(), buffer_size=10)
+    first = next(shuffled)
+    # only the buffered items are consumed ahead of the yielded ones
+    assert consumed == 11
+    assert first < 11
+
+    shuffled_items = [first] + list(shuffled)
+    assert shuffled_items != list(range(1000))
+    assert sorted(shuffled_items) == list(range(1000))
+
+
+@pytest.mark.parametrize("buffer_size", [1, 7, 1000])
+def test_external_sorted(buffer_size):
+    items = [(random.randrange(10), i) for i in range(100)]
+
+    assert list(
+        external_sorted(items, key=lambda item: item[0], buffer_size=buffer_size)
+    ) == sorted(items, key=lambda item: item[0])
+
+
+DOCUMENT = {
+    "version": 1,
+    "revision": 'some "sources": [] text',
+    "nested": {"sources": [0, 1], "list": [{"a": None}, True, -1.5e3]},
+    "sources": [
+        {"type": "url", "urls": ["https://example.org/ä.tar.gz"], "size": 123456},
+        12345,
+        "string",
+        [],
+        {},
+        False,
+        None,
+    ],
+    "packages": {"a": {"version": "1.0"}, "b": [], "c": 42},
+    "after": "end",
+}
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1000])
+@pytest.mark.parametrize("indent", [None, 2])
+def test_iter_json_items(chunk_size, indent):
+    text = json.dumps(DOCUMENT, indent=indent, ensure_ascii=False)
+    chunks = [text[i : i + chunk_size] for i in range(0, len(text), chunk_size)]
+
+    assert list(iter_json_items(chunks, "sources")) == DOCUMENT["sources"]
+    assert list(iter_json_items(chunks, "packages")) == list(
+        DOCUMENT["packages"].items()
+    )
+    assert list(iter_json_items(chunks, "missing")) == []
+
+    assert list(iter_json_members(chunks, ("packages", "sources", "missing"))) == [
+        ("sources", item) for item in DOCUMENT["sources"]
+    ] + [("packages", item) for item in DOCUMENT["packages"].items()]
+
+
+@pytest.mark.parametrize(
+    "text",
+    ['{"sources": [1, 2', '{"sources" [1]}', '["sources"]', '{"sources": [1 2]}'],
+)
+def test_iter_json_items_invalid(text):
+    with pytest.raises(ValueError):
+        list(iter_json_items([text], "sources"))
+
+
+def test_download_cache(tmp_path, requests_mock):
+    def callback(request, context):
+        if request.headers.get("If-None-Match") == context.headers["ETag"]:
+            context.status_code = 304
+            return b""
+        return request.url.encode() * 10
+
+    for name in ("a", "b", "c"):
+        requests_mock.get(
+            f"https://example.org/{name}", content=callback, headers={"ETag": name}
+        )
+
+    session = requests.Session()
+    cache = DownloadCache(str(tmp_path / "cache"), max_size=50)
+
+    a = cache.fetch(session.get, "https://example.org/a")
+    assert (a.downloaded, a.modified) == (True, True)
+    with open(a.path, "rb") as f:
+        assert f.read() == b"https://example.org/a" * 10
+
+    # not marked as listed yet
+    a = cache.fetch(session.get, "https://example.org/a")
+    assert (a.downloaded, a.modified) == (False, True)
+    assert requests_mock.last_request.headers["If-None-Match"] == "a"
+
+    cache.mark_listed("https://example.org/a")
+    # the index is persisted
+    cache = DownloadCache(str(tmp_path / "cache"), max_size=500)
+    a = cache.fetch(session.get, "https://example.org/a")
+    assert (a.downloaded, a.modified) == (False, False)
+
+    # least recently used files are evicted once the cache is full, but not the
+    # ones fetched through the same cache instance as they are still to be read
+    cache = DownloadCache(str(tmp_path / "cache"), max_size=250)
+    b = cache.fetch(session.get, "https://example.org/b")
+    c = cache.fetch(session.get, "https://example.org/c")
+    assert list(cache.index) == ["https://example.org/b", "https://example.org/c"]
+    assert os.path.exists(b.path) and os.path.exists(c.path)
+
+    cache = DownloadCache(str(tmp_path / "cache"), max_size=250)
+    a = cache.fetch(session.get, "https://example.org/a")
+    assert (a.downloaded, a.modified) == (True, True)
+    assert "If-None-Match" not in requests_mock.last_request.headers
+    assert list(cache.index) == ["https://example.org/a"]
+    assert sorted(path.name for path in (tmp_path / "cache").iterdir()) == sorted(
+        [DownloadCache.INDEX_FILENAME, os.path.basename(a.path)]
+    )
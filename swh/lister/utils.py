@@ -3,13 +3,44 @@
 # See top-level LICENSE file for more information
 
 
+import base64
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager, nullcontext
+from dataclasses import dataclass
+import hashlib
+import heapq
+import json
 import logging
+import os
 from pathlib import Path
+import pickle
+import random
 import re
-from typing import Any, Iterator, List, Optional, Tuple
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import (
+    IO,
+    Any,
+    Callable,
+    Collection,
+    Deque,
+    Dict,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+)
 from urllib.parse import parse_qsl, urlparse
 
 import magic
+import requests
 from requests.exceptions import ConnectionError, InvalidSchema, SSLError
 
 from swh.core.tarball import MIMETYPE_TO_ARCHIVE_FORMAT
@@ -17,6 +48,11 @@ from swh.lister import TARBALL_EXTENSIONS
 
 logger = logging.getLogger(__name__)
 
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+T = TypeVar("T")
+R = TypeVar("R")
+
 
 def split_range(total_pages: int, nb_pages: int) -> Iterator[Tuple[int, int]]:
     """Split `total_pages` into mostly `nb_pages` ranges. In some cases, the last range can
@@ -42,6 +78,441 @@ def split_range(total_pages: int, nb_pages: int) -> Iterator[Tuple[int, int]]:
         yield index, total_pages
 
 
+def ordered_concurrent_map(
+    func: Callable[[T], R],
+    items: Iterable[T],
+    workers: int,
+    max_pending: Optional[int] = None,
+) -> Iterator[R]:
+    """Apply ``func`` to each of ``items`` in a pool of ``workers`` threads, and
+    yield the results in the order of ``items``.
+
+    At most ``max_pending`` items (twice the number of workers by default) are being
+    processed or waiting to be yielded at once, so ``items`` can be a lazy iterator
+    of any size. An exception raised by ``func`` is raised when its result should
+    have been yielded. With a single worker, ``func`` is called in the current thread.
+
+    >>> list(ordered_concurrent_map(lambda x: x * 2, range(5), workers=3))
+    [0, 2, 4, 6, 8]
+
+    """
+    if workers <= 1:
+        yield from map(func, items)
+        return
+
+    max_pending = max_pending or 2 * workers
+    pending: Deque[Future[R]] = deque()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            for item in items:
+                if len(pending) >= max_pending:
+                    yield pending.popleft().result()
+                pending.append(executor.submit(func, item))
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+class HostConcurrencyLimiter:
+    """Limit the number of threads concurrently querying each host.
+
+    >>> limiter = HostConcurrencyLimiter(max_per_host=2)
+    >>> with limiter.limit("https://example.org/file.tar.gz"):
+    ...     pass
+
+    """
+
+    def __init__(self, max_per_host: int):
+        self.max_per_host = max_per_host
+        self.semaphores: Dict[str, threading.Semaphore] = {}
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def limit(self, url: str) -> Iterator[None]:
+        """Wait until the host of ``url`` can be queried by the current thread."""
+        host = urlparse(url).netloc
+        with self.lock:
+            semaphore = self.semaphores.get(host)
+            if semaphore is None:
+                semaphore = threading.Semaphore(self.max_per_host)
+                self.semaphores[host] = semaphore
+        with semaphore:
+            yield
+
+
+class LRUSet:
+    """Set holding at most ``max_size`` items, forgetting the least recently
+    added or looked up ones first.
+
+    >>> items = LRUSet(max_size=2)
+    >>> items.add("a"); items.add("b")
+    >>> "a" in items
+    True
+    >>> items.add("c")
+    >>> "b" in items, "a" in items, len(items)
+    (False, True, 2)
+
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.items: OrderedDict[Hashable, None] = OrderedDict()
+
+    def __contains__(self, item: Hashable) -> bool:
+        if item not in self.items:
+            return False
+        self.items.move_to_end(item)
+        return True
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def add(self, item: Hashable) -> None:
+        self.items[item] = None
+        self.items.move_to_end(item)
+        while len(self.items) > self.max_size:
+            self.items.popitem(last=False)
+
+
+def buffered_shuffle(items: Iterable[T], buffer_size: int) -> Iterator[T]:
+    """Yield ``items`` in a random order, holding at most ``buffer_size`` of them in
+    memory.
+
+    Each new item takes the place of a randomly chosen buffered one, which is
+    yielded, so items are only shuffled with the ones close to them when the buffer
+    is smaller than the number of items.
+
+    >>> sorted(buffered_shuffle(range(10), buffer_size=3))
+    [0, 1, 2, 3, 4, 5, 6, 7, 8, 9]
+
+    """
+    buffer: List[T] = []
+    for item in items:
+        if len(buffer) < buffer_size:
+            buffer.append(item)
+            continue
+        index = random.randrange(buffer_size)
+        yield buffer[index]
+        buffer[index] = item
+    random.shuffle(buffer)
+    yield from buffer
+
+
+def _iter_spilled(spill: IO[bytes]) -> Iterator[Any]:
+    spill.seek(0)
+    while True:
+        try:
+            yield pickle.load(spill)
+        except EOFError:
+            return
+
+
+def external_sorted(
+    items: Iterable[T], key: Callable[[T], Any], buffer_size: int
+) -> Iterator[T]:
+    """Yield ``items`` sorted by ``key``, holding at most ``buffer_size`` of them in
+    memory.
+
+    Sorted runs of ``buffer_size`` items are spilled to temporary files, which are
+    then merged. As with :func:`sorted`, the sort is stable.
+
+    >>> list(external_sorted([3, 1, 2, 5, 4], key=lambda i: i % 3, buffer_size=2))
+    [3, 1, 4, 2, 5]
+
+    """
+    with ExitStack() as stack:
+        spills: List[IO[bytes]] = []
+        buffer: List[T] = []
+        for item in items:
+            buffer.append(item)
+            if len(buffer) >= buffer_size:
+                spill = stack.enter_context(tempfile.TemporaryFile())
+                for sorted_item in sorted(buffer, key=key):
+                    pickle.dump(sorted_item, spill)
+                spills.append(spill)
+                buffer = []
+        buffer.sort(key=key)
+        # items of the earliest runs are merged first on equal keys, keeping the
+        # sort stable
+        yield from heapq.merge(
+            *(_iter_spilled(spill) for spill in spills), buffer, key=key
+        )
+
+
+_JSON_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+class _JSONStream:
+    """Text chunks of a JSON document, parsed one value at a time."""
+
+    def __init__(self, chunks: Iterable[str]):
+        self.chunks = iter(chunks)
+        self.buffer = ""
+        self.pos = 0
+        self.decoder = json.JSONDecoder()
+
+    def read(self) -> bool:
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            return False
+        self.buffer = self.buffer[self.pos :] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Skip whitespaces and return the next character."""
+        while True:
+            match = _JSON_WHITESPACE.match(self.buffer, self.pos)
+            assert match is not None
+            self.pos = match.end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.read():
+                raise ValueError("Unexpected end of JSON document")
+
+    def expect(self, chars: str) -> str:
+        """Consume the next character, which must be one of ``chars``."""
+        char = self.peek()
+        if char not in chars:
+            raise ValueError(f"Expecting one of {chars!r}, got {char!r}")
+        self.pos += 1
+        return char
+
+    def value(self) -> Any:
+        """Decode the next value."""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self.read():
+                    raise
+                continue
+            # a value must be followed by another character in a valid document,
+            # otherwise it may be a truncated number or literal
+            if end < len(self.buffer) or not self.read():
+                self.pos = end
+                return value
+
+
+def iter_json_members(
+    chunks: Iterable[str], keys: Collection[str]
+) -> Iterator[Tuple[str, Any]]:
+    """Incrementally parse a JSON object given as text chunks, and yield the
+    ``(key, item)`` tuples of the items of its members named in ``keys``, without
+    loading the whole document in memory.
+
+    Items are the values of an array, or the ``(name, value)`` tuples of the members
+    of an object. Other members are skipped.
+
+    >>> list(iter_json_members(['{"a": [1], "b": {"c": 2}, "d": [3]}'], ("a", "d")))
+    [('a', 1), ('d', 3)]
+
+    Raises:
+        ValueError if the document is not a valid JSON object
+    """
+    stream = _JSONStream(chunks)
+    stream.expect("{")
+    if stream.peek() == "}":
+        return
+    while True:
+        name = stream.value()
+        stream.expect(":")
+        if name not in keys:
+            stream.value()
+        else:
+            closing = "]" if stream.expect("[{") == "[" else "}"
+            if stream.peek() == closing:
+                stream.expect(closing)
+            else:
+                while True:
+                    if closing == "}":
+                        member = stream.value()
+                        stream.expect(":")
+                        yield name, (member, stream.value())
+                    else:
+                        yield name, stream.value()
+                    if stream.expect(f",{closing}") == closing:
+                        break
+        if stream.expect(",}") == "}":
+            return
+
+
+def iter_json_items(chunks: Iterable[str], key: str) -> Iterator[Any]:
+    """Incrementally parse a JSON object given as text chunks, and yield the items
+    of its ``key`` member without loading the whole document in memory.
+
+    Items are the values of an array, or the ``(name, value)`` tuples of the members
+    of an object. Nothing is yielded if there is no ``key`` member.
+
+    >>> list(iter_json_items(['{"version": 1, "sour', 'ces": [{"a": 1}, 2', '3]}'],
+    ...                      "sources"))
+    [{'a': 1}, 23]
+    >>> list(iter_json_items(['{"packages": {"a": 1, "b": [2]}}'], "packages"))
+    [('a', 1), ('b', [2])]
+
+    Raises:
+        ValueError if the document is not a valid JSON object
+    """
+    for _, item in iter_json_members(chunks, (key,)):
+        yield item
+
+
+def open_sqlite_store(path: str, cache_size: int) -> sqlite3.Connection:
+    """Create a throwaway SQLite database at ``path``, replacing any existing file,
+    whose page cache is bounded by ``cache_size`` bytes.
+
+    Such databases are used by listers to keep large sets of entries on disk
+    rather than in memory.
+    """
+    if os.path.exists(path):
+        os.remove(path)
+    db = sqlite3.connect(path)
+    db.execute(f"PRAGMA cache_size = -{max(1, cache_size // 1024)}")
+    # the database is a throwaway one, no need for crash safety
+    db.execute("PRAGMA journal_mode = OFF")
+    db.execute("PRAGMA synchronous = OFF")
+    return db
+
+
+@dataclass
+class CachedDownload:
+    """A file downloaded through a :class:`DownloadCache`."""
+
+    url: str
+    path: str
+    """Path of the downloaded file in the cache"""
+    downloaded: bool
+    """Whether the file was downloaded, rather than not modified upstream"""
+    modified: bool
+    """Whether the file changed since it was last marked as listed"""
+
+
+class DownloadCache:
+    """On-disk cache of the files downloaded over HTTP by a lister.
+
+    The ``ETag`` and ``Last-Modified`` validators of downloaded files are stored
+    along with them, and sent in conditional requests the next time the files are
+    fetched, so they are only downloaded again when they changed upstream. Once
+    listed, files can be marked as such with :meth:`mark_listed`: they are then
+    reported as not modified until the server sends a new version of them.
+
+    The least recently used files are evicted when the total size of the cache
+    exceeds ``max_size`` bytes, except the files fetched through this instance as
+    they are still to be read by the lister.
+    """
+
+    INDEX_FILENAME = "index.json"
+
+    def __init__(self, cache_dir: str, max_size: int):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+        try:
+            with (self.cache_dir / self.INDEX_FILENAME).open() as index:
+                self.index: Dict[str, Dict[str, Any]] = json.load(index)
+        except (OSError, ValueError):
+            self.index = {}
+        self.fetched_urls: Set[str] = set()
+
+    def _path(self, url: str) -> Path:
+        return self.cache_dir / hashlib.sha1(url.encode()).hexdigest()
+
+    def _write_index(self) -> None:
+        index_path = self.cache_dir / self.INDEX_FILENAME
+        tmp_path = index_path.with_suffix(".tmp")
+        with tmp_path.open("w") as index:
+            json.dump(self.index, index)
+        os.replace(tmp_path, index_path)
+
+    def _evict(self) -> None:
+        size = sum(entry["size"] for entry in self.index.values())
+        for url, entry in sorted(
+            self.index.items(), key=lambda item: item[1]["last_used"]
+        ):
+            if size <= self.max_size:
+                break
+            if url in self.fetched_urls:
+                continue
+            logger.debug("Evicting %s from the download cache", url)
+            self._path(url).unlink(missing_ok=True)
+            size -= entry["size"]
+            del self.index[url]
+
+    def fetch(
+        self, http_request: Callable[..., requests.Response], url: str
+    ) -> CachedDownload:
+        """Fetch the file at ``url``, only downloading it if it is not in the cache
+        or if it changed upstream.
+
+        Args:
+            http_request: function sending HTTP requests, usually the
+                :meth:`swh.lister.pattern.Lister.http_request` method of a lister
+            url: URL of the file to fetch
+
+        Returns:
+            the cached file
+        """
+        path = self._path(url)
+        entry = self.index.get(url)
+        self.fetched_urls.add(url)
+        headers = {}
+        if entry is not None and path.exists():
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        with http_request(url, headers=headers, stream=True) as response:
+            if entry is not None and headers and response.status_code == 304:
+                logger.debug("%s not modified since last download", url)
+                entry["last_used"] = time.time()
+                self._write_index()
+                return CachedDownload(
+                    url, str(path), downloaded=False, modified=not entry["listed"]
+                )
+
+            tmp_path = path.with_suffix(".part")
+            with tmp_path.open("wb") as f:
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    f.write(chunk)
+            os.replace(tmp_path, path)
+            self.index[url] = {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "size": path.stat().st_size,
+                "last_used": time.time(),
+                "listed": False,
+            }
+
+        self._evict()
+        self._write_index()
+        return CachedDownload(url, str(path), downloaded=True, modified=True)
+
+    def mark_listed(self, url: str) -> None:
+        """Record that the cached file at ``url`` has been fully listed."""
+        if url in self.index:
+            self.index[url]["listed"] = True
+            self._write_index()
+
+
+def versions_digest(versions: Iterable[str]) -> str:
+    """Return a compact fingerprint of a set of package versions, to be stored in a
+    lister state instead of the versions themselves.
+
+    >>> versions_digest(["stable/main/1.0", "sid/main/1.1"])
+    '+uPw3eQl9nk0BGjo'
+    >>> versions_digest({"sid/main/1.1", "stable/main/1.0"})
+    '+uPw3eQl9nk0BGjo'
+    """
+    digest = hashlib.blake2b(
+        "\n".join(sorted(set(versions))).encode(), digest_size=12
+    ).digest()
+    return base64.b64encode(digest).decode()
+
+
 def is_valid_origin_url(url: Optional[str]) -> bool:
     """Returns whether the given string is a valid origin URL.
     This excludes Git SSH URLs and pseudo-URLs (eg. ``ssh://git@example.org:foo``
@@ -163,6 +634,7 @@ def url_contains_tarball_filename(
 def is_tarball(
     urls: List[str],
     request: Optional[Any] = None,
+    host_limiter: Optional[HostConcurrencyLimiter] = None,
 ) -> Tuple[bool, str]:
     """Determine whether a list of files actually are tarball or simple files.
 
@@ -178,6 +650,8 @@ def is_tarball(
         urls: name of the remote files to check for artifact nature.
         request: (Optional) Request object allowing http calls. If not provided and
             naive check cannot detect anything, this raises ArtifactNatureUndetected.
+        host_limiter: (Optional) limiter of the number of concurrent queries per host,
+            a slot of which is held for the host of each url while it is queried.
 
     Raises:
         ArtifactNatureUndetected when the artifact's nature cannot be detected out
@@ -229,69 +703,71 @@ def is_tarball(
                 url,
             )
 
-            try:
-                response = request.head(url, allow_redirects=True)
-            except (InvalidSchema, SSLError, ConnectionError):
-                exc = ArtifactNatureUndetected(
-                    f"Cannot determine artifact type from url <{url}>"
-                )
-                exceptions_to_raise.append(exc)
-                continue
-
-            if not response.ok or response.status_code == 404:
-                exc = ArtifactNatureUndetected(
-                    f"Cannot determine artifact type from url <{url}>"
-                )
-                exceptions_to_raise.append(exc)
-                continue
-
-            if response.url != url:
-                logger.debug("Location: %s", response.url)
+            # probe the url while holding a slot for its host
+            with host_limiter.limit(url) if host_limiter else nullcontext():
                 try:
-                    return _is_tarball(response.url), url
-                except ArtifactWithoutExtension:
-                    logger.warning(
-                        "Still cannot detect extension through location <%s>...",
-                        url,
+                    response = request.head(url, allow_redirects=True)
+                except (InvalidSchema, SSLError, ConnectionError):
+                    exc = ArtifactNatureUndetected(
+                        f"Cannot determine artifact type from url <{url}>"
                     )
+                    exceptions_to_raise.append(exc)
+                    continue
 
-            origin = urls[0]
-
-            content_disposition = response.headers.get("Content-Disposition")
-            if content_disposition:
-                logger.debug("Content-Disposition: %s", content_disposition)
-                if "filename=" in content_disposition:
-                    fields = content_disposition.split("; ")
-                    for field in fields:
-                        if "filename=" in field:
-                            _, filename = field.split("filename=")
-                            break
-
-                    return (
-                        url_contains_tarball_filename(
-                            urlparse(filename),
-                            TARBALL_EXTENSIONS,
-                            raise_when_no_extension=False,
-                        ),
-                        origin,
+                if not response.ok or response.status_code == 404:
+                    exc = ArtifactNatureUndetected(
+                        f"Cannot determine artifact type from url <{url}>"
                     )
-
-            content_type = response.headers.get("Content-Type")
-            if content_type:
-                return _check_content_type(content_type, origin)
-
-            # last resort, fetch URL content and detect its mimetype
-            try:
-                logger.debug("Fetching URL %s to detect mime type", url)
-                response = request.get(url, stream=True)
-                response.raise_for_status()
-            except Exception as e:
-                logger.debug("Could not fetch URL %s: %s", url, str(e))
-                pass
-            else:
-                data = next(response.iter_content(chunk_size=4096))
-                mimetype = magic.from_buffer(data, mime=True)
-                return _check_content_type(mimetype, origin)
+                    exceptions_to_raise.append(exc)
+                    continue
+
+                if response.url != url:
+                    logger.debug("Location: %s", response.url)
+                    try:
+                        return _is_tarball(response.url), url
+                    except ArtifactWithoutExtension:
+                        logger.warning(
+                            "Still cannot detect extension through location <%s>...",
+                            url,
+                        )
+
+                origin = urls[0]
+
+                content_disposition = response.headers.get("Content-Disposition")
+                if content_disposition:
+                    logger.debug("Content-Disposition: %s", content_disposition)
+                    if "filename=" in content_disposition:
+                        fields = content_disposition.split("; ")
+                        for field in fields:
+                            if "filename=" in field:
+                                _, filename = field.split("filename=")
+                                break
+
+                        return (
+                            url_contains_tarball_filename(
+                                urlparse(filename),
+                                TARBALL_EXTENSIONS,
+                                raise_when_no_extension=False,
+                            ),
+                            origin,
+                        )
+
+                content_type = response.headers.get("Content-Type")
+                if content_type:
+                    return _check_content_type(content_type, origin)
+
+                # last resort, fetch URL content and detect its mimetype
+                try:
+                    logger.debug("Fetching URL %s to detect mime type", url)
+                    response = request.get(url, stream=True)
+                    response.raise_for_status()
+                except Exception as e:
+                    logger.debug("Could not fetch URL %s: %s", url, str(e))
+                    pass
+                else:
+                    data = next(response.iter_content(chunk_size=4096))
+                    mimetype = magic.from_buffer(data, mime=True)
+                    return _check_content_type(mimetype, origin)
 
     if len(exceptions_to_raise) > 0:
         raise exceptions_to_raise[0]